@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Bytes on the wire and CPU per message for each /ws encoding, with and
+without permessage-deflate, on a realistic message mix.
+
+Messages are built like the backend builds them: decoded swaps, inventory
+deltas, rebalance intents/results and debug events (including `raw_log`
+with the full log payload). Deflate is modelled exactly as
+permessage-deflate does it: one raw-deflate stream per connection with
+context takeover and the 12-bit window uvicorn negotiates, each message
+sync-flushed and the 4-byte tail stripped.
+
+Encoding runs once per message whatever the number of clients (the hub
+encodes once per encoding); deflate runs once per message per client.
+CPU is reported as a share of one core at --rate messages/s.
+
+Usage:
+  python backend/bench_encodings.py
+  python backend/bench_encodings.py --rate 1000 --messages 20000 --clients 10 --debug-share 0
+"""
+
+import sys
+import zlib
+import time
+import random
+import argparse
+from typing import Any, Dict, List
+
+from web3 import Web3
+
+import wire
+from loadgen import make_swap_log
+
+POOL = Web3.to_checksum_address("0x000000000000000000000000000000000000dEaD")
+
+def _frame_header(n: int) -> int:
+    return 2 if n < 126 else 4 if n < 65536 else 10
+
+def build_messages(n: int, debug_share: float, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    out: List[Dict[str, Any]] = []
+    seq = 0
+    block = 40_000_000
+    while len(out) < n:
+        seq += 1
+        block += rng.random() < 0.3
+        log = make_swap_log(POOL, seq, block, rng)
+        izo = rng.random() < 0.5
+        amount_in = rng.randint(10**5, 10**9)
+        amount_out = rng.randint(10**5, 10**9)
+        ev = {
+            "pool": POOL,
+            "sender": Web3.to_checksum_address("0x" + log["topics"][1][-40:]),
+            "isZeroToOne": izo,
+            "amountIn": amount_in,
+            "fee": amount_in * 15 // 10_000,
+            "amountOut": amount_out,
+            "usdcDelta": amount_in if izo else -amount_out,
+            "txHash": log["transactionHash"],
+            "blockNumber": block,
+            "tsMs": 1_760_000_000_000 + seq,
+            "id": seq,
+        }
+        U, P, q = rng.uniform(500, 1500), rng.uniform(100, 300), rng.uniform(4, 6)
+        batch: List[Dict[str, Any]] = [
+            {"type": "swap", "seq": 0, "data": ev},
+            {"type": "inventory", "seq": 0, "data": {
+                "U_usdc": U, "P_purr": P, "q_usdc_per_purr": q, "ratio": U / (P * q),
+                "d_usdc": U - P * q, "txHash": ev["txHash"], "blockNumber": block, "tsMs": ev["tsMs"],
+            }},
+        ]
+        if rng.random() < 0.1:
+            batch.append({"type": "rebalance_intent", "seq": 0, "data": {
+                "action": "BUY_PURR_SPOT", "usdc_micro": 1_250_000, "usdc": 1.25,
+                "ratio": U / (P * q), "abs_dev": 0.03, "q_mid_usdc_per_purr": q,
+            }})
+            batch.append({"type": "rebalance_result", "seq": 0, "data": {
+                "ok": True, "paper": True, "requested_usdc_micro": 1_250_000, "requested_usdc": 1.25,
+                "remaining_usdc": 0.0, "buy_purr": True,
+                "fills": [{"q_px": q, "purr": 0.25, "isBuy": True, "res": {"status": "ok", "response": {
+                    "type": "order", "data": {"statuses": [{"filled": {"totalSz": "0.25", "avgPx": str(q), "oid": seq}}]}}}}],
+            }})
+        if debug_share > 0:
+            debug = [
+                {"event": "raw_log", "ts_ms": ev["tsMs"], "payload": log},
+                {"event": "swap_decoded", "ts_ms": ev["tsMs"], "txHash": ev["txHash"], "blockNumber": block,
+                 "sender": ev["sender"], "usdcDelta_micro": ev["usdcDelta"], "usdcDelta_usdc": ev["usdcDelta"] / 1e6},
+                {"event": "imbalance", "ts_ms": ev["tsMs"], "U_usdc": U, "P_purr": P, "q_usdc_per_purr": q,
+                 "Vp_usdc": P * q, "d_usdc": U - P * q, "side": "USDC_HEAVY" if U > P * q else "PURR_HEAVY"},
+            ]
+            # debug_share of all messages are debug events
+            k = round(len(batch) * debug_share / max(1e-9, 1 - debug_share)) if debug_share < 1 else len(debug)
+            for d in rng.sample(debug, min(k, len(debug))):
+                batch.append({"type": "debug", "data": d})
+        for m in batch:
+            if m["type"] != "debug":
+                m["seq"] = len(out) + 1
+            out.append(m)
+    return out[:n]
+
+def bench(msgs: List[Dict[str, Any]], encoding: str, deflate: bool) -> Dict[str, float]:
+    t0 = time.process_time()
+    payloads = [wire.encode(m, encoding) for m in msgs]
+    encode_s = time.process_time() - t0
+
+    raw = [p.encode() if isinstance(p, str) else p for p in payloads]
+    deflate_s = 0.0
+    if deflate:
+        comp = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -12)
+        t0 = time.process_time()
+        raw = [comp.compress(b) + comp.flush(zlib.Z_SYNC_FLUSH)[:-4] if b else b for b in raw]
+        deflate_s = time.process_time() - t0
+
+    wire_bytes = sum(len(b) + _frame_header(len(b)) for b in raw)
+    n = len(msgs)
+    return {
+        "bytes_per_msg": wire_bytes / n,
+        "encode_us": encode_s / n * 1e6,
+        "deflate_us": deflate_s / n * 1e6,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare /ws encodings: bytes on the wire and CPU per message")
+    parser.add_argument("--rate", type=float, default=1000.0, help="Messages/s the CPU share is reported at")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--clients", type=int, default=10, help="Connected clients for the fan-out CPU column")
+    parser.add_argument("--debug-share", type=float, default=0.4, help="Fraction of messages that are debug events")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    msgs = build_messages(args.messages, args.debug_share, args.seed)
+    missing = [e for e in wire.ALL_ENCODINGS if e not in wire.available()]
+    if missing:
+        print(f"not installed, skipped: {missing}")
+
+    rows = []
+    for encoding in wire.available():
+        for deflate in (False, True):
+            rows.append((encoding, deflate, bench(msgs, encoding, deflate)))
+    base = rows[0][2]["bytes_per_msg"]
+
+    print(f"\n{len(msgs)} messages, {args.debug_share:.0%} debug, CPU as % of one core at {args.rate:.0f} msg/s")
+    print(f"{'encoding':>9} {'deflate':>8} {'B/msg':>8} {'vs json':>8} {'enc us':>8} {'defl us':>8} "
+          f"{'cpu 1cl':>8} {f'cpu {args.clients}cl':>8} {'KB/s/cl':>8}")
+    for encoding, deflate, r in rows:
+        per_client = r["encode_us"] + r["deflate_us"]
+        fanout = r["encode_us"] + r["deflate_us"] * args.clients
+        print(f"{encoding:>9} {'yes' if deflate else 'no':>8} {r['bytes_per_msg']:8.1f} "
+              f"{r['bytes_per_msg'] / base - 1:+8.0%} {r['encode_us']:8.2f} {r['deflate_us']:8.2f} "
+              f"{per_client * args.rate / 1e4:7.2f}% {fanout * args.rate / 1e4:7.2f}% "
+              f"{r['bytes_per_msg'] * args.rate / 1024:8.1f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
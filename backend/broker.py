@@ -0,0 +1,241 @@
+"""
+Local pub/sub between the ingest process and read-only API workers.
+
+With PROCESS_ROLE=ingest the process that ingests logs and hedges also
+listens on a Unix socket. Every API worker (PROCESS_ROLE=api, any number of
+uvicorn processes) connects to it and serves /events, /health and /ws from
+what it receives, so dashboard load runs on other cores and never on the
+loop that trades.
+
+On the ingest side a connected worker is just one more subscriber of the
+fan-out hub, with a socket instead of a websocket: messages are serialized
+once for every json client and worker together, and a slow worker backs up
+only its own queue under the hub's slow-consumer policy.
+
+Frames are newline-delimited JSON, exactly the text a json /ws client gets.
+A worker first receives `sync` (recent swaps and the ingest state, as of a
+hub seq), then every hub message, plus `state` every `state_interval`. The
+sync is captured on the loop but built and serialized by `offload` (a
+thread pool), and whatever the hub published meanwhile is queued after it
+from the hub's replay buffer.
+Non-debug messages carry the hub's consecutive seq; a worker that sees a
+gap (its queue overflowed) reconnects and syncs again.
+"""
+
+import os
+import json
+import time
+import asyncio
+from collections import namedtuple
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import wire
+
+Peer = namedtuple("Peer", "host port")
+
+# a sync (recent swaps) is a single line
+READ_LIMIT = 256 * 1024 * 1024
+# builds of a sync to try before dropping a worker (it reconnects), if the replay buffer can't cover one
+SYNC_ATTEMPTS = 3
+
+class _Conn:
+    """What the hub's Subscriber needs of a websocket, on a Unix socket stream."""
+    def __init__(self, writer: asyncio.StreamWriter, n: int):
+        self.writer = writer
+        self.client = Peer("broker", n)
+
+    async def send_text(self, text: str) -> None:
+        self.writer.write(text.encode() + b"\n")
+        await self.writer.drain()
+
+    async def close(self, code: int = 1000) -> None:
+        self.writer.close()
+
+class BrokerServer:
+    def __init__(
+        self,
+        path: str,
+        hub: Any,
+        sync: Callable[[], Callable[[], Dict[str, Any]]],
+        state: Callable[[], Dict[str, Any]],
+        state_interval: float = 0.5,
+        offload: Optional[Callable[[Callable[[], Any]], Awaitable[Any]]] = None,
+    ):
+        """
+        `sync()` is called on the loop and must capture, without awaiting,
+        everything as of the hub's current seq; the function it returns
+        builds the sync message from that capture and runs via `offload`.
+        """
+        self.path = path
+        self.hub = hub
+        self.sync = sync
+        self.state = state
+        self.offload = offload
+        self.state_interval = state_interval
+        self.conns: Dict[int, Any] = {}  # n -> hub Subscriber
+        self.connects = 0
+        self.sync_failures = 0
+        self.last_error: Optional[str] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        try:
+            os.unlink(self.path)  # left by a previous process
+        except FileNotFoundError:
+            pass
+        self._server = await asyncio.start_unix_server(self._handle, self.path)
+        self._task = asyncio.create_task(self._state_loop(), name="broker_state")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._server:
+            self._server.close()
+            for sub in list(self.conns.values()):
+                self.hub.unregister(sub.ws)
+                sub.ws.writer.close()
+            await self._server.wait_closed()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connects += 1
+        n = self.connects
+        conn = _Conn(writer, n)
+        try:
+            sub = await self._register_synced(conn)
+        except Exception as e:
+            # the worker's problem, not the loop's: it sees EOF and reconnects
+            self.sync_failures += 1
+            self.last_error = f"worker {n}: {type(e).__name__}: {e}"
+            print(f"[broker] sync failed, dropping {self.last_error}", flush=True)
+            writer.close()
+            return
+        self.conns[n] = sub
+        try:
+            while await reader.read(4096):
+                pass  # workers don't send anything; EOF means they're gone
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.conns.pop(n, None)
+            self.hub.unregister(conn)
+            writer.close()
+
+    async def _register_synced(self, conn: _Conn) -> Any:
+        """Register `conn` with the hub, its sync first and every hub message since right behind it."""
+        for _ in range(SYNC_ATTEMPTS):
+            seq, build = self.hub.seq, self.sync()
+
+            def encode() -> str:
+                return wire.encode(build())
+            payload = await self.offload(encode) if self.offload is not None else encode()
+            sub = self.hub.register(conn, "json")
+            sub.offer(payload)
+            if self.hub.resume(sub, seq, self.hub.stream):
+                return sub
+            self.hub.unregister(conn)  # published too much meanwhile; nothing was written yet
+        raise RuntimeError(f"broker worker {conn.client.port}: no sync after {SYNC_ATTEMPTS} attempts")
+
+    async def _state_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.state_interval)
+            if not self.conns:
+                continue
+            payload = wire.encode(self.state())
+            for sub in list(self.conns.values()):
+                sub.offer(payload)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "workers": len(self.conns),
+            "connects": self.connects,
+            "syncFailures": self.sync_failures,
+            "lastError": self.last_error,
+            "per_worker": [sub.stats() for sub in self.conns.values()],
+        }
+
+class BrokerClient:
+    def __init__(
+        self,
+        path: str,
+        on_message: Callable[[Dict[str, Any], str], None],
+        retry_s: float = 1.0,
+    ):
+        self.path = path
+        self.on_message = on_message
+        self.retry_s = retry_s
+        self.connected = False
+        self.synced = False
+        self.seq: Optional[int] = None
+        self.connects = 0
+        self.messages = 0
+        self.gaps = 0
+        self.last_ms: Optional[int] = None
+        self.last_error: Optional[str] = None
+
+    async def run(self) -> None:
+        """Connect, sync, apply; reconnect (and sync again) on EOF, error or a seq gap."""
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=READ_LIMIT)
+                self.connected = True
+                self.connects += 1
+                await self._read(reader)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                self.connected = False
+                self.synced = False
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(self.retry_s)
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            line = await reader.readline()
+            if not line:
+                self.last_error = "broker closed the connection"
+                return
+            text = line.decode().rstrip("\n")
+            msg = json.loads(text)
+            typ = msg.get("type")
+            if typ == "sync":
+                self.seq = msg["seq"]
+                self.synced = True
+            elif not self.synced:
+                continue
+            elif "seq" in msg:
+                if msg["seq"] != self.seq + 1:
+                    self.gaps += 1
+                    self.last_error = f"seq gap: {self.seq} -> {msg['seq']}"
+                    return
+                self.seq = msg["seq"]
+            self.messages += 1
+            self.last_ms = int(time.time() * 1000)
+            self.on_message(msg, text)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "connected": self.connected,
+            "synced": self.synced,
+            "seq": self.seq,
+            "connects": self.connects,
+            "messages": self.messages,
+            "gaps": self.gaps,
+            "lastMs": self.last_ms,
+            "lastError": self.last_error,
+        }
@@ -0,0 +1,291 @@
+"""
+Durable append-only store for decoded swaps and hedge results.
+
+SQLite in WAL mode: one background writer thread batches inserts into a
+single transaction per drain, readers open their own connections and never
+block the writer. Row ids are assigned in-process at append time so callers
+get a stable cursor immediately, before the row is on disk.
+
+Queries are keyset-paginated on id (newest first) with indexes on block
+number, sender, direction and time, so a page costs the same at row 10 and
+at row 10M. ts_ms is clamped to be non-decreasing in id order, so time
+ranges are resolved to an id range with two index seeks instead of sorting
+every row in the range. Block numbers carry no such guarantee (backfill
+appends older blocks after newer ones), so block ranges are filtered on
+the block index itself.
+"""
+
+import json
+import time
+import queue
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id              INTEGER PRIMARY KEY,
+    kind            TEXT    NOT NULL,
+    ts_ms           INTEGER NOT NULL,
+    block_number    INTEGER,
+    sender          TEXT,
+    is_zero_to_one  INTEGER,
+    tx_hash         TEXT,
+    data            TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_events_kind   ON events (kind, id);
+CREATE INDEX IF NOT EXISTS ix_events_block  ON events (kind, block_number, id);
+CREATE INDEX IF NOT EXISTS ix_events_sender ON events (kind, sender, id);
+CREATE INDEX IF NOT EXISTS ix_events_sdir   ON events (kind, sender, is_zero_to_one, id);
+CREATE INDEX IF NOT EXISTS ix_events_dir    ON events (kind, is_zero_to_one, id);
+CREATE INDEX IF NOT EXISTS ix_events_ts     ON events (kind, ts_ms, id);
+CREATE INDEX IF NOT EXISTS ix_events_tx     ON events (tx_hash);
+"""
+
+Row = Tuple[int, str, int, Optional[int], Optional[str], Optional[int], Optional[str], str]
+
+M_WRITE_FAILED = REGISTRY.counter("event_store_write_failures_total", "Event store commits that failed, by what happened next", ("outcome",))
+
+# commits of one batch (database is locked, disk full, ...) before it's written row by row, dropping the rows that fail
+WRITE_ATTEMPTS = 3
+
+class EventStore:
+    def __init__(self, path: str, batch_max: int = 5000, readonly: bool = False):
+        """`readonly`: queries only, for a process that reads a store another one writes (no writer thread)."""
+        self.path = path
+        self.batch_max = batch_max
+        self.readonly = readonly
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        (max_id,) = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()
+        conn.close()
+
+        self._id_lock = threading.Lock()
+        self._next_id = int(max_id) + 1
+        self._last_ts = 0
+        self._q: "queue.Queue[Optional[Row]]" = queue.Queue()
+        self.write_failures = 0
+        self.rows_dropped = 0
+        self.last_error: Optional[str] = None
+        self._writer: Optional[threading.Thread] = None
+        if not readonly:
+            self._writer = threading.Thread(target=self._write_loop, name="event-store-writer", daemon=True)
+            self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def last_id(self) -> int:
+        """The newest row id handed out (0 for an empty store); the next append gets last_id + 1."""
+        with self._id_lock:
+            return self._next_id - 1
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def append(self, kind: str, data: Dict[str, Any], ts_ms: int) -> int:
+        """Non-blocking: assigns the row id and queues the row for the writer."""
+        if self.readonly:
+            raise RuntimeError(f"event store {self.path} is open read-only")
+        if not self._writer.is_alive():
+            # closed, or the writer never got a connection: nothing queued now would ever be written
+            raise RuntimeError(f"event store {self.path} has no writer running")
+        with self._id_lock:
+            row_id = self._next_id
+            self._next_id += 1
+            ts_ms = max(ts_ms, self._last_ts)
+            self._last_ts = ts_ms
+
+        izo = data.get("isZeroToOne")
+        self._q.put_nowait((
+            row_id,
+            kind,
+            ts_ms,
+            data.get("blockNumber"),
+            data.get("sender"),
+            None if izo is None else int(bool(izo)),
+            data.get("txHash"),
+            json.dumps(data, separators=(",", ":"), default=str),
+        ))
+        return row_id
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        stop = False
+        while not stop:
+            row = self._q.get()
+            batch: List[Row] = []
+            if row is None:
+                stop = True
+            else:
+                batch.append(row)
+            while len(batch) < self.batch_max:
+                try:
+                    row = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+            if batch:
+                self._commit(conn, batch)
+        conn.execute("PRAGMA optimize")
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[Row]) -> None:
+        """Never raises: a failure is logged and counted, so the writer outlives it."""
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                self._insert(conn, batch)
+                return
+            except Exception as e:
+                self._failed(e, f"batch of {len(batch)} (attempt {attempt}/{WRITE_ATTEMPTS})", "retried")
+                time.sleep(0.05 * attempt)
+        # one bad row shouldn't cost the rest of the batch
+        for row in batch:
+            try:
+                self._insert(conn, [row])
+            except Exception as e:
+                self._failed(e, f"row {row[0]}", "dropped")
+                self.rows_dropped += 1
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, rows: List[Row]) -> None:
+        try:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def _failed(self, e: Exception, what: str, outcome: str) -> None:
+        self.write_failures += 1
+        self.last_error = f"{type(e).__name__}: {e}"
+        M_WRITE_FAILED.inc(outcome)
+        print(f"[event_store] write failed, {what}, {outcome}: {self.last_error}", flush=True)
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending(),
+            "writer": self._writer is not None and self._writer.is_alive(),
+            "writeFailures": self.write_failures,
+            "rowsDropped": self.rows_dropped,
+            "lastError": self.last_error,
+        }
+
+    def close(self) -> None:
+        """Flushes everything queued so far, then stops the writer."""
+        if self._writer is None:
+            return
+        self._q.put(None)
+        self._writer.join()
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def _id_bound(self, kind: str, col: str, value: int, upper: bool) -> Optional[int]:
+        # newest id with col <= value, or oldest id with col >= value; only valid for a col that never decreases with id
+        if upper:
+            sql = f"SELECT id FROM events WHERE kind = ? AND {col} <= ? ORDER BY {col} DESC, id DESC LIMIT 1"
+        else:
+            sql = f"SELECT id FROM events WHERE kind = ? AND {col} >= ? ORDER BY {col} ASC, id ASC LIMIT 1"
+        row = self._reader().execute(sql, (kind, value)).fetchone()
+        return None if row is None else int(row[0])
+
+    def query(
+        self,
+        kind: str = "swap",
+        limit: int = 200,
+        cursor: Optional[int] = None,
+        sender: Optional[str] = None,
+        is_zero_to_one: Optional[bool] = None,
+        from_block: Optional[int] = None,
+        to_block: Optional[int] = None,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+        tx_hash: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Newest-first page of rows with id < cursor, returned oldest-first
+        (the same order /events has always used). Pass the smallest returned
+        id as the next cursor.
+        """
+        where = ["kind = ?"]
+        args: List[Any] = [kind]
+        if cursor is not None:
+            where.append("id < ?")
+            args.append(cursor)
+
+        lo: Optional[int] = None
+        hi: Optional[int] = None
+        for col, value, upper in (("ts_ms", since_ms, False), ("ts_ms", until_ms, True)):
+            if value is None:
+                continue
+            bound = self._id_bound(kind, col, value, upper)
+            if bound is None:
+                return []
+            if upper:
+                hi = bound if hi is None else min(hi, bound)
+            else:
+                lo = bound if lo is None else max(lo, bound)
+        if lo is not None:
+            where.append("id >= ?")
+            args.append(lo)
+        if hi is not None:
+            where.append("id <= ?")
+            args.append(hi)
+
+        if sender is not None:
+            where.append("sender = ?")
+            args.append(sender)
+        if is_zero_to_one is not None:
+            where.append("is_zero_to_one = ?")
+            args.append(int(is_zero_to_one))
+        if from_block is not None:
+            where.append("block_number >= ?")
+            args.append(from_block)
+        if to_block is not None:
+            where.append("block_number <= ?")
+            args.append(to_block)
+        if since_ms is not None:
+            where.append("+ts_ms >= ?")
+            args.append(since_ms)
+        if until_ms is not None:
+            where.append("+ts_ms <= ?")
+            args.append(until_ms)
+        if tx_hash is not None:
+            where.append("tx_hash = ?")
+            args.append(tx_hash)
+
+        sql = f"SELECT id, data FROM events WHERE {' AND '.join(where)} ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        rows = self._reader().execute(sql, args).fetchall()
+
+        out = []
+        for row_id, data in reversed(rows):
+            ev = json.loads(data)
+            ev["id"] = row_id
+            out.append(ev)
+        return out
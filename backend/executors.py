@@ -0,0 +1,134 @@
+"""
+Named thread pools per class of blocking I/O.
+
+Every blocking call used to go through `asyncio.to_thread` and the one
+default executor, so a pile of slow diagnostic reads could sit in front of
+an order. Each pool here has its own threads and its own queue:
+
+  chain        EVM reads on the decision path (balanceOf)
+  hl_info      HL Info reads on the decision and hedge path (l2_snapshot, balances)
+  hl_exchange  HL order submission only, so an order never waits behind a read
+  diag         everything else: /health, /hl/spot_state, /events store reads, startup
+  trace        the tracing drainer's serialization and sink writes
+
+Within a pool the queue is ordered by priority (lower first, FIFO within a
+priority), so reads for a hedge already in flight go ahead of reads for a
+new decision. Queue wait and run time are measured per pool.
+"""
+
+import time
+import queue
+import asyncio
+import itertools
+import threading
+import contextvars
+from typing import Any, Callable, Dict, Optional
+
+from metrics import REGISTRY
+
+HIGH, NORMAL, LOW = 0, 1, 2
+
+M_WAIT = REGISTRY.histogram("executor_wait_seconds", "Time a blocking call waited for a pool thread", labelnames=("pool",))
+M_RUN = REGISTRY.histogram("executor_run_seconds", "Time a blocking call ran on a pool thread", labelnames=("pool",))
+
+_STOP = object()
+
+class Pool:
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.q: "queue.PriorityQueue[tuple]" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self.busy = 0
+        self._busy_lock = threading.Lock()
+        self.submitted = 0
+        self.queue_max = 0
+        self.wait_ms_max = 0.0
+        self._wait = M_WAIT.labels(name)
+        self._run = M_RUN.labels(name)
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True) for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def depth(self) -> int:
+        return self.q.qsize()
+
+    async def run(self, fn: Callable[..., Any], *args: Any, priority: int = NORMAL, **kwargs: Any) -> Any:
+        """Like asyncio.to_thread (context is copied), on this pool's threads."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        ctx = contextvars.copy_context()
+        self.submitted += 1
+        self.q.put((priority, next(self._seq), time.perf_counter(), ctx, fn, args, kwargs, loop, fut))
+        depth = self.q.qsize()
+        if depth > self.queue_max:
+            self.queue_max = depth
+        return await fut
+
+    def _worker(self) -> None:
+        while True:
+            item = self.q.get()
+            if item[4] is _STOP:
+                return
+            _, _, submitted, ctx, fn, args, kwargs, loop, fut = item
+            started = time.perf_counter()
+            with self._busy_lock:
+                self.busy += 1
+            try:
+                result, exc = ctx.run(fn, *args, **kwargs), None
+            except BaseException as e:
+                result, exc = None, e
+            with self._busy_lock:
+                self.busy -= 1
+            done = time.perf_counter()
+            try:
+                loop.call_soon_threadsafe(self._settle, fut, result, exc, started - submitted, done - started)
+            except RuntimeError:
+                pass  # loop already closed
+
+    def _settle(self, fut: asyncio.Future, result: Any, exc: Optional[BaseException], wait: float, run: float) -> None:
+        # on the loop: metrics are only ever touched from here
+        self._wait.observe(wait)
+        self._run.observe(run)
+        if wait * 1000 > self.wait_ms_max:
+            self.wait_ms_max = wait * 1000
+        if fut.cancelled():
+            return
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    def shutdown(self) -> None:
+        for _ in self._threads:
+            self.q.put((float("inf"), next(self._seq), 0.0, None, _STOP, (), {}, None, None))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "busy": self.busy,
+            "queued": self.depth(),
+            "queue_max": self.queue_max,
+            "submitted": self.submitted,
+            "wait_ms_max": round(self.wait_ms_max, 3),
+        }
+
+class Executors:
+    def __init__(self, sizes: Dict[str, int]):
+        self.pools: Dict[str, Pool] = {name: Pool(name, n) for name, n in sizes.items()}
+        REGISTRY.gauge("executor_queue_depth", "Blocking calls waiting for a pool thread",
+                       lambda: {(n,): p.depth() for n, p in self.pools.items()}, labelnames=("pool",))
+        REGISTRY.gauge("executor_busy", "Pool threads running a call",
+                       lambda: {(n,): p.busy for n, p in self.pools.items()}, labelnames=("pool",))
+
+    def __getitem__(self, name: str) -> Pool:
+        return self.pools[name]
+
+    def shutdown(self) -> None:
+        for pool in self.pools.values():
+            pool.shutdown()
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: pool.stats() for name, pool in self.pools.items()}
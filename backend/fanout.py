@@ -0,0 +1,353 @@
+"""
+Websocket fan-out hub with per-client send queues.
+
+`publish()` serializes a message once and appends it to every client's
+bounded queue without awaiting anything, so the caller (the swap listener,
+the hedge path) never waits on a socket. Each client has its own writer
+task draining its queue; a slow dashboard only ever backs up its own queue.
+
+When a client's queue is full the slow-consumer policy decides:
+  drop_oldest  drop the oldest queued message to make room
+  skip_debug   drop debug messages first (the incoming one, else the oldest
+               queued debug message); fall back to drop_oldest
+  disconnect   close the client (1013, try again later)
+
+Clients may narrow what they receive by subscribing to topics:
+  swap            every decoded swap
+  pool:<address>  swaps of one pool
+  rebalance       rebalance intents and results
+  debug:<event>   one debug event, `debug:*` (or `debug`) for all of them
+  *               everything (the default until a client subscribes)
+with an optional per-topic sampling rate in (0, 1]. A message is only
+serialized if at least one client wants it. Producers that serialize off
+the loop (the tracer) call `receivers()` and `deliver()` directly.
+
+Every non-debug message published is stamped with a monotonically
+increasing `seq` and kept in a bounded replay buffer, so a reconnecting
+client can resume from the last seq it saw instead of reloading state.
+Seqs count from the start of a process, so they come with a random `stream`
+id: a resume naming another stream (a restarted server) gets a snapshot.
+
+An API worker's hub is fed by `relay()` from the ingest process's hub
+instead (broker.py), keeping its seq numbers and stream id.
+
+Each client picks a wire encoding (see wire.py). A message is encoded at
+most once per encoding in use, however many clients receive it.
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import wire
+from metrics import REGISTRY
+from wire import Payload
+
+POLICIES = ("drop_oldest", "skip_debug", "disconnect")
+
+# (enqueued perf_counter, payload, is_debug)
+Item = Tuple[float, Payload, bool]
+
+M_SEND_LAG = REGISTRY.histogram("ws_send_lag_seconds", "Message queued for a /ws client -> written to its socket")
+M_DROPPED = REGISTRY.counter("ws_dropped_total", "/ws messages dropped or clients disconnected, by reason", ("reason",))
+
+def message_topics(msg: Dict[str, Any]) -> List[str]:
+    typ = msg.get("type", "")
+    data = msg.get("data") or {}
+    if typ == "swap":
+        return ["swap", f"pool:{str(data.get('pool', '')).lower()}"]
+    if typ.startswith("rebalance"):
+        return ["rebalance"]
+    if typ == "debug":
+        return [f"debug:{data.get('event', '')}"]
+    return [typ]
+
+def _patterns_for(topic: str) -> Tuple[str, ...]:
+    # every subscription pattern that would match this topic
+    # (once each: a topic that is its own family would advance its sample rate twice per message)
+    family = topic.split(":", 1)[0]
+    if family == topic:
+        return (topic, f"{family}:*", "*")
+    return (topic, family, f"{family}:*", "*")
+
+def _normalize_topic(topic: str) -> str:
+    # the form message_topics() produces: pool addresses lowercased, whatever case the client used
+    topic = topic.strip()
+    return topic.lower() if topic.startswith("pool:") else topic
+
+def _check_topics(topics: Any) -> None:
+    # a bare string would otherwise subscribe to each of its characters
+    if not isinstance(topics, list) or not all(isinstance(t, str) for t in topics):
+        raise ValueError("topics must be a list of strings")
+
+class Subscriber:
+    def __init__(self, hub: "FanoutHub", ws: Any, encoding: str = "json"):
+        self.hub = hub
+        self.ws = ws
+        self.encoding = encoding
+        self.queue: Deque[Item] = deque()
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.lag_ms_last = 0.0
+        self.lag_ms_max = 0.0
+        self.closed = False
+        self.topics: Optional[Dict[str, float]] = None  # pattern -> sample rate; None = everything
+        self._sample_acc: Dict[str, float] = {}
+        self.filtered = 0
+        self.task = asyncio.create_task(self._writer(), name="ws_writer")
+
+    def subscribe(self, topics: Iterable[str], sample: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """ValueError, with nothing changed, unless topics is a list of strings and sample maps topics to numbers."""
+        _check_topics(topics)
+        sample = sample or {}
+        if not isinstance(sample, dict):
+            raise ValueError(f"sample must be an object of topic -> rate, not {type(sample).__name__}")
+        for t, rate in sample.items():
+            if isinstance(rate, bool) or not isinstance(rate, (int, float)) or rate != rate:
+                raise ValueError(f"sample rate for {t!r} must be a number, not {rate!r}")
+        rates = {_normalize_topic(t): rate for t, rate in sample.items()}
+        subs = dict(self.topics or {})
+        for t in map(_normalize_topic, topics):
+            if t:
+                subs[t] = min(max(float(rates.get(t, 1.0)), 0.0), 1.0)
+        self.topics = subs
+        return subs
+
+    def unsubscribe(self, topics: Iterable[str]) -> Dict[str, float]:
+        _check_topics(topics)
+        subs = dict(self.topics or {})
+        for t in map(_normalize_topic, topics):
+            subs.pop(t, None)
+            self._sample_acc.pop(t, None)
+        self.topics = subs
+        return subs
+
+    def wants(self, topics: List[str]) -> bool:
+        """True if any subscribed pattern matching one of `topics` accepts the message."""
+        if self.topics is None:
+            return True
+        for topic in topics:
+            for pattern in _patterns_for(topic):
+                rate = self.topics.get(pattern)
+                if rate is None:
+                    continue
+                if rate >= 1.0:
+                    return True
+                # deterministic 1-in-(1/rate) sampling per pattern
+                acc = self._sample_acc.get(pattern, 0.0) + rate
+                if acc >= 1.0:
+                    self._sample_acc[pattern] = acc - 1.0
+                    return True
+                self._sample_acc[pattern] = acc
+        self.filtered += 1
+        return False
+
+    def send(self, msg: Dict[str, Any]) -> None:
+        """Queues a message for this client only (hello, acks, snapshots)."""
+        self.offer(wire.encode(msg, self.encoding))
+
+    def offer(self, payload: Payload, is_debug: bool = False) -> None:
+        if self.closed:
+            return
+        if len(self.queue) >= self.hub.queue_size:
+            policy = self.hub.policy
+            if policy == "disconnect":
+                self.hub.drop(self, reason="slow_consumer")
+                return
+            if policy == "skip_debug":
+                if is_debug:
+                    self.dropped += 1
+                    M_DROPPED.inc("skip_debug")
+                    return
+                for i, (_, _, queued_debug) in enumerate(self.queue):
+                    if queued_debug:
+                        del self.queue[i]
+                        break
+                else:
+                    self.queue.popleft()
+            else:
+                self.queue.popleft()
+            self.dropped += 1
+            M_DROPPED.inc(policy)
+        self.queue.append((time.perf_counter(), payload, is_debug))
+        self.wakeup.set()
+
+    async def _writer(self) -> None:
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.queue:
+                    enqueued, payload, _ = self.queue.popleft()
+                    if isinstance(payload, bytes):
+                        await self.ws.send_bytes(payload)
+                    else:
+                        await self.ws.send_text(payload)
+                    lag_s = time.perf_counter() - enqueued
+                    M_SEND_LAG.observe(lag_s)
+                    lag = lag_s * 1000
+                    self.lag_ms_last = lag
+                    if lag > self.lag_ms_max:
+                        self.lag_ms_max = lag
+                    self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.hub.drop(self, reason="send_failed")
+
+    def stats(self) -> Dict[str, Any]:
+        client = getattr(self.ws, "client", None)
+        return {
+            "client": f"{client.host}:{client.port}" if client else None,
+            "encoding": self.encoding,
+            "queued": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "filtered": self.filtered,
+            "topics": self.topics,
+            "lag_ms_last": round(self.lag_ms_last, 3),
+            "lag_ms_max": round(self.lag_ms_max, 3),
+        }
+
+class FanoutHub:
+    def __init__(self, queue_size: int = 1024, policy: str = "drop_oldest", replay_size: int = 4096):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow-consumer policy {policy!r}, expected one of {POLICIES}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.subs: Dict[int, Subscriber] = {}
+        self.published = 0
+        self.disconnected_slow = 0
+        self.seq = 0
+        self.stream = os.urandom(8).hex()  # which process's seqs these are
+        # [seq, msg, topics, {encoding: payload} filled in as clients need them]
+        self.replay: Deque[List[Any]] = deque(maxlen=replay_size)
+        self.resumed = 0
+
+    def __len__(self) -> int:
+        return len(self.subs)
+
+    def register(self, ws: Any, encoding: str = "json") -> Subscriber:
+        sub = Subscriber(self, ws, encoding)
+        self.subs[id(ws)] = sub
+        return sub
+
+    def unregister(self, ws: Any) -> None:
+        sub = self.subs.pop(id(ws), None)
+        if sub and not sub.closed:
+            sub.closed = True
+            sub.task.cancel()
+
+    def drop(self, sub: Subscriber, reason: str) -> None:
+        if sub.closed:
+            return
+        self.unregister(sub.ws)
+        if reason == "slow_consumer":
+            self.disconnected_slow += 1
+            M_DROPPED.inc("disconnect")
+            close = getattr(sub.ws, "close", None)
+            if close:
+                asyncio.get_running_loop().create_task(self._close(close))
+
+    @staticmethod
+    async def _close(close: Any) -> None:
+        try:
+            await close(code=1013)
+        except Exception:
+            pass
+
+    def receivers(self, topics: List[str]) -> List[Subscriber]:
+        if not self.subs:
+            return []
+        return [sub for sub in list(self.subs.values()) if sub.wants(topics)]
+
+    def deliver(self, receivers: List[Subscriber], payloads: Dict[str, Payload], is_debug: bool = False) -> None:
+        """Offers already-encoded payloads (one per encoding) to receivers picked by `receivers()`."""
+        self.published += 1
+        for sub in receivers:
+            sub.offer(payloads[sub.encoding], is_debug)
+
+    @staticmethod
+    def encode_for(msg: Dict[str, Any], receivers: List[Subscriber], payloads: Dict[str, Payload]) -> Dict[str, Payload]:
+        for sub in receivers:
+            if sub.encoding not in payloads:
+                payloads[sub.encoding] = wire.encode(msg, sub.encoding)
+        return payloads
+
+    def publish(self, msg: Dict[str, Any], topics: Optional[List[str]] = None) -> None:
+        topics = topics or message_topics(msg)
+        is_debug = msg.get("type") == "debug"
+        entry: Optional[List[Any]] = None
+        if not is_debug:
+            self.seq += 1
+            msg["seq"] = self.seq
+            entry = [self.seq, msg, topics, {}]
+            self.replay.append(entry)
+        receivers = self.receivers(topics)
+        if not receivers:
+            return
+        payloads = self.encode_for(msg, receivers, entry[3] if entry is not None else {})
+        self.deliver(receivers, payloads, is_debug)
+
+    def relay(self, msg: Dict[str, Any], payload: str) -> None:
+        """
+        Publishes a message another process's hub already stamped and
+        encoded as json (broker.py): its seq is kept, so clients can resume
+        on any worker, and json clients get `payload` without re-encoding.
+        """
+        topics = message_topics(msg)
+        is_debug = msg.get("type") == "debug"
+        payloads: Dict[str, Payload] = {"json": payload}
+        if not is_debug:
+            self.seq = msg["seq"]
+            self.replay.append([self.seq, msg, topics, payloads])
+        receivers = self.receivers(topics)
+        if receivers:
+            self.deliver(receivers, self.encode_for(msg, receivers, payloads), is_debug)
+
+    def reset(self, seq: int, stream: str) -> None:
+        """Continue from another hub's `seq`; the replay buffer is dropped, since it no longer lines up."""
+        self.seq = seq
+        self.stream = stream
+        self.replay.clear()
+
+    def resume(self, sub: Subscriber, seq: int, stream: Optional[str]) -> bool:
+        """
+        Queues every buffered message after `seq` that `sub` wants. False if
+        `seq` is from another stream, or the buffer no longer reaches back
+        that far (or the gap wouldn't fit in the client's queue); the caller
+        should send a snapshot instead.
+        """
+        if stream != self.stream or seq > self.seq:
+            return False
+        if seq < self.seq and (not self.replay or self.replay[0][0] > seq + 1):
+            return False
+        missed = [e for e in self.replay if e[0] > seq]
+        if len(missed) > self.queue_size:
+            return False
+        for entry in missed:
+            if not sub.wants(entry[2]):
+                continue
+            sub.offer(self.encode_for(entry[1], [sub], entry[3])[sub.encoding])
+        self.resumed += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        clients: List[Dict[str, Any]] = [s.stats() for s in self.subs.values()]
+        return {
+            "clients": len(clients),
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "seq": self.seq,
+            "stream": self.stream,
+            "replay_buffered": len(self.replay),
+            "resumed": self.resumed,
+            "disconnected_slow": self.disconnected_slow,
+            "max_queued": max((c["queued"] for c in clients), default=0),
+            "max_lag_ms": max((c["lag_ms_max"] for c in clients), default=0.0),
+            "per_client": clients,
+        }
@@ -0,0 +1,272 @@
+"""
+Write-ahead journal for hedges.
+
+Append-only JSON lines, one record per line:
+
+  open    header: cloid salt, next hedge seq, recently hedged swaps
+  intent  a hedge is about to send orders (written durably first)
+  order   child order k is about to be sent, with its cloid
+  ack     child order k's response
+  done    the hedge is finished (or was reconciled after a crash)
+
+Every child order carries a client order id derived from the journal's
+salt, the hedge seq and k, so after a crash the orders a hedge may have
+sent can be looked up on the exchange by cloid whether or not their
+`order` records reached the disk. Only the `intent` needs to be durable
+before the first order goes out; `write()` waits for that, `write_nowait()`
+doesn't.
+
+Group commit: a writer thread takes everything queued, writes it with one
+write() and one fdatasync(), then wakes every waiter in the batch, so the
+cost of an fsync is shared by whatever arrived while the previous one ran.
+
+In-memory state (open hedges, hedged swaps) is updated when a record is
+queued, on the loop. `compact()` rewrites the file to a header plus the
+records of hedges still open.
+"""
+
+import os
+import json
+import time
+import queue
+import asyncio
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+M_COMMIT = REGISTRY.histogram("journal_commit_seconds", "Hedge journal group commit (write + fdatasync)")
+M_BATCH = REGISTRY.histogram("journal_batch_records", "Records per hedge journal group commit",
+                             buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 1024))
+
+_COMPACT = object()
+
+def read_records(path: str) -> List[Dict[str, Any]]:
+    """Every complete record; a torn last line (crash mid-write) is cut off the file."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    end = data.rfind(b"\n") + 1
+    if end < len(data):
+        with open(path, "r+b") as f:
+            f.truncate(end)
+    return [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+
+class Journal:
+    def __init__(self, path: str, keep_swaps: int = 4096, batch_max: int = 1024):
+        self.path = path
+        self.keep_swaps = keep_swaps
+        self.batch_max = batch_max
+
+        records = read_records(path)
+        header = records[0] if records and records[0].get("t") == "open" else {}
+        self.salt: str = header.get("salt") or secrets.token_hex(16)
+        self.next_seq: int = int(header.get("nextSeq", 1))
+        self.hedged: "OrderedDict[str, None]" = OrderedDict((k, None) for k in header.get("hedged", []))
+        # open hedges by seq: {"intent": rec, "orders": {k: rec}, "acks": {k: rec}}
+        self.hedges: Dict[int, Dict[str, Any]] = {}
+        for rec in records:
+            self._apply(rec)
+
+        self.commits = 0
+        self.records = 0
+        self.batch_max_seen = 0
+        self.last_commit_ms: Optional[float] = None
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "ab")
+        if not header:
+            self._f.write(self._line(self._header()))
+            self._f.flush()
+            os.fsync(self._f.fileno())
+        self._q: "queue.Queue[Optional[Tuple[Any, ...]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="journal-writer", daemon=True)
+        self._writer.start()
+
+    # -----------------------------
+    # State
+    # -----------------------------
+    def _apply(self, rec: Dict[str, Any]) -> None:
+        t = rec.get("t")
+        seq = rec.get("seq")
+        if t == "intent":
+            self.hedges[seq] = {"intent": rec, "orders": {}, "acks": {}}
+            self.next_seq = max(self.next_seq, seq + 1)
+            if rec.get("swap"):
+                self.hedged[rec["swap"]] = None
+                while len(self.hedged) > self.keep_swaps:
+                    self.hedged.popitem(last=False)
+        elif t in ("order", "ack") and seq in self.hedges:
+            self.hedges[seq][t + "s"][rec["k"]] = rec
+        elif t == "done":
+            self.hedges.pop(seq, None)
+
+    def _header(self) -> Dict[str, Any]:
+        return {"t": "open", "salt": self.salt, "nextSeq": self.next_seq, "hedged": list(self.hedged)}
+
+    @staticmethod
+    def _line(rec: Dict[str, Any]) -> bytes:
+        return json.dumps(rec, separators=(",", ":"), default=str).encode() + b"\n"
+
+    def cloid(self, seq: int, k: int) -> str:
+        """Client order id of hedge `seq`'s k-th child order: 16 bytes, hex."""
+        return "0x" + hashlib.sha256(f"{self.salt}:{seq}:{k}".encode()).hexdigest()[:32]
+
+    def was_hedged(self, swap: str) -> bool:
+        return swap in self.hedged
+
+    def unresolved(self) -> Dict[int, Dict[str, Any]]:
+        return dict(self.hedges)
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    async def write(self, rec: Dict[str, Any]) -> None:
+        """Returns once the record is on disk."""
+        self._apply(rec)
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._q.put((self._line(rec), loop, fut))
+        await fut
+
+    def write_nowait(self, rec: Dict[str, Any]) -> None:
+        """Queued for the next group commit; doesn't wait for it."""
+        self._apply(rec)
+        self._q.put((self._line(rec), asyncio.get_running_loop(), None))
+
+    async def begin(self, swap: str, rec: Dict[str, Any]) -> int:
+        """Durably record a hedge intent for `swap`; returns the hedge seq its cloids derive from."""
+        seq = self.next_seq
+        await self.write({"t": "intent", "seq": seq, "swap": swap, "ms": int(time.time() * 1000), **rec})
+        return seq
+
+    async def compact(self) -> None:
+        """Rewrite the file as a header plus the records of hedges still open."""
+        lines = [self._line(self._header())]
+        for h in self.hedges.values():
+            lines.append(self._line(h["intent"]))
+            lines.extend(self._line(r) for r in h["orders"].values())
+            lines.extend(self._line(r) for r in h["acks"].values())
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._q.put((_COMPACT, loop, fut, b"".join(lines)))
+        await fut
+
+    def close(self) -> None:
+        """Commits everything queued so far, then stops the writer."""
+        self._q.put(None)
+        self._writer.join()
+        self._f.close()
+
+    # -----------------------------
+    # Writer thread
+    # -----------------------------
+    def _write_loop(self) -> None:
+        stop = False
+        while not stop:
+            batch = [self._q.get()]
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines: List[bytes] = []
+            waiters: List[Tuple[Any, Any]] = []
+            for item in batch:
+                if item is None:
+                    stop = True
+                    break
+                if item[0] is _COMPACT:
+                    self._commit(lines, waiters)
+                    lines, waiters = [], []
+                    self._settle_all([item[1:3]], self._guard(self._rewrite, item[3]))
+                    continue
+                lines.append(item[0])
+                waiters.append((item[1], item[2]))
+            self._commit(lines, waiters)
+
+    def _commit(self, lines: List[bytes], waiters: List[Tuple[Any, Any]]) -> None:
+        if not lines:
+            return
+        t0 = time.perf_counter()
+        exc = self._guard(self._append, b"".join(lines))
+        took = time.perf_counter() - t0
+        n = len(lines)
+        self.commits += 1
+        self.records += n
+        self.batch_max_seen = max(self.batch_max_seen, n)
+        self.last_commit_ms = round(took * 1000, 3)
+        try:
+            waiters[0][0].call_soon_threadsafe(self._observe, took, n)
+        except RuntimeError:
+            pass  # loop already closed
+        self._settle_all([w for w in waiters if w[1] is not None], exc)
+
+    def _append(self, data: bytes) -> None:
+        self._f.write(data)
+        self._f.flush()
+        os.fdatasync(self._f.fileno())
+
+    def _rewrite(self, data: bytes) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        dir_fd = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        self._f.close()
+        self._f = open(self.path, "ab")
+
+    @staticmethod
+    def _guard(fn, *args) -> Optional[BaseException]:
+        try:
+            fn(*args)
+        except BaseException as e:
+            return e
+        return None
+
+    @staticmethod
+    def _observe(took: float, n: int) -> None:
+        # on the loop: metrics are only touched from there
+        M_COMMIT.observe(took)
+        M_BATCH.observe(n)
+
+    @staticmethod
+    def _settle_all(waiters: List[Tuple[Any, Any]], exc: Optional[BaseException]) -> None:
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(Journal._settle, fut, exc)
+            except RuntimeError:
+                pass  # loop already closed
+
+    @staticmethod
+    def _settle(fut: asyncio.Future, exc: Optional[BaseException]) -> None:
+        if fut.cancelled():
+            return
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "open_hedges": len(self.hedges),
+            "next_seq": self.next_seq,
+            "commits": self.commits,
+            "records": self.records,
+            "batch_max": self.batch_max_seen,
+            "last_commit_ms": self.last_commit_ms,
+            "queued": self._q.qsize(),
+        }
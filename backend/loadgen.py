@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Synthetic Swap-log load generator for the swap listener.
+
+Runs a local JSON-RPC stand-in (websocket `eth_subscribe` logs + HTTP RPC) in a
+background thread and drives the real `evm_swap_listener_loop`, `broadcast`
+and `on_swap_event` from backend/server.py in-process against it. Swap logs
+are ABI-encoded exactly like the pool emits them and sent at a stepped rate.
+
+The backend runs in paper mode with a fixed stand-in HL book, whose mid is
+set so the stand-in vault balances read as balanced: every decision runs the
+full input path (vault balances, book, ratio) and ends in band, with no hedge.
+
+For each rate step it reports:
+  - ingest latency    log sent -> swap message delivered to a /ws client
+  - decision latency  log sent -> on_swap_event finished, for decisions made
+  - failed decisions  on_swap_event crashed (not in the latency figures)
+  - event-loop lag    overshoot of a 10ms sleeper on the backend loop
+  - memory growth     RSS delta over the step
+
+Usage:
+  python backend/loadgen.py --rates 50,100,200,500,1000 --step-seconds 10
+  python backend/loadgen.py --rates 200 --shape burst --burst-size 50
+  python backend/loadgen.py --rates 100,400 --shape poisson --debug
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from eth_abi import encode
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+import uvicorn
+from web3 import Web3
+
+from replay import latency_summary
+
+SWAP_TOPIC0 = Web3.to_hex(Web3.keccak(text="Swap(address,bool,uint256,uint256,uint256,int256)"))
+# every balanceOf on the stand-in RPC: 1M USDC (6 decimals) and 10M PURR (5), balanced at a mid of 0.1
+BALANCE_RAW = 10**12
+BOOK_MID = (BALANCE_RAW / 10**6) / (BALANCE_RAW / 10**5)
+
+# -----------------------------
+# Log synthesis
+# -----------------------------
+def make_swap_log(pool: str, seq: int, block_number: int, rng: random.Random) -> Dict[str, Any]:
+    is_zero_to_one = rng.random() < 0.5
+    amount_in = rng.randint(10**5, 10**9)
+    fee = amount_in * 15 // 10_000
+    amount_out = rng.randint(10**5, 10**9)
+    usdc_delta = amount_in if is_zero_to_one else -amount_out
+    data = encode(["bool", "uint256", "uint256", "uint256", "int256"], [is_zero_to_one, amount_in, fee, amount_out, usdc_delta])
+    sender = "0x" + "00" * 12 + f"{rng.randint(1, 2**32):040x}"
+    return {
+        "address": pool,
+        "topics": [SWAP_TOPIC0, sender],
+        "data": "0x" + data.hex(),
+        "blockNumber": hex(block_number),
+        "transactionHash": f"0x{seq:064x}",
+        "logIndex": "0x0",
+        "removed": False,
+    }
+
+def seq_from_tx(tx_hash: str) -> int:
+    return int(tx_hash, 16)
+
+def schedule(rate: float, seconds: float, shape: str, burst_size: int, rng: random.Random) -> List[float]:
+    """Offsets (s) from step start at which each log of a step is emitted."""
+    n = int(rate * seconds)
+    if n <= 0:
+        return []
+    if shape == "poisson":
+        out, t = [], 0.0
+        while True:
+            t += rng.expovariate(rate)
+            if t >= seconds:
+                return out
+            out.append(t)
+    if shape == "burst":
+        period = burst_size / rate
+        return [(i // burst_size) * period for i in range(n)]
+    return [i / rate for i in range(n)]
+
+# -----------------------------
+# JSON-RPC stand-in (runs in its own thread + loop)
+# -----------------------------
+class Emitter:
+    def __init__(self, args: argparse.Namespace, pool: str):
+        self.args = args
+        self.pool = pool
+        self.rng = random.Random(args.seed)
+        self.sent: Dict[int, Tuple[int, float]] = {}  # seq -> (step, perf_counter)
+        self.step_bounds: List[Tuple[float, float]] = []
+        self.finished = threading.Event()
+
+    async def run(self, ws: WebSocket, sub_id: str) -> None:
+        seq = 0
+        block = 1_000_000
+        for step, rate in enumerate(self.args.rates):
+            offsets = schedule(rate, self.args.step_seconds, self.args.shape, self.args.burst_size, self.rng)
+            start = time.perf_counter()
+            for off in offsets:
+                delay = off - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                seq += 1
+                block += 1
+                log = make_swap_log(self.pool, seq, block, self.rng)
+                frame = json.dumps({"jsonrpc": "2.0", "method": "eth_subscription", "params": {"subscription": sub_id, "result": log}})
+                self.sent[seq] = (step, time.perf_counter())
+                await ws.send_text(frame)
+            end = start + self.args.step_seconds
+            if time.perf_counter() < end:
+                await asyncio.sleep(end - time.perf_counter())
+            self.step_bounds.append((start, time.perf_counter()))
+        self.finished.set()
+
+def build_standin(emitter: Emitter) -> FastAPI:
+    app = FastAPI(title="loadgen stand-in")
+    balance_word = "0x" + f"{BALANCE_RAW:064x}"
+
+    @app.websocket("/ws")
+    async def ws_standin(ws: WebSocket):
+        await ws.accept()
+        task: Optional[asyncio.Task] = None
+        try:
+            while True:
+                req = json.loads(await ws.receive_text())
+                if req.get("method") == "eth_subscribe":
+                    sub_id = "0xloadgen"
+                    await ws.send_text(json.dumps({"jsonrpc": "2.0", "id": req.get("id"), "result": sub_id}))
+                    if task is None:
+                        task = asyncio.create_task(emitter.run(ws, sub_id))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if task:
+                task.cancel()
+
+    def answer(req: Dict[str, Any]) -> Dict[str, Any]:
+        method = req.get("method")
+        if method == "eth_chainId":
+            result: Any = hex(998)
+        elif method == "eth_blockNumber":
+            result = hex(1_000_000)
+        elif method == "eth_call":
+            result = balance_word
+        else:
+            return {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": -32601, "message": f"{method} not supported"}}
+        return {"jsonrpc": "2.0", "id": req.get("id"), "result": result}
+
+    @app.post("/rpc")
+    async def rpc(request: Request):
+        body = await request.json()
+        if isinstance(body, list):
+            return JSONResponse([answer(r) for r in body])
+        return JSONResponse(answer(body))
+
+    return app
+
+def start_standin(app: FastAPI, host: str, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", ws_max_queue=100_000))
+    threading.Thread(target=server.run, name="loadgen-standin", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+class BookStandin:
+    """Stands in for the backend's hl_info: a fixed L2 book around `mid`, no HTTP."""
+    def __init__(self, mid: float, levels: int = 10, tick: float = 0.0001, sz: float = 10_000.0):
+        self.snap = {
+            "levels": [
+                [{"px": str(round(mid - tick * (i + 1), 6)), "sz": str(sz), "n": 1} for i in range(levels)],
+                [{"px": str(round(mid + tick * (i + 1), 6)), "sz": str(sz), "n": 1} for i in range(levels)],
+            ],
+        }
+
+    def l2_snapshot(self, name: str) -> Dict[str, Any]:
+        return {"coin": name, "time": int(time.time() * 1000), **self.snap}
+
+# -----------------------------
+# Driver (backend loop)
+# -----------------------------
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class ProbeClient:
+    """Stands in for a /ws dashboard client; timestamps every swap it receives."""
+    def __init__(self, ingest: Dict[int, float]):
+        self.ingest = ingest
+
+    async def send_text(self, payload: str) -> None:
+        if not payload.startswith('{"type": "swap"'):
+            return
+        seq = seq_from_tx(json.loads(payload)["data"]["txHash"])
+        self.ingest[seq] = time.perf_counter()
+
+async def lag_sampler(samples: List[Tuple[float, float]], interval: float = 0.01) -> None:
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        t1 = time.perf_counter()
+        samples.append((t1, (t1 - t0 - interval) * 1000))
+
+async def drive(args: argparse.Namespace) -> Dict[str, Any]:
+    base = f"{args.host}:{args.port}"
+    os.environ.update({
+        "ALCHEMY_WS_URL": f"ws://{base}/ws",
+        "EVM_RPC_HTTP_URL": f"http://{base}/rpc",
+        "STRATEGIST_EVM_PRIVATE_KEY": os.getenv("STRATEGIST_EVM_PRIVATE_KEY") or "0x" + "11" * 32,
+        "SOVEREIGN_VAULT": "0x000000000000000000000000000000000000bEEF",
+        "USDC_ADDRESS": "0x00000000000000000000000000000000000000a1",
+        "PURR_ADDRESS": "0x00000000000000000000000000000000000000a2",
+        "WATCH_POOL": "0x000000000000000000000000000000000000dEaD",
+        "CHAIN_ID": "998",
+        "ENABLE_HL_TRADING": "false",
+        "PAPER_TRADING": "true",  # decisions need a book; with it trading-disabled runs crashed at the mid fetch
+        "DEBUG": "true" if args.debug else "false",
+        "MAX_EVENTS_STORED": str(args.max_events),
+        "EVENT_STORE_PATH": os.path.join(tempfile.mkdtemp(prefix="loadgen-"), "events.db"),
+    })
+
+    emitter = Emitter(args, Web3.to_checksum_address(os.environ["WATCH_POOL"]))
+    standin = start_standin(build_standin(emitter), args.host, args.port)
+
+    import server  # imported late so it picks up the stand-in env
+    from event_store import EventStore
+
+    server.event_store = EventStore(server.EVENT_STORE_PATH)
+    server.hl_info = BookStandin(BOOK_MID)
+    server.tracer.start()
+
+    ingest: Dict[int, float] = {}
+    decided: Dict[int, float] = {}
+    failed: Dict[int, float] = {}
+    original_on_swap_event = server.on_swap_event
+
+    async def timed_on_swap_event(ev: Dict[str, Any]) -> None:
+        await original_on_swap_event(ev)
+        # on_swap_event swallows its exceptions; the swap's trace says whether it crashed
+        trace = server.current_swap.get()
+        done = failed if trace is not None and trace.outcome == "crash" else decided
+        done[seq_from_tx(ev["txHash"])] = time.perf_counter()
+
+    server.on_swap_event = timed_on_swap_event
+    server.hub.register(ProbeClient(ingest))
+
+    lag: List[Tuple[float, float]] = []
+    sampler = asyncio.create_task(lag_sampler(lag))
+    listener = asyncio.create_task(server.evm_swap_listener_loop())
+
+    rss_marks = [rss_bytes()]
+    seen_steps = 0
+    while not emitter.finished.is_set():
+        await asyncio.sleep(0.05)
+        while len(emitter.step_bounds) > seen_steps:
+            rss_marks.append(rss_bytes())
+            seen_steps += 1
+    await asyncio.sleep(args.drain)
+    while len(rss_marks) <= len(args.rates):
+        rss_marks.append(rss_bytes())
+
+    listener.cancel()
+    sampler.cancel()
+    standin.should_exit = True
+    await server.tracer.stop()
+    server.event_store.close()
+
+    steps = []
+    for step, rate in enumerate(args.rates):
+        sent = {s: t for s, (st, t) in emitter.sent.items() if st == step}
+        ing = [(ingest[s] - t) * 1000 for s, t in sent.items() if s in ingest]
+        dec = [(decided[s] - t) * 1000 for s, t in sent.items() if s in decided]
+        n_failed = sum(1 for s in sent if s in failed)
+        start, end = emitter.step_bounds[step]
+        step_lag = [v for (t, v) in lag if start <= t <= end]
+        steps.append({
+            "rate": rate,
+            "sent": len(sent),
+            "ingested": len(ing),
+            "decided": len(dec),
+            "failed": n_failed,
+            "ingest": latency_summary(ing),
+            "decision": latency_summary(dec),
+            "loop_lag": latency_summary(step_lag),
+            "rss_growth_bytes": rss_marks[step + 1] - rss_marks[step],
+        })
+
+    return {
+        "shape": args.shape,
+        "step_seconds": args.step_seconds,
+        "debug": args.debug,
+        "events_stored": len(server.EVENTS),
+        "steps": steps,
+    }
+
+def print_table(report: Dict[str, Any]) -> None:
+    def fmt(v: Optional[float]) -> str:
+        return f"{v:8.2f}" if v is not None else "       -"
+
+    print(f"\n{'rate':>6} {'sent':>6} {'done':>6} {'failed':>6} {'ing p50':>8} {'ing p99':>8} {'dec p50':>8} {'dec p99':>8} {'lag p99':>8} {'lag max':>8} {'rss +MB':>8}")
+    for s in report["steps"]:
+        print(
+            f"{s['rate']:>6g} {s['sent']:>6} {s['decided']:>6} {s['failed']:>6} "
+            f"{fmt(s['ingest']['p50_ms'])} {fmt(s['ingest']['p99_ms'])} "
+            f"{fmt(s['decision']['p50_ms'])} {fmt(s['decision']['p99_ms'])} "
+            f"{fmt(s['loop_lag']['p99_ms'])} {fmt(s['loop_lag']['max_ms'])} "
+            f"{s['rss_growth_bytes'] / 1e6:8.2f}"
+        )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Swap-log load generator for backend/server.py")
+    parser.add_argument("--rates", type=lambda s: [float(x) for x in s.split(",")], default=[50, 100, 200, 500],
+                        help="Comma separated logs/s per step")
+    parser.add_argument("--step-seconds", type=float, default=10.0)
+    parser.add_argument("--shape", choices=["steady", "burst", "poisson"], default="steady")
+    parser.add_argument("--burst-size", type=int, default=20, help="Logs per burst for --shape burst")
+    parser.add_argument("--drain", type=float, default=3.0, help="Seconds to wait after the last step")
+    parser.add_argument("--debug", action="store_true", help="Run the backend with DEBUG=true")
+    parser.add_argument("--max-events", type=int, default=100_000, help="MAX_EVENTS_STORED for the backend")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8546)
+    parser.add_argument("--report", type=str, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(drive(args))
+    print_table(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
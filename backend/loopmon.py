@@ -0,0 +1,133 @@
+"""
+Event-loop lag monitor and stall detector.
+
+A sampler task sleeps `interval` on the loop and records how late it wakes
+up: that overshoot is the scheduling lag every other callback sees. A
+watchdog thread watches the sampler's heartbeat; when the loop has not come
+round for longer than the stall threshold, the callback or coroutine step
+that is holding it is still on the loop thread's stack, so the watchdog
+captures that stack from `sys._current_frames()`. When the loop comes back,
+the sampler records the stall with its duration and the captured stack.
+
+Stalls shorter than about 1.5x the threshold can finish before the
+watchdog looks; they are still counted and timed, just without a stack.
+
+Queue depth of the blocking-call pools is reported by executors.py, per pool.
+"""
+
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from metrics import LATENCY_BUCKETS, REGISTRY
+
+M_LAG = REGISTRY.histogram("event_loop_lag_seconds", "Event loop scheduling lag (sampler wake-up overshoot)", LATENCY_BUCKETS)
+M_STALLS = REGISTRY.counter("event_loop_stalls_total", "Loop stalls longer than LOOP_STALL_MS")
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.05, stall_threshold: float = 0.1, keep: int = 50, stack_depth: int = 40):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.stack_depth = stack_depth
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+        self.stall_count = 0
+
+        self._loop_thread_id: Optional[int] = None
+        self._beat = time.perf_counter()
+        self._captured_for: Optional[float] = None
+        self._captured_stack: Optional[List[str]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._task = asyncio.create_task(self._sampler(), name="loop_monitor")
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # -----------------------------
+    # Loop side
+    # -----------------------------
+    async def _sampler(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            t1 = time.perf_counter()
+            prev_beat = self._beat
+            self._beat = t1
+
+            lag = max(0.0, t1 - t0 - self.interval)
+            M_LAG.observe(lag)
+            self.lag_last = lag
+            if lag > self.lag_max:
+                self.lag_max = lag
+            if lag >= self.stall_threshold:
+                self._record_stall(lag, prev_beat)
+
+    def _record_stall(self, lag: float, prev_beat: float) -> None:
+        stack = self._captured_stack if self._captured_for == prev_beat else None
+        self._captured_for = None
+        self._captured_stack = None
+        self.stall_count += 1
+        M_STALLS.inc()
+        self.stalls.append({
+            "atMs": int(time.time() * 1000 - lag * 1000),
+            "ms": round(lag * 1000, 3),
+            "stack": stack,
+        })
+
+    # -----------------------------
+    # Watchdog thread
+    # -----------------------------
+    def _watch(self) -> None:
+        period = max(self.stall_threshold / 2, 0.005)
+        while not self._stop.wait(period):
+            beat = self._beat
+            if time.perf_counter() - beat < self.interval + self.stall_threshold:
+                continue
+            if self._captured_for == beat:
+                continue  # already have this stall's stack
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._captured_stack = [line.rstrip("\n") for line in traceback.format_stack(frame)[-self.stack_depth:]]
+            self._captured_for = beat
+
+    # -----------------------------
+    # Reporting
+    # -----------------------------
+    def stats(self) -> Dict[str, Any]:
+        last = self.stalls[-1] if self.stalls else None
+        return {
+            "lag_ms_last": round(self.lag_last * 1000, 3),
+            "lag_ms_max": round(self.lag_max * 1000, 3),
+            "stall_threshold_ms": self.stall_threshold * 1000,
+            "stalls": self.stall_count,
+            "last_stall": None if last is None else {
+                "atMs": last["atMs"],
+                "ms": last["ms"],
+                "where": last["stack"][-1].strip().splitlines()[0] if last["stack"] else None,
+            },
+        }
+
+    def recent_stalls(self) -> List[Dict[str, Any]]:
+        return list(self.stalls)
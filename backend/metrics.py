@@ -0,0 +1,139 @@
+"""
+Minimal Prometheus-style metrics, cheap enough for the hot path.
+
+A histogram observation is one bisect over fixed bucket bounds and two
+additions, a counter increment is a dict update. Nothing is locked:
+everything observed here runs on the event loop (or is a single-bytecode
+update from a thread, which the GIL keeps whole). Cumulative buckets and
+the text exposition format are only computed when /metrics is scraped.
+"""
+
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# seconds; 250us .. 10s
+LATENCY_BUCKETS = (0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(names, values)) + "}"
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+class Histogram:
+    """With `labelnames`, observe through `labels(...)`, which returns a cached child histogram."""
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], "Histogram"] = {}
+
+    def labels(self, *values: str) -> "Histogram":
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = Histogram(self.name, self.help, self.bounds)
+        return child
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def _series(self, labels: str) -> List[str]:
+        # labels: 'k="v",...' without braces, or ""
+        sep = "," if labels else ""
+        out = []
+        acc = 0
+        for bound, c in zip(self.bounds, self.counts):
+            acc += c
+            out.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {acc}')
+        out.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {acc + self.counts[-1]}')
+        suffix = f"{{{labels}}}" if labels else ""
+        out.append(f"{self.name}_sum{suffix} {self.sum!r}")
+        out.append(f"{self.name}_count{suffix} {self.count}")
+        return out
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        if not self.labelnames:
+            return out + self._series("")
+        for values, child in sorted(self.children.items()):
+            out.extend(child._series(_labels(self.labelnames, values)[1:-1]))
+        return out
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {} if labelnames else {(): 0.0}
+
+    def inc(self, *labels: str, by: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + by
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, v in sorted(self.values.items()):
+            out.append(f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}")
+        return out
+
+class Gauge:
+    """
+    Set directly, or pass `fn` to read the value at scrape time. With
+    `labelnames`, `fn` returns {label values tuple: value}.
+    """
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], Any]] = None, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.value = 0.0
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        v = self.fn() if self.fn else self.value
+        if not self.labelnames:
+            return out + [f"{self.name} {_num(v)}"]
+        for labels, value in sorted(v.items()):
+            out.append(f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}")
+        return out
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: Dict[str, object] = {}
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS, labelnames: Sequence[str] = ()) -> Histogram:
+        return self._add(Histogram(name, help, buckets, labelnames))
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, fn: Optional[Callable[[], Any]] = None, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, fn, labelnames))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # a callback gauge whose source isn't ready yet; skip it this scrape
+                continue
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
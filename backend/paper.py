@@ -0,0 +1,207 @@
+"""
+Paper execution backend for hedge dry runs.
+
+PaperExchange exposes the same `market_open` call the server makes on the
+Hyperliquid SDK `Exchange`, and answers with the same response shape, but
+fills are matched against a locally held copy of the L2 book instead of
+being sent to the exchange. Balances are simulated and every fill is kept
+with its slippage against mid and the modelled latency.
+
+Model:
+  - latency     each order sleeps `latency_ms` before it "arrives", then
+                matches against the book as seen at arrival
+  - queue       only (1 - queue_ahead) of each displayed level is assumed
+                reachable; the rest is taken by flow ahead of us
+  - depletion   our own fills consume the local book until it is refreshed
+                (`book_ttl_ms`), so consecutive child orders can't fill the
+                same liquidity twice
+  - fees        taker fee in bps, charged in USDC
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+def _level(lvl: Any) -> Tuple[float, float]:
+    if isinstance(lvl, dict):
+        return float(lvl["px"]), float(lvl["sz"])
+    return float(lvl[0]), float(lvl[1])
+
+class PaperExchange:
+    def __init__(
+        self,
+        info: Any,
+        market: str,
+        base_coin: str = "PURR",
+        quote_coin: str = "USDC",
+        balances: Optional[Dict[str, float]] = None,
+        latency_ms: float = 50.0,
+        queue_ahead: float = 0.1,
+        taker_fee_bps: float = 7.0,
+        book_ttl_ms: float = 500.0,
+        max_fills: int = 10_000,
+    ):
+        self.info = info
+        self.market = market
+        self.base_coin = base_coin
+        self.quote_coin = quote_coin
+        self.balances: Dict[str, float] = dict(balances or {})
+        self.latency_ms = latency_ms
+        self.queue_ahead = min(max(queue_ahead, 0.0), 1.0)
+        self.taker_fee_bps = taker_fee_bps
+        self.book_ttl_ms = book_ttl_ms
+
+        self.fills: Deque[Dict[str, Any]] = deque(maxlen=max_fills)
+        self._lock = threading.Lock()
+        self._next_oid = 1
+        self._book: Optional[Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]] = None
+        self._book_ms = 0.0
+        self._consumed: Dict[Tuple[bool, float], float] = {}
+
+    # -----------------------------
+    # Book
+    # -----------------------------
+    def _current_book(self) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+        now = time.time() * 1000
+        if self._book is None or now - self._book_ms > self.book_ttl_ms:
+            snap = self.info.l2_snapshot(self.market)
+            levels = snap.get("levels", [[], []])
+            self._book = ([_level(l) for l in levels[0]], [_level(l) for l in levels[1]])
+            self._book_ms = now
+            self._consumed.clear()
+        return self._book
+
+    # -----------------------------
+    # SDK-compatible surface
+    # -----------------------------
+    def market_open(
+        self,
+        name: str,
+        is_buy: bool,
+        sz: float,
+        px: Optional[float] = None,
+        slippage: float = 0.05,
+        cloid: Any = None,
+        builder: Any = None,
+    ) -> Dict[str, Any]:
+        t_submit = time.perf_counter()
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000.0)
+
+        with self._lock:
+            bids, asks = self._current_book()
+            if not bids or not asks:
+                return self._status({"error": "Paper book empty"})
+
+            mid = (bids[0][0] + asks[0][0]) / 2.0
+            ref = px if px is not None else mid
+            limit_px = ref * (1 + slippage) if is_buy else ref * (1 - slippage)
+
+            remaining = float(sz)
+            filled_sz = 0.0
+            notional = 0.0
+            takes: List[Tuple[Tuple[bool, float], float]] = []
+            for lvl_px, lvl_sz in (asks if is_buy else bids):
+                if remaining <= 0:
+                    break
+                if (is_buy and lvl_px > limit_px) or (not is_buy and lvl_px < limit_px):
+                    break
+                key = (is_buy, lvl_px)
+                reachable = lvl_sz * (1.0 - self.queue_ahead) - self._consumed.get(key, 0.0)
+                if reachable <= 0:
+                    continue
+                take = min(remaining, reachable)
+                takes.append((key, take))
+                filled_sz += take
+                notional += take * lvl_px
+                remaining -= take
+
+            if filled_sz <= 0:
+                return self._status({"error": "Order could not immediately match against any resting orders."})
+
+            fee = notional * self.taker_fee_bps / 10_000
+            quote = self.balances.get(self.quote_coin, 0.0)
+            base = self.balances.get(self.base_coin, 0.0)
+            if is_buy and notional + fee > quote:
+                return self._status({"error": "Insufficient spot balance"})
+            if not is_buy and filled_sz > base:
+                return self._status({"error": "Insufficient spot balance"})
+
+            for key, take in takes:
+                self._consumed[key] = self._consumed.get(key, 0.0) + take
+
+            if is_buy:
+                self.balances[self.quote_coin] = quote - notional - fee
+                self.balances[self.base_coin] = base + filled_sz
+            else:
+                self.balances[self.quote_coin] = quote + notional - fee
+                self.balances[self.base_coin] = base - filled_sz
+
+            avg_px = notional / filled_sz
+            oid = self._next_oid
+            self._next_oid += 1
+            slip_bps = ((avg_px - mid) / mid if is_buy else (mid - avg_px) / mid) * 10_000
+
+            self.fills.append({
+                "ts_ms": int(time.time() * 1000),
+                "oid": oid,
+                "cloid": str(cloid) if cloid is not None else None,
+                "coin": name,
+                "isBuy": is_buy,
+                "requested_sz": float(sz),
+                "sz": filled_sz,
+                "avg_px": avg_px,
+                "mid": mid,
+                "slippage_bps": slip_bps,
+                "fee_usdc": fee,
+                "levels": len(takes),
+                "latency_ms": (time.perf_counter() - t_submit) * 1000,
+            })
+
+            return self._status({"filled": {"totalSz": str(filled_sz), "avgPx": str(avg_px), "oid": oid}})
+
+    def spot_user_state(self, address: Any = None) -> Dict[str, Any]:
+        with self._lock:
+            return {"balances": [{"coin": c, "total": str(v), "hold": "0.0"} for c, v in self.balances.items()]}
+
+    def query_order_by_cloid(self, user: Any, cloid: Any) -> Dict[str, Any]:
+        """Info.query_order_by_cloid's shape; only filled paper orders are remembered."""
+        with self._lock:
+            for f in reversed(self.fills):
+                if f["cloid"] == str(cloid):
+                    return {"status": "order", "order": {
+                        "order": {
+                            "coin": f["coin"],
+                            "side": "B" if f["isBuy"] else "A",
+                            "limitPx": str(f["avg_px"]),
+                            "sz": str(f["requested_sz"] - f["sz"]),
+                            "origSz": str(f["requested_sz"]),
+                            "oid": f["oid"],
+                            "cloid": f["cloid"],
+                            "timestamp": f["ts_ms"],
+                        },
+                        "status": "filled" if f["sz"] >= f["requested_sz"] else "canceled",
+                        "statusTimestamp": f["ts_ms"],
+                    }}
+        return {"status": "unknownOid"}
+
+    # -----------------------------
+    # Reporting
+    # -----------------------------
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            fills = list(self.fills)
+            balances = dict(self.balances)
+        n = len(fills)
+        return {
+            "balances": balances,
+            "fills": n,
+            "avg_slippage_bps": sum(f["slippage_bps"] for f in fills) / n if n else None,
+            "avg_latency_ms": sum(f["latency_ms"] for f in fills) / n if n else None,
+            "fees_usdc": sum(f["fee_usdc"] for f in fills),
+        }
+
+    @staticmethod
+    def _status(status: Dict[str, Any]) -> Dict[str, Any]:
+        return {"status": "ok", "response": {"type": "order", "data": {"statuses": [status]}}}
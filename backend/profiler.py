@@ -0,0 +1,136 @@
+"""
+On-demand profiling for the running server.
+
+`profile()` runs a sampling profiler for a bounded number of seconds: a
+background thread reads `sys._current_frames()` at `hz` and counts stacks,
+output as collapsed stacks ("a;b;c 42" per line) that flamegraph.pl,
+speedscope and inferno read directly. Cost is one frame walk per sample,
+off the loop, so overhead is bounded by `hz` whatever the load.
+
+`memory_diff()` takes two tracemalloc snapshots `seconds` apart and returns
+the biggest growth by line (or by traceback). tracemalloc slows every
+allocation while it's on, so it's only enabled for the session and
+stopped again afterwards unless it was already running.
+
+Only one session (of either kind) runs at a time; see `session`. Their
+blocking steps (joining the sampler, taking and diffing snapshots) run via
+`offload(fn, *args)`, e.g. a dedicated pool's `run`; the default executor
+if none is given.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+MAX_SECONDS = 60.0
+MAX_HZ = 250
+
+session = asyncio.Lock()
+
+def _label(code: Any) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    def __init__(self, hz: int = 100, thread_ids: Optional[List[int]] = None, max_depth: int = 128):
+        self.interval = 1.0 / max(1, min(hz, MAX_HZ))
+        self.thread_ids = thread_ids  # None = every thread but the sampler
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        next_at = time.perf_counter()
+        while not self._stop.is_set():
+            frames = sys._current_frames()
+            for tid, frame in frames.items():
+                if tid == me or (self.thread_ids is not None and tid not in self.thread_ids):
+                    continue
+                stack: List[str] = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            next_at += self.interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_at = time.perf_counter()  # fell behind; don't try to catch up
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+Offload = Callable[..., Awaitable[Any]]
+
+async def profile(
+    seconds: float, hz: int = 100, thread_ids: Optional[List[int]] = None, offload: Optional[Offload] = None
+) -> Tuple[str, int]:
+    """Collapsed stacks and the number of sampling rounds taken."""
+    offload = offload or asyncio.to_thread
+    prof = SamplingProfiler(hz, thread_ids)
+    prof.start()
+    try:
+        await asyncio.sleep(max(0.1, min(seconds, MAX_SECONDS)))
+    finally:
+        await offload(prof.stop)
+    return prof.collapsed(), prof.samples
+
+async def memory_diff(
+    seconds: float, top: int = 30, group_by: str = "lineno", nframes: int = 1, offload: Optional[Offload] = None
+) -> Dict[str, Any]:
+    offload = offload or asyncio.to_thread
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise ValueError("group_by must be lineno, filename or traceback")
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(max(1, min(nframes, 25)))
+    try:
+        before = await offload(tracemalloc.take_snapshot)
+        await asyncio.sleep(max(0.1, min(seconds, MAX_SECONDS)))
+        after = await offload(tracemalloc.take_snapshot)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+
+    def _diff() -> List[Dict[str, Any]]:
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+        stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), group_by)
+        out = []
+        for st in stats[:top]:
+            out.append({
+                "where": [f"{f.filename}:{f.lineno}" for f in st.traceback],
+                "size_diff": st.size_diff,
+                "size": st.size,
+                "count_diff": st.count_diff,
+                "count": st.count,
+            })
+        return out
+
+    return {
+        "seconds": seconds,
+        "group_by": group_by,
+        "traced_current": current,
+        "traced_peak": peak,
+        "top": await offload(_diff),
+    }
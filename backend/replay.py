@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Record/replay harness for the swap listener backend.
+
+Record mode runs a local proxy in front of the real upstreams (Alchemy WS,
+EVM HTTP RPC, Hyperliquid Info/Exchange) and writes every frame, request and
+response with its arrival time into a gzip'd JSON-lines session file.
+
+Replay mode serves a recorded session back from the same routes, either at
+the original pace (--speed 1) or as fast as possible (--speed 0), and reports
+swap -> decision -> order latency of the backend under test.
+
+The backend itself is not modified, it is only pointed at the proxy:
+
+  ALCHEMY_WS_URL=ws://127.0.0.1:8545/ws
+  EVM_RPC_HTTP_URL=http://127.0.0.1:8545/rpc
+  HL_BASE_URL=http://127.0.0.1:8545
+
+Usage:
+  # Record a live session (upstreams are read from the usual env vars)
+  python backend/replay.py record --out session.rec.gz
+
+  # Replay it at max speed and watch the backend's /ws for decisions
+  python backend/replay.py replay session.rec.gz --speed 0 --backend-ws ws://127.0.0.1:8000/ws
+"""
+
+import os
+import sys
+import json
+import gzip
+import time
+import asyncio
+import argparse
+import urllib.request
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+import uvicorn
+import websockets
+
+load_dotenv()
+
+# -----------------------------
+# Session file
+# -----------------------------
+# One JSON object per line:
+#   {"t": <ms since session start>, "k": <kind>, ...}
+# kinds:
+#   ws_out  frame sent by the backend to the log provider     {"raw": str}
+#   ws_in   frame sent by the log provider to the backend     {"raw": str}
+#   rpc     EVM JSON-RPC call                                 {"req": obj, "resp": obj}
+#   hl      Hyperliquid POST                                  {"path": str, "req": obj, "resp": obj}
+
+class SessionWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.t0 = time.perf_counter()
+        self.f = gzip.open(path, "wt", encoding="utf-8")
+        self.count = 0
+
+    def write(self, kind: str, **fields: Any) -> None:
+        rec = {"t": round((time.perf_counter() - self.t0) * 1000, 3), "k": kind, **fields}
+        self.f.write(json.dumps(rec, separators=(",", ":"), default=str))
+        self.f.write("\n")
+        self.count += 1
+
+    def close(self) -> None:
+        self.f.close()
+
+def load_session(path: str) -> List[Dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    s = sorted(values)
+    idx = min(len(s) - 1, max(0, int(round(p / 100.0 * (len(s) - 1)))))
+    return s[idx]
+
+def latency_summary(values: List[float]) -> Dict[str, Any]:
+    return {
+        "n": len(values),
+        "p50_ms": percentile(values, 50),
+        "p99_ms": percentile(values, 99),
+        "max_ms": max(values) if values else None,
+    }
+
+def _post_json(url: str, body: Any, timeout: float = 30.0) -> Any:
+    data = json.dumps(body).encode()
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        return json.loads(r.read())
+
+# -----------------------------
+# Record: proxy in front of the real upstreams
+# -----------------------------
+def build_recorder(out_path: str) -> FastAPI:
+    ws_upstream = os.getenv("ALCHEMY_WS_URL")
+    rpc_upstream = os.getenv("EVM_RPC_HTTP_URL")
+    hl_upstream = os.getenv("HL_BASE_URL", "https://api.hyperliquid-testnet.xyz")
+    if not ws_upstream or not rpc_upstream:
+        raise RuntimeError("record mode needs ALCHEMY_WS_URL and EVM_RPC_HTTP_URL of the real upstreams")
+
+    writer = SessionWriter(out_path)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        try:
+            yield
+        finally:
+            writer.close()
+            print(f"[record] wrote {writer.count} records to {out_path}", flush=True)
+
+    app = FastAPI(title="replay recorder", lifespan=lifespan)
+
+    @app.websocket("/ws")
+    async def ws_proxy(ws: WebSocket):
+        await ws.accept()
+        async with websockets.connect(ws_upstream, ping_interval=20, ping_timeout=20) as up:
+            async def client_to_upstream():
+                while True:
+                    raw = await ws.receive_text()
+                    writer.write("ws_out", raw=raw)
+                    await up.send(raw)
+
+            async def upstream_to_client():
+                async for raw in up:
+                    writer.write("ws_in", raw=raw)
+                    await ws.send_text(raw)
+
+            tasks = [asyncio.create_task(client_to_upstream()), asyncio.create_task(upstream_to_client())]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            except WebSocketDisconnect:
+                pass
+            finally:
+                for t in tasks:
+                    t.cancel()
+
+    @app.post("/rpc")
+    async def rpc_proxy(request: Request):
+        body = await request.json()
+        resp = await asyncio.to_thread(_post_json, rpc_upstream, body)
+        writer.write("rpc", req=body, resp=resp)
+        return JSONResponse(resp)
+
+    @app.post("/{path}")
+    async def hl_proxy(path: str, request: Request):
+        body = await request.json()
+        resp = await asyncio.to_thread(_post_json, f"{hl_upstream}/{path}", body)
+        writer.write("hl", path=path, req=body, resp=resp)
+        return JSONResponse(resp)
+
+    return app
+
+# -----------------------------
+# Replay: stand-in upstreams serving a recorded session
+# -----------------------------
+def _rpc_key(req: Dict[str, Any]) -> Tuple[str, str]:
+    return req.get("method", ""), json.dumps(req.get("params", []), sort_keys=True)
+
+def _hl_key(path: str, req: Dict[str, Any]) -> str:
+    if path == "exchange":
+        # nonce and signature differ on every order; match on the action type only
+        return f"exchange:{req.get('action', {}).get('type')}"
+    return f"{path}:{json.dumps(req, sort_keys=True)}"
+
+class ResponseBook:
+    """
+    Recorded responses per request key, handed out in recording order.
+    Once a key runs dry its last response keeps being served.
+    """
+    def __init__(self) -> None:
+        self.by_key: Dict[Any, Deque[Any]] = {}
+        self.last: Dict[Any, Any] = {}
+
+    def add(self, key: Any, resp: Any) -> None:
+        self.by_key.setdefault(key, deque()).append(resp)
+
+    def take(self, key: Any) -> Optional[Any]:
+        q = self.by_key.get(key)
+        if q:
+            self.last[key] = q.popleft()
+        return self.last.get(key)
+
+class Replayer:
+    def __init__(self, records: List[Dict[str, Any]], speed: float):
+        self.speed = speed
+        self.rpc = ResponseBook()
+        self.rpc_by_method = ResponseBook()
+        self.hl = ResponseBook()
+        self.hl_by_type = ResponseBook()
+        self.sub_resp: Optional[Dict[str, Any]] = None
+        self.notifications: List[Tuple[float, str]] = []
+        self.next_log = 0
+
+        for rec in records:
+            k = rec["k"]
+            if k == "rpc":
+                reqs = rec["req"] if isinstance(rec["req"], list) else [rec["req"]]
+                resps = rec["resp"] if isinstance(rec["resp"], list) else [rec["resp"]]
+                for rq, rs in zip(reqs, resps):
+                    self.rpc.add(_rpc_key(rq), rs)
+                    self.rpc_by_method.add(rq.get("method"), rs)
+            elif k == "hl":
+                self.hl.add(_hl_key(rec["path"], rec["req"]), rec["resp"])
+                self.hl_by_type.add(f"{rec['path']}:{rec['req'].get('type')}", rec["resp"])
+            elif k == "ws_in":
+                msg = json.loads(rec["raw"])
+                if msg.get("method") == "eth_subscription":
+                    self.notifications.append((rec["t"], rec["raw"]))
+                elif self.sub_resp is None and "result" in msg:
+                    self.sub_resp = msg
+
+        # latency bookkeeping: when each log was emitted, and the latest emit of each txHash
+        self.sent_at: List[float] = []
+        self.sent_by_tx: Dict[str, float] = {}
+        # txHash of the hedge between its rebalance_intent and rebalance_result (the backend
+        # runs one at a time), and /exchange posts that came in before its intent did
+        self.hedging: Optional[str] = None
+        self.orders_early: List[float] = []
+        self.stage_ms: Dict[str, List[float]] = {"ingest": [], "decision": [], "order": [], "result": []}
+        self._attributed: Dict[str, int] = {"ingest": 0, "decision": 0, "order": 0, "result": 0}
+        self.done = asyncio.Event()
+
+    def answer_rpc(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        rs = self.rpc.take(_rpc_key(req)) or self.rpc_by_method.take(req.get("method"))
+        if rs is None:
+            return {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": -32601, "message": "not in recording"}}
+        return {**rs, "id": req.get("id")}
+
+    def answer_hl(self, path: str, req: Dict[str, Any]) -> Optional[Any]:
+        if path == "exchange":
+            now = time.perf_counter()
+            if self.hedging is not None:
+                self._attribute("order", self.hedging, now)
+            else:
+                self.orders_early.append(now)  # raced ahead of its intent on /ws
+        rs = self.hl.take(_hl_key(path, req))
+        if rs is None:
+            rs = self.hl_by_type.take(f"{path}:{req.get('type')}")
+        return rs
+
+    def _attribute(self, stage: str, tx: Optional[str], at: Optional[float] = None) -> None:
+        # timed from the emit of the log the backend says it is answering
+        sent = self.sent_by_tx.get(tx) if tx else None
+        if sent is not None:
+            self.stage_ms[stage].append(((at or time.perf_counter()) - sent) * 1000)
+            self._attributed[stage] += 1
+
+    def on_backend_msg(self, msg: Dict[str, Any]) -> None:
+        typ = msg.get("type")
+        tx = (msg.get("data") or {}).get("txHash")
+        if typ == "swap":
+            self._attribute("ingest", tx)
+        elif typ == "rebalance_intent":
+            self._attribute("decision", tx)
+            self.hedging = tx
+            for at in self.orders_early:
+                self._attribute("order", tx, at)
+            self.orders_early.clear()
+        elif typ == "rebalance_result":
+            self._attribute("result", tx)
+            self.hedging = None
+
+    async def stream_logs(self, ws: WebSocket) -> None:
+        # a reconnecting backend resumes where the previous connection stopped
+        if self.next_log >= len(self.notifications):
+            self.done.set()
+            return
+        t_first = self.notifications[self.next_log][0]
+        start = time.perf_counter()
+        while self.next_log < len(self.notifications):
+            t_rec, raw = self.notifications[self.next_log]
+            if self.speed > 0:
+                due = (t_rec - t_first) / 1000.0 / self.speed
+                delay = due - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.sent_at.append(time.perf_counter())
+            tx = json.loads(raw).get("params", {}).get("result", {}).get("transactionHash")
+            if tx:
+                self.sent_by_tx[tx] = self.sent_at[-1]
+            await ws.send_text(raw)
+            self.next_log += 1
+            if self.speed <= 0:
+                await asyncio.sleep(0)
+        self.done.set()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "logs_sent": len(self.sent_at),
+            "speed": self.speed,
+            "stages": {k: latency_summary(v) for k, v in self.stage_ms.items()},
+        }
+
+def build_replayer(replayer: Replayer) -> FastAPI:
+    app = FastAPI(title="replay stand-in")
+
+    @app.websocket("/ws")
+    async def ws_standin(ws: WebSocket):
+        await ws.accept()
+        streamer: Optional[asyncio.Task] = None
+        try:
+            while True:
+                req = json.loads(await ws.receive_text())
+                if req.get("method") == "eth_subscribe":
+                    resp = dict(replayer.sub_resp or {"jsonrpc": "2.0", "result": "0xreplay"})
+                    resp["id"] = req.get("id")
+                    await ws.send_text(json.dumps(resp))
+                    if streamer is None:
+                        streamer = asyncio.create_task(replayer.stream_logs(ws))
+                else:
+                    await ws.send_text(json.dumps(replayer.answer_rpc(req)))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if streamer:
+                streamer.cancel()
+
+    @app.post("/rpc")
+    async def rpc_standin(request: Request):
+        body = await request.json()
+        if isinstance(body, list):
+            return JSONResponse([replayer.answer_rpc(r) for r in body])
+        return JSONResponse(replayer.answer_rpc(body))
+
+    @app.post("/{path}")
+    async def hl_standin(path: str, request: Request):
+        body = await request.json()
+        resp = replayer.answer_hl(path, body)
+        if resp is None:
+            print(f"[replay] no recorded response for {path}: {json.dumps(body)[:200]}", flush=True)
+            return JSONResponse({"error": f"{path} request not in recording"}, status_code=500)
+        return JSONResponse(resp)
+
+    return app
+
+async def watch_backend(url: str, replayer: Replayer) -> None:
+    while True:
+        try:
+            async with websockets.connect(url) as ws:
+                async for raw in ws:
+                    try:
+                        replayer.on_backend_msg(json.loads(raw))
+                    except Exception:
+                        continue
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await asyncio.sleep(0.5)
+
+async def run_replay(args: argparse.Namespace) -> Dict[str, Any]:
+    records = load_session(args.session)
+    replayer = Replayer(records, speed=args.speed)
+    print(f"[replay] {len(records)} records, {len(replayer.notifications)} logs, speed={args.speed}", flush=True)
+
+    server = uvicorn.Server(uvicorn.Config(build_replayer(replayer), host=args.host, port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    watcher = asyncio.create_task(watch_backend(args.backend_ws, replayer)) if args.backend_ws else None
+
+    done_waiter = asyncio.create_task(replayer.done.wait())
+    await asyncio.wait([done_waiter, server_task], timeout=args.timeout, return_when=asyncio.FIRST_COMPLETED)
+    if server_task.done():
+        done_waiter.cancel()
+        raise RuntimeError("replay stand-in exited before the session finished")
+    if not done_waiter.done():
+        done_waiter.cancel()
+        print(f"[replay] timed out after {args.timeout}s with {len(replayer.notifications) - replayer.next_log} logs unsent", flush=True)
+    # let in-flight decisions and orders land before reporting
+    await asyncio.sleep(args.drain)
+
+    if watcher:
+        watcher.cancel()
+    server.should_exit = True
+    await server_task
+    return replayer.report()
+
+# -----------------------------
+# CLI
+# -----------------------------
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record/replay upstream traffic for backend/server.py")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    rec = sub.add_parser("record", help="Proxy the real upstreams and record a session")
+    rec.add_argument("--out", "-o", required=True, help="Session file to write (.rec.gz)")
+    rec.add_argument("--host", default="127.0.0.1")
+    rec.add_argument("--port", type=int, default=8545)
+
+    rep = sub.add_parser("replay", help="Serve a recorded session to the backend")
+    rep.add_argument("session", help="Session file written by record mode")
+    rep.add_argument("--speed", type=float, default=1.0, help="1 = original pace, 0 = max speed")
+    rep.add_argument("--host", default="127.0.0.1")
+    rep.add_argument("--port", type=int, default=8545)
+    rep.add_argument("--backend-ws", type=str, help="Backend /ws URL to time decisions and results")
+    rep.add_argument("--drain", type=float, default=5.0, help="Seconds to wait after the last log")
+    rep.add_argument("--report", type=str, help="Write the latency report to this JSON file")
+    rep.add_argument("--timeout", type=float, help="Give up (and still report) after this many seconds")
+
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        uvicorn.run(build_recorder(args.out), host=args.host, port=args.port, log_level="warning")
+        return
+
+    report = asyncio.run(run_replay(args))
+    print(json.dumps(report, indent=2), flush=True)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,38 @@
 import os
+import hmac
 import json
 import math
 import time
 import asyncio
+import threading
 import traceback
-from typing import Any, Dict, List, Optional, Set
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set
+from urllib.parse import urlparse
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
 
+import numpy as np
 from web3 import Web3
 import websockets
 
+from broker import BrokerClient, BrokerServer
+from event_store import EventStore
+from executors import HIGH, LOW, NORMAL, Executors
+from fanout import FanoutHub
+from journal import Journal
+from leader import Lease
+from loopmon import LoopMonitor
+from metrics import REGISTRY
+import profiler
+from shm_state import SharedState
+import snapshot
+from swap_ring import FLAG_ZERO_TO_ONE, ROW_DTYPE, SwapRing
+from tracing import ERROR, LEVELS, WARN, SwapTrace, TraceStore, Tracer, current_swap, stage
+import wire
+
 load_dotenv()
 
 # -----------------------------
@@ -27,10 +48,37 @@ PURR_ADDRESS = os.getenv("PURR_ADDRESS")
 WATCH_POOL = os.getenv("WATCH_POOL")
 
 ENABLE_HL_TRADING = os.getenv("ENABLE_HL_TRADING", "false").lower() == "true"
+PAPER_TRADING = os.getenv("PAPER_TRADING", "false").lower() == "true"
 HL_BASE_URL = os.getenv("HL_BASE_URL", "https://api.hyperliquid-testnet.xyz")
 SPOT_MARKET = os.getenv("SPOT_MARKET", "PURR/USDC")
 
 DEBUG = os.getenv("DEBUG", "true").lower() == "true"
+# Tracing: level (debug|info|warn|error|off), per-event sampling "raw_log=0.1,hl_top=0.5",
+# sinks. All adjustable at runtime via POST /debug/tracing.
+TRACE_LEVEL = os.getenv("TRACE_LEVEL", "debug" if DEBUG else "off")
+TRACE_SAMPLE = {
+    k.strip(): float(v)
+    for k, v in (kv.split("=", 1) for kv in os.getenv("TRACE_SAMPLE", "").split(",") if "=" in kv)
+}
+TRACE_STDOUT = os.getenv("TRACE_STDOUT", "true").lower() == "true"
+TRACE_FILE = os.getenv("TRACE_FILE") or None
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "65536"))
+# finished swap -> hedge latency traces kept for /traces
+SWAP_TRACES_STORED = int(os.getenv("SWAP_TRACES_STORED", "10000"))
+# event-loop monitor: sampling interval, and how long the loop may be held before it counts as a stall
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50"))
+LOOP_STALL_MS = float(os.getenv("LOOP_STALL_MS", "100"))
+# thread pools per class of blocking call (see executors.py); hl_exchange is reserved for orders
+EXECUTOR_SIZES = {
+    "chain": int(os.getenv("EXEC_CHAIN_WORKERS", "4")),
+    "hl_info": int(os.getenv("EXEC_HL_INFO_WORKERS", "4")),
+    "hl_exchange": int(os.getenv("EXEC_HL_EXCHANGE_WORKERS", "2")),
+    "diag": int(os.getenv("EXEC_DIAG_WORKERS", "2")),
+    # one thread, so trace sinks are written in order
+    "trace": int(os.getenv("EXEC_TRACE_WORKERS", "1")),
+}
+# enables /debug/profile and /debug/memory; callers send it as X-Debug-Token (or ?token=)
+DEBUG_ENDPOINT_TOKEN = os.getenv("DEBUG_ENDPOINT_TOKEN")
 
 USDC_DECIMALS = 6
 PURR_DECIMALS = int(os.getenv("PURR_DECIMALS", "5"))
@@ -44,7 +92,59 @@ MAX_HEDGE_USDC_MICRO_PER_SWAP = int(os.getenv("MAX_HEDGE_USDC_MICRO_PER_SWAP", s
 HEDGE_COOLDOWN_MS = int(os.getenv("HEDGE_COOLDOWN_MS", "500"))
 MAX_BOOK_LEVELS = int(os.getenv("MAX_BOOK_LEVELS", "10"))
 
-MAX_EVENTS_STORED = int(os.getenv("MAX_EVENTS_STORED", "1000"))
+MAX_EVENTS_STORED = int(os.getenv("MAX_EVENTS_STORED", "100000"))  # hot cache in front of the event store
+# /ws fan-out: per-client queue bound and what to do when a client can't keep up
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "1024"))
+WS_SLOW_POLICY = os.getenv("WS_SLOW_POLICY", "drop_oldest")  # drop_oldest | skip_debug | disconnect
+# /ws resume: messages kept for ?resume=<seq>, and swaps included in the connect snapshot
+WS_REPLAY_SIZE = int(os.getenv("WS_REPLAY_SIZE", "4096"))
+WS_SNAPSHOT_SWAPS = int(os.getenv("WS_SNAPSHOT_SWAPS", "200"))
+# permessage-deflate for clients that offer it (applies to every encoding). Only for `python server.py`:
+# under the uvicorn CLI it's uvicorn's own --ws-per-message-deflate (default true)
+WS_DEFLATE = os.getenv("WS_DEFLATE", "true").lower() == "true"
+# what the running server was actually started with; None when uvicorn was started by someone else
+ws_deflate: Optional[bool] = None
+
+EVENT_STORE_PATH = os.getenv("EVENT_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "events.db"))
+# HL meta/spotMeta from the last start, so a restart can build the SDK clients without waiting on HL
+HL_META_CACHE = os.getenv("HL_META_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "hl_meta.json"))
+# seconds between attempts when startup can't reach the RPC or HL
+STARTUP_RETRY_S = float(os.getenv("STARTUP_RETRY_S", "5"))
+# warm-restart snapshot (snapshot.py): where, how often (0 = only at shutdown)
+STATE_DIR = os.getenv("STATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "state"))
+SNAPSHOT_INTERVAL_S = float(os.getenv("SNAPSHOT_INTERVAL_S", "10"))
+# on (re)connect, swap logs since the last ingested block are fetched with eth_getLogs, at most this far back
+BACKFILL_MAX_BLOCKS = int(os.getenv("BACKFILL_MAX_BLOCKS", "5000"))
+BACKFILL_CHUNK_BLOCKS = int(os.getenv("BACKFILL_CHUNK_BLOCKS", "1000"))
+# at shutdown, how long to let hedges already in flight finish before the final snapshot
+SHUTDOWN_HEDGE_WAIT_S = float(os.getenv("SHUTDOWN_HEDGE_WAIT_S", "10"))
+# write-ahead journal of hedge intents / child orders (journal.py), reconciled against HL on start
+HEDGE_JOURNAL_PATH = os.getenv("HEDGE_JOURNAL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "hedges.journal"))
+# hot standby (leader.py): instances sharing LEASE_PATH elect one leader that hedges; unset = single instance.
+# They share LEASE_PATH, STATE_DIR and HEDGE_JOURNAL_PATH; each needs its own EVENT_STORE_PATH.
+LEASE_PATH = os.getenv("LEASE_PATH") or None
+LEASE_POLL_MS = float(os.getenv("LEASE_POLL_MS", "100"))
+# standby: how often to refresh the book and follow the leader's snapshot
+STANDBY_REFRESH_MS = float(os.getenv("STANDBY_REFRESH_MS", "500"))
+# process split (broker.py): all = one process does everything; ingest = that, plus publishing on BROKER_PATH;
+# api = read-only workers (run as many as needed, e.g. uvicorn --workers N) serving /events, /health and /ws from it
+PROCESS_ROLE = os.getenv("PROCESS_ROLE", "all")
+BROKER_PATH = os.getenv("BROKER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "broker.sock"))
+# swaps a worker gets on (re)connect, and how often it gets the ingest state (inventory, hedges, readiness)
+BROKER_SYNC_SWAPS = int(os.getenv("BROKER_SYNC_SWAPS", "10000"))
+BROKER_STATE_MS = float(os.getenv("BROKER_STATE_MS", "500"))
+# shared-memory segment (shm_state.py) with inventory, mid, ratio and the swap ring: written by the ingest
+# process, read in place by API workers (which map whatever segment the ingest process's sync names).
+# Its name, e.g. "hedger-state"; unset = off. Only the ingest process reads it
+SHM_STATE = os.getenv("SHM_STATE") or None
+
+# Paper execution (PAPER_TRADING=true): simulated fills against the live HL book
+PAPER_USDC = float(os.getenv("PAPER_USDC", "1000"))
+PAPER_PURR = float(os.getenv("PAPER_PURR", "200"))
+PAPER_LATENCY_MS = float(os.getenv("PAPER_LATENCY_MS", "50"))
+PAPER_QUEUE_AHEAD = float(os.getenv("PAPER_QUEUE_AHEAD", "0.1"))
+PAPER_TAKER_FEE_BPS = float(os.getenv("PAPER_TAKER_FEE_BPS", "7"))
+PAPER_BOOK_TTL_MS = float(os.getenv("PAPER_BOOK_TTL_MS", "500"))
 
 required = {
     "ALCHEMY_WS_URL": ALCHEMY_WSS_URL,
@@ -58,6 +158,13 @@ required = {
 missing = [k for k, v in required.items() if not v]
 if missing:
     raise RuntimeError(f"Missing env vars: {missing}")
+if ENABLE_HL_TRADING and PAPER_TRADING:
+    raise RuntimeError("ENABLE_HL_TRADING and PAPER_TRADING are mutually exclusive")
+if PROCESS_ROLE not in ("all", "ingest", "api"):
+    raise RuntimeError(f"PROCESS_ROLE must be all, ingest or api, not {PROCESS_ROLE!r}")
+
+# Live or paper: either way the full decision + execution path runs
+HL_EXECUTION = ENABLE_HL_TRADING or PAPER_TRADING
 
 SOVEREIGN_VAULT_ADDRESS = Web3.to_checksum_address(SOVEREIGN_VAULT_ADDRESS)
 USDC_ADDRESS = Web3.to_checksum_address(USDC_ADDRESS)
@@ -101,48 +208,152 @@ vault_contract = w3_http.eth.contract(address=os.getenv("SOVEREIGN_VAULT"), abi=
 usdc_contract = w3_http.eth.contract(address=USDC_ADDRESS, abi=ERC20_ABI)
 purr_contract = w3_http.eth.contract(address=PURR_ADDRESS, abi=ERC20_ABI)
 
-CHAIN_ID = int(os.getenv("CHAIN_ID") or w3_http.eth.chain_id)
+# resolved in lifespan (init_upstreams) unless set in the env
+CHAIN_ID: Optional[int] = int(os.getenv("CHAIN_ID")) if os.getenv("CHAIN_ID") else None
 
 print("[boot] CWD =", os.getcwd(), flush=True)
 print("[boot] DEBUG =", DEBUG, flush=True)
-print("[boot] CHAIN_ID =", CHAIN_ID, flush=True)
+print("[boot] CHAIN_ID =", CHAIN_ID if CHAIN_ID is not None else "(from RPC at startup)", flush=True)
 print("[boot] ENABLE_HL_TRADING =", ENABLE_HL_TRADING, flush=True)
+print("[boot] PAPER_TRADING =", PAPER_TRADING, flush=True)
 print("[boot] WATCH_POOL =", WATCH_POOL, flush=True)
 print("[boot] SWAP_TOPIC0 =", SWAP_TOPIC0, flush=True)
 print("[boot] SPOT_MARKET =", SPOT_MARKET, flush=True)
 print("[boot] REBALANCE_BAND =", REBALANCE_BAND, flush=True)
+print("[boot] PROCESS_ROLE =", PROCESS_ROLE, flush=True)
 
 # -----------------------------
 # Hyperliquid SDK (spot trading)
 # -----------------------------
-if ENABLE_HL_TRADING:
-    import eth_account
-    from hyperliquid.info import Info
-    from hyperliquid.exchange import Exchange
+# The SDK clients fetch exchange metadata in their constructors, so they're
+# built in lifespan (build_hl_clients) from cached or freshly fetched meta,
+# never at import.
+hl_info: Any = None
+hl_exchange: Any = None
 
+if ENABLE_HL_TRADING:
     HL_SECRET_KEY = os.getenv("HL_SECRET_KEY")
     HL_ACCOUNT_ADDRESS = os.getenv("HL_ACCOUNT_ADDRESS")
     if not HL_SECRET_KEY or not HL_ACCOUNT_ADDRESS:
         raise RuntimeError("ENABLE_HL_TRADING=true requires HL_SECRET_KEY and HL_ACCOUNT_ADDRESS")
 
     HL_ACCOUNT_ADDRESS = Web3.to_checksum_address(HL_ACCOUNT_ADDRESS)
+elif PAPER_TRADING:
+    HL_ACCOUNT_ADDRESS = "paper"
 
-    hl_info = Info(base_url=HL_BASE_URL, skip_ws=True)
-    hl_wallet = eth_account.Account.from_key(HL_SECRET_KEY)
-    hl_exchange = Exchange(hl_wallet, HL_BASE_URL, account_address=HL_ACCOUNT_ADDRESS)
+def build_hl_clients(meta: Dict[str, Any], spot_meta: Dict[str, Any]) -> None:
+    """Construct Info/Exchange (or PaperExchange) from already-fetched metadata; no I/O."""
+    global hl_info, hl_exchange
+    from hyperliquid.info import Info
+
+    hl_info = Info(base_url=HL_BASE_URL, skip_ws=True, meta=meta, spot_meta=spot_meta)
+    if ENABLE_HL_TRADING:
+        import eth_account
+        from hyperliquid.exchange import Exchange
+
+        hl_wallet = eth_account.Account.from_key(HL_SECRET_KEY)
+        hl_exchange = Exchange(hl_wallet, HL_BASE_URL, meta=meta, spot_meta=spot_meta, account_address=HL_ACCOUNT_ADDRESS)
+    else:
+        from paper import PaperExchange
+
+        # public Info only: book + metadata, no keys needed
+        hl_exchange = PaperExchange(
+            hl_info,
+            SPOT_MARKET,
+            balances={"USDC": PAPER_USDC, "PURR": PAPER_PURR},
+            latency_ms=PAPER_LATENCY_MS,
+            queue_ahead=PAPER_QUEUE_AHEAD,
+            taker_fee_bps=PAPER_TAKER_FEE_BPS,
+            book_ttl_ms=PAPER_BOOK_TTL_MS,
+        )
+        if restored_paper:
+            hl_exchange.balances.update(restored_paper["balances"])
 
 # -----------------------------
 # App + State
 # -----------------------------
 state_lock = asyncio.Lock()
-CLIENTS: Set[WebSocket] = set()
-EVENTS: List[Dict[str, Any]] = []
+hub = FanoutHub(queue_size=WS_QUEUE_SIZE, policy=WS_SLOW_POLICY, replay_size=WS_REPLAY_SIZE)
+pools = Executors(EXECUTOR_SIZES)
+tracer = Tracer(
+    hub,
+    level=TRACE_LEVEL,
+    sample=TRACE_SAMPLE,
+    stdout=TRACE_STDOUT,
+    file_path=TRACE_FILE,
+    capacity=TRACE_BUFFER,
+    offload=pools["trace"].run,
+)
+EVENTS = SwapRing(MAX_EVENTS_STORED)
+event_store: Optional[EventStore] = None
+journal: Optional[Journal] = None
+loopmon = LoopMonitor(interval=LOOP_MONITOR_INTERVAL_MS / 1000, stall_threshold=LOOP_STALL_MS / 1000)
 
 hedge_lock = asyncio.Lock()
 last_hedge_ms = 0
 
+# latest vault inventory / ratio seen by the decision path, and hedges in flight (by swap id)
+inventory: Dict[str, Any] = {}
+open_hedges: Dict[int, Dict[str, Any]] = {}
+
+# newest block with ingested swap logs, and recent logs by "txHash:logIndex" (dedupes backfill vs live)
+cursor_block = 0
+seen_logs: "OrderedDict[str, None]" = OrderedDict()
+SEEN_LOGS_KEPT = 4096
+# hedges the previous process left open, as reconciled against HL on start (recover_journal)
+recovered_hedges: List[Dict[str, Any]] = []
+# leader election: without LEASE_PATH this instance always leads
+lease: Optional[Lease] = Lease(LEASE_PATH) if LEASE_PATH else None
+role: Dict[str, Any] = {"leader": lease is None, "epoch": None, "sinceMs": None, "takeovers": 0, "takeoverMs": None}
+# last snapshot written / loaded, for /health
+snapshot_stats: Dict[str, Any] = {"saves": 0, "lastSavedMs": None, "bytes": None, "saveMs": None, "loaded": None}
+
 purr_sz_decimals: Optional[int] = None
 
+# -----------------------------
+# Metrics (/metrics)
+# -----------------------------
+M_ARRIVAL_TO_DECODE = REGISTRY.histogram("swap_arrival_to_decode_seconds", "Swap log received on the EVM websocket -> decoded")
+M_DECODE_TO_DECISION = REGISTRY.histogram("swap_decode_to_decision_seconds", "Swap decoded -> hedge decision (skip or intent)")
+M_VAULT_BALANCE_READ = REGISTRY.histogram("vault_balance_read_seconds", "EVM vault USDC+PURR balanceOf reads")
+M_HL_BALANCE_READ = REGISTRY.histogram("hl_spot_balance_read_seconds", "HL spot balances read")
+M_BOOK_FETCH = REGISTRY.histogram("hl_book_fetch_seconds", "HL L2 book snapshot fetch")
+M_ORDER_RTT = REGISTRY.histogram("hl_order_rtt_seconds", "HL market_open round trip")
+M_SWAP_TO_FILL = REGISTRY.histogram("swap_to_fill_seconds", "Swap log received -> hedge result with at least one fill")
+M_SWAPS = REGISTRY.counter("swaps_total", "Swap logs decoded")
+M_DECODE_FAILED = REGISTRY.counter("swap_decode_failed_total", "Swap logs that failed to decode")
+M_SKIPS = REGISTRY.counter("rebalance_skips_total", "Hedge decisions that did not trade, by reason", ("reason",))
+M_HEDGES = REGISTRY.counter("hedges_total", "Hedge attempts by outcome", ("outcome",))
+M_CRASHES = REGISTRY.counter("on_swap_event_crashes_total", "Exceptions in the decision path")
+M_RECONNECTS = REGISTRY.counter("evm_ws_reconnects_total", "EVM log subscription reconnects")
+REGISTRY.gauge("ws_clients", "Connected /ws clients", lambda: len(hub))
+REGISTRY.gauge("swaps_in_memory", "Swaps held in the hot ring buffer", lambda: len(EVENTS))
+REGISTRY.gauge("event_store_pending", "Rows queued for the event store writer", lambda: event_store.pending())
+REGISTRY.gauge("trace_buffered", "Trace records waiting for the drainer", lambda: len(tracer.ring))
+REGISTRY.gauge("is_leader", "1 if this instance is the one hedging", lambda: int(role["leader"]))
+REGISTRY.gauge("trace_overflowed", "Trace records dropped because the ring was full", lambda: tracer.overflowed)
+
+swap_traces = TraceStore(SWAP_TRACES_STORED)
+# which upstream each traced stage waits on, for /traces/summary
+TRACE_PROVIDERS = {
+    "logs": urlparse(ALCHEMY_WSS_URL).netloc,
+    "decode": urlparse(ALCHEMY_WSS_URL).netloc,
+    "vault_balances": urlparse(EVM_RPC_HTTP_URL).netloc,
+    "hl_balances": urlparse(HL_BASE_URL).netloc,
+    "book_fetch": urlparse(HL_BASE_URL).netloc,
+    "order": urlparse(HL_BASE_URL).netloc,
+}
+
+def _decided(skip_reason: Optional[str] = None) -> None:
+    trace = current_swap.get()
+    if trace is not None:
+        M_DECODE_TO_DECISION.observe(time.perf_counter() - trace.t_decoded)
+        trace.mark("decision", {"skip": skip_reason} if skip_reason else None)
+        if skip_reason:
+            trace.outcome = f"skip:{skip_reason}"
+    if skip_reason:
+        M_SKIPS.inc(skip_reason)
+
 # -----------------------------
 # Helpers
 # -----------------------------
@@ -155,23 +366,14 @@ def usdc_to_micro(usdc: float) -> int:
 def now_ms() -> int:
     return int(time.time() * 1000)
 
-async def broadcast(msg: Dict[str, Any]) -> None:
-    dead: List[WebSocket] = []
-    payload = json.dumps(msg, default=str)
-    for ws in list(CLIENTS):
-        try:
-            await ws.send_text(payload)
-        except Exception:
-            dead.append(ws)
-    for ws in dead:
-        CLIENTS.discard(ws)
+def broadcast(msg: Dict[str, Any]) -> None:
+    # serialized once, queued per client; never waits on a socket
+    hub.publish(msg)
 
-async def debug_emit(event: str, data: Dict[str, Any]) -> None:
-    if not DEBUG:
-        return
-    msg = {"type": "debug", "data": {"event": event, "ts_ms": now_ms(), **data}}
-    print(f"[debug:{event}] {json.dumps(msg['data'], default=str)[:3000]}", flush=True)
-    await broadcast(msg)
+def debug_emit(event: str, data: Dict[str, Any], level: int = LEVELS["debug"]) -> None:
+    # ring-buffer append only; printing and /ws delivery happen in the tracer's drainer.
+    # `data` is serialized later, so don't mutate it after emitting.
+    tracer.event(event, data, level)
 
 def decode_swap_log(log: dict) -> Dict[str, Any]:
     sender_topic = log["topics"][1]
@@ -185,6 +387,8 @@ def decode_swap_log(log: dict) -> Dict[str, Any]:
 
     bn = log.get("blockNumber")
     block_number = int(bn, 16) if isinstance(bn, str) else int(bn)
+    li = log.get("logIndex") or 0
+    log_index = int(li, 16) if isinstance(li, str) else int(li)
 
     return {
         "pool": Web3.to_checksum_address(log["address"]),
@@ -196,33 +400,28 @@ def decode_swap_log(log: dict) -> Dict[str, Any]:
         "usdcDelta": int(usdcDelta),
         "txHash": log.get("transactionHash"),
         "blockNumber": block_number,
+        "logIndex": log_index,
     }
 
 async def get_default_core_vault() -> str:
-    v = await asyncio.to_thread(vault_contract.functions.defaultVault().call)
+    v = await pools["diag"].run(vault_contract.functions.defaultVault().call)
     return Web3.to_checksum_address(v)
 
 def round_down(x: float, decimals: int) -> float:
     m = 10 ** decimals
     return math.floor(x * m) / m
 
-async def init_market_decimals() -> None:
-    global purr_sz_decimals
-    if not ENABLE_HL_TRADING:
-        return
-
-    def _fetch():
-        asset = hl_info.name_to_asset(SPOT_MARKET)
-        return int(hl_info.asset_to_sz_decimals[asset])
-
-    purr_sz_decimals = await asyncio.to_thread(_fetch)
+def _spot_user_state() -> Dict[str, Any]:
+    if PAPER_TRADING:
+        return hl_exchange.spot_user_state()
+    return hl_info.spot_user_state(HL_ACCOUNT_ADDRESS)
 
 async def get_spot_balances() -> Dict[str, float]:
-    if not ENABLE_HL_TRADING:
+    if not HL_EXECUTION:
         return {}
 
     def _fetch():
-        st = hl_info.spot_user_state(HL_ACCOUNT_ADDRESS)
+        st = _spot_user_state()
         out: Dict[str, float] = {}
         for b in st.get("balances", []):
             coin = b.get("coin")
@@ -230,7 +429,9 @@ async def get_spot_balances() -> Dict[str, float]:
             out[coin] = total
         return out
 
-    return await asyncio.to_thread(_fetch)
+    with stage("hl_balances", M_HL_BALANCE_READ):
+        # only called once a hedge is under way: ahead of new decisions' reads
+        return await pools["hl_info"].run(_fetch, priority=HIGH)
 
 async def get_vault_balances_evm() -> Dict[str, Any]:
     """
@@ -239,8 +440,11 @@ async def get_vault_balances_evm() -> Dict[str, Any]:
     """
     vault_addr = os.getenv("SOVEREIGN_VAULT")
 
-    usdc_raw = await asyncio.to_thread(usdc_contract.functions.balanceOf(vault_addr).call)
-    purr_raw = await asyncio.to_thread(purr_contract.functions.balanceOf(vault_addr).call)
+    with stage("vault_balances", M_VAULT_BALANCE_READ):
+        usdc_raw, purr_raw = await asyncio.gather(
+            pools["chain"].run(usdc_contract.functions.balanceOf(vault_addr).call),
+            pools["chain"].run(purr_contract.functions.balanceOf(vault_addr).call),
+        )
 
     usdc = usdc_raw / (10 ** USDC_DECIMALS)
     purr = purr_raw / (10 ** 5)
@@ -259,15 +463,16 @@ async def get_spot_mid_q_usdc_per_purr() -> float:
     """
     HL L2 px is USDC per 1 PURR.
     """
-    if not ENABLE_HL_TRADING:
+    if not HL_EXECUTION:
         raise RuntimeError("Need HL Info to fetch spot mid")
 
-    snap = await asyncio.to_thread(hl_info.l2_snapshot, SPOT_MARKET)
+    with stage("book_fetch", M_BOOK_FETCH, purpose="mid"):
+        snap = await pools["hl_info"].run(hl_info.l2_snapshot, SPOT_MARKET, priority=NORMAL)
     bids = snap.get("levels", [[], []])[0]
     asks = snap.get("levels", [[], []])[1]
 
     # show shapes once per call
-    await debug_emit("hl_book_head", {
+    debug_emit("hl_book_head", {
         "bid0": bids[0] if bids else None,
         "ask0": asks[0] if asks else None,
     })
@@ -321,8 +526,18 @@ def _hl_order_has_error(res: Dict[str, Any]) -> Optional[str]:
         return "unknown_error_shape"
     return None
 
-async def execute_spot_rebalance_by_usdc_notional(usdc_notional_micro: int, buy_purr: bool) -> Dict[str, Any]:
-    if not ENABLE_HL_TRADING:
+def _cloid(raw: str) -> Any:
+    from hyperliquid.utils.types import Cloid
+    return Cloid.from_str(raw)
+
+async def execute_spot_rebalance_by_usdc_notional(
+    usdc_notional_micro: int, buy_purr: bool, hedge_seq: int, hedge_journal: Journal,
+) -> Dict[str, Any]:
+    """
+    `hedge_seq` is the journaled intent's seq in `hedge_journal`: child order k is sent with cloid
+    hedge_journal.cloid(hedge_seq, k). The hedge keeps that journal even if this instance steps down meanwhile.
+    """
+    if not HL_EXECUTION:
         return {"ok": False, "reason": "ENABLE_HL_TRADING=false"}
     assert purr_sz_decimals is not None, "market decimals not initialized"
 
@@ -333,7 +548,7 @@ async def execute_spot_rebalance_by_usdc_notional(usdc_notional_micro: int, buy_
     avail_usdc = balances.get("USDC", 0.0)
     avail_purr = balances.get("PURR", 0.0)
 
-    await debug_emit("hl_spot_balances", {"avail_usdc": avail_usdc, "avail_purr": avail_purr})
+    debug_emit("hl_spot_balances", {"avail_usdc": avail_usdc, "avail_purr": avail_purr})
 
     if buy_purr:
         if avail_usdc <= 0:
@@ -343,12 +558,13 @@ async def execute_spot_rebalance_by_usdc_notional(usdc_notional_micro: int, buy_
         if avail_purr <= 0:
             return {"ok": False, "reason": "no PURR available on HL account"}
 
-    snap = await asyncio.to_thread(hl_info.l2_snapshot, SPOT_MARKET)
+    with stage("book_fetch", M_BOOK_FETCH, purpose="execute"):
+        snap = await pools["hl_info"].run(hl_info.l2_snapshot, SPOT_MARKET, priority=HIGH)
     bids = snap.get("levels", [[], []])[0]
     asks = snap.get("levels", [[], []])[1]
 
     # log top of book
-    await debug_emit("hl_top", {
+    debug_emit("hl_top", {
         "best_bid": bids[0] if bids else None,
         "best_ask": asks[0] if asks else None,
         "buy_purr": buy_purr,
@@ -359,6 +575,7 @@ async def execute_spot_rebalance_by_usdc_notional(usdc_notional_micro: int, buy_
         return {"ok": False, "reason": "empty_book"}
 
     fills = []
+    sent = 0
     for i, lvl in enumerate(book):
         if remaining_usdc <= 0:
             break
@@ -366,7 +583,7 @@ async def execute_spot_rebalance_by_usdc_notional(usdc_notional_micro: int, buy_
         try:
             q_px, lvl_sz_purr = _parse_level(lvl)  # ✅ robust parsing
         except Exception:
-            await debug_emit("hl_level_parse_failed", {"level": i, "lvl": lvl, "trace": traceback.format_exc()})
+            debug_emit("hl_level_parse_failed", {"level": i, "lvl": lvl, "trace": traceback.format_exc()}, WARN)
             continue
 
         # desired PURR from USDC budget
@@ -378,7 +595,7 @@ async def execute_spot_rebalance_by_usdc_notional(usdc_notional_micro: int, buy_
         raw_take = take_purr
         take_purr = round_down(take_purr, purr_sz_decimals)
 
-        await debug_emit("spot_size_round", {
+        debug_emit("spot_size_round", {
             "level": i,
             "q_px": q_px,
             "raw_take_purr": raw_take,
@@ -389,7 +606,7 @@ async def execute_spot_rebalance_by_usdc_notional(usdc_notional_micro: int, buy_
         if take_purr <= 0:
             continue
 
-        await debug_emit("spot_ioc_attempt", {
+        debug_emit("spot_ioc_attempt", {
             "level": i,
             "is_buy": buy_purr,
             "px_usdc_per_purr": q_px,
@@ -400,22 +617,33 @@ async def execute_spot_rebalance_by_usdc_notional(usdc_notional_micro: int, buy_
 
         slippage = float(os.getenv("HL_SLIPPAGE", "0.01"))  # 1% default
 
-        await debug_emit("market_open_call", {
+        debug_emit("market_open_call", {
             "is_buy": buy_purr,
             "take_purr": take_purr,
             "slippage": slippage,
         })
 
-        res = await asyncio.to_thread(
-            hl_exchange.market_open,
-            SPOT_MARKET,
-            buy_purr,      # is_buy
-            take_purr     # sz (already quantized to szDecimals)       # px override
-        )
+        if lease is not None:
+            lease.check()  # fence: never send once another instance has taken the lease
+        k = sent
+        sent += 1
+        cloid = hedge_journal.cloid(hedge_seq, k)
+        hedge_journal.write_nowait({"t": "order", "seq": hedge_seq, "k": k, "cloid": cloid, "isBuy": buy_purr, "sz": take_purr, "px": q_px})
+
+        with stage("order", M_ORDER_RTT, level=i, sz=take_purr) as order_attrs:
+            res = await pools["hl_exchange"].run(
+                hl_exchange.market_open,
+                SPOT_MARKET,
+                buy_purr,      # is_buy
+                take_purr,     # sz (already quantized to szDecimals)       # px override
+                cloid=_cloid(cloid),
+            )
+            err = _hl_order_has_error(res)
+            order_attrs["error"] = err
+        hedge_journal.write_nowait({"t": "ack", "seq": hedge_seq, "k": k, "res": res})
 
-        err = _hl_order_has_error(res)
         if err:
-            await debug_emit("spot_order_rejected", {"level": i, "error": err, "res": res})
+            debug_emit("spot_order_rejected", {"level": i, "error": err, "res": res}, WARN)
             continue
 
         fills.append({"q_px": q_px, "purr": take_purr, "isBuy": buy_purr, "res": res})
@@ -439,20 +667,100 @@ async def execute_spot_rebalance_by_usdc_notional(usdc_notional_micro: int, buy_
 
     return {
         "ok": True,
+        "paper": PAPER_TRADING,
         "requested_usdc_micro": usdc_notional_micro,
         "requested_usdc": micro_to_usdc(usdc_notional_micro),
         "remaining_usdc": max(0.0, remaining_usdc),
         "fills": fills,
         "buy_purr": buy_purr,
     }
+def _order_status(cloid: str) -> Dict[str, Any]:
+    # PaperExchange answers for its own simulated orders
+    source = hl_exchange if PAPER_TRADING else hl_info
+    return source.query_order_by_cloid(HL_ACCOUNT_ADDRESS, _cloid(cloid))
+
+async def reconcile_hedge(seq: int) -> Optional[Dict[str, Any]]:
+    """
+    Close a journaled hedge whose outcome isn't known (crash, or an error
+    part-way through): look up every cloid it could have used on HL and
+    record what actually filled. Raises if HL can't be asked, leaving the
+    hedge open.
+    """
+    h = journal.hedges.get(seq)
+    if h is None:
+        return None
+    rec = h["intent"]
+    cloids = [journal.cloid(seq, k) for k in range(int(rec.get("maxOrders", MAX_BOOK_LEVELS)))]
+    statuses = await asyncio.gather(*(pools["hl_info"].run(_order_status, c, priority=HIGH) for c in cloids))
+
+    orders = []
+    for k, (cloid, st) in enumerate(zip(cloids, statuses)):
+        if st.get("status") != "order":
+            continue  # unknownOid: never reached HL
+        o = st["order"]["order"]
+        orders.append({
+            "k": k,
+            "cloid": cloid,
+            "status": st["order"].get("status"),
+            "isBuy": o.get("side") == "B",
+            "filledSz": float(o["origSz"]) - float(o["sz"]),
+            "limitPx": float(o["limitPx"]),
+        })
+    filled = [o for o in orders if o["filledSz"] > 0]
+    result = {"ok": bool(filled), "recovered": True, "orders": orders, "filledSz": sum(o["filledSz"] for o in filled)}
+    outcome = "recovered_filled" if filled else "recovered_no_fills"
+
+    journal.write_nowait({"t": "done", "seq": seq, "outcome": outcome, "result": result})
+    M_HEDGES.inc(outcome)
+    event_store.append("hedge", {
+        "txHash": rec.get("txHash"),
+        "blockNumber": rec.get("blockNumber"),
+        "intent": rec.get("intent"),
+        "result": result,
+    }, now_ms())
+    debug_emit("hedge_reconciled", {"seq": seq, "outcome": outcome, "result": result}, WARN)
+    return result
+
+async def reconcile_hedge_logged(seq: int) -> None:
+    try:
+        await reconcile_hedge(seq)
+    except Exception as e:
+        # stays open in the journal; recover_journal picks it up on the next start
+        debug_emit("hedge_reconcile_failed", {"seq": seq, "error": str(e)}, ERROR)
+
+async def recover_journal() -> None:
+    """On start, before any new hedge: reconcile every hedge the previous process left open."""
+    global last_hedge_ms
+    pending = journal.unresolved()
+    for seq, h in sorted(pending.items()):
+        result = await reconcile_hedge(seq)
+        last_hedge_ms = max(last_hedge_ms, int(h["intent"]["ms"]))
+        recovered_hedges.append({"seq": seq, "txHash": h["intent"].get("txHash"), "result": result})
+        print(f"[startup] reconciled hedge {seq} tx={h['intent'].get('txHash')}: {result}", flush=True)
+
+async def take_journal() -> None:
+    """Whenever this process starts writing the journal (startup, each takeover): reconcile, then compact."""
+    await recover_journal()
+    # the previous writer's finished hedges go; only this one rewrites the file while it leads
+    await journal.compact()
+
 # -----------------------------
 # Main decision: run on every swap log
 # -----------------------------
 async def on_swap_event(ev: Dict[str, Any]) -> None:
     global last_hedge_ms
+    trace = current_swap.get()
+
+    if not role["leader"]:
+        # standby: ingests and serves, the leader decides
+        _decided("standby")
+        if trace is not None:
+            trace.finish()
+            swap_traces.put(trace)
+        return
 
     try:
-        await debug_emit("swap_decoded", {
+        debug_emit("swap_decoded", {
             "txHash": ev.get("txHash"),
             "blockNumber": ev.get("blockNumber"),
             "sender": ev.get("sender"),
@@ -460,8 +768,9 @@ async def on_swap_event(ev: Dict[str, Any]) -> None:
             "usdcDelta_usdc": micro_to_usdc(ev.get("usdcDelta", 0)),
         })
 
-        vault_bal = await get_vault_balances_evm()
-        q_mid = await get_spot_mid_q_usdc_per_purr()
+        with tracer.span("swap_inputs", txHash=ev.get("txHash")):
+            vault_bal = await get_vault_balances_evm()
+            q_mid = await get_spot_mid_q_usdc_per_purr()
 
         U = float(vault_bal["usdc"])
         P = float(vault_bal["purr"])
@@ -470,7 +779,22 @@ async def on_swap_event(ev: Dict[str, Any]) -> None:
         abs_dev = abs(dev) if not math.isnan(dev) else float("nan")
         Vp = P * q_mid
         d_usdc = U - Vp
-        await debug_emit("imbalance", {
+
+        inventory.update({
+            "U_usdc": U,
+            "P_purr": P,
+            "q_usdc_per_purr": q_mid,
+            "ratio": None if math.isnan(r) else r,
+            "d_usdc": d_usdc,
+            "txHash": ev.get("txHash"),
+            "blockNumber": ev.get("blockNumber"),
+            "tsMs": now_ms(),
+        })
+        broadcast({"type": "inventory", "data": dict(inventory)})
+        if shared is not None:
+            publish_shared()
+
+        debug_emit("imbalance", {
             "U_usdc": U,
             "P_purr": P,
             "q_usdc_per_purr": q_mid,
@@ -480,29 +804,40 @@ async def on_swap_event(ev: Dict[str, Any]) -> None:
         })
 
         if math.isnan(r) or P <= 0 or q_mid <= 0:
-            await debug_emit("rebalance_skip_invalid_state", {})
+            _decided("invalid_state")
+            debug_emit("rebalance_skip_invalid_state", {})
             return
 
         if abs_dev <= REBALANCE_BAND:
-            await debug_emit("rebalance_skip_in_band", {"abs_dev": abs_dev, "band": REBALANCE_BAND})
+            _decided("in_band")
+            debug_emit("rebalance_skip_in_band", {"abs_dev": abs_dev, "band": REBALANCE_BAND})
             return
 
         async with hedge_lock:
+            swap_key = f"{ev.get('txHash')}:{ev.get('logIndex')}"
+            if journal is not None and journal.was_hedged(swap_key):
+                # re-delivered after a restart (backfill): its hedge is already journaled
+                _decided("already_hedged")
+                debug_emit("rebalance_skip_already_hedged", {"swap": swap_key})
+                return
+
             now = now_ms()
             since = now - last_hedge_ms
             if since < HEDGE_COOLDOWN_MS:
-                await debug_emit("rebalance_skip_cooldown", {"since_ms": since, "cooldown_ms": HEDGE_COOLDOWN_MS})
+                _decided("cooldown")
+                debug_emit("rebalance_skip_cooldown", {"since_ms": since, "cooldown_ms": HEDGE_COOLDOWN_MS})
                 return
             last_hedge_ms = now
 
             plan = rebalance_plan(U, P, q_mid)
-            await debug_emit("rebalance_plan", plan)
+            debug_emit("rebalance_plan", plan)
 
             desired_usdc = float(plan["trade_usdc"])
             desired_micro = usdc_to_micro(desired_usdc)
 
             if desired_micro < MIN_HEDGE_USDC_MICRO:
-                await debug_emit("rebalance_skip_below_min_notional", {
+                _decided("below_min_notional")
+                debug_emit("rebalance_skip_below_min_notional", {
                     "desired_usdc": desired_usdc,
                     "desired_micro": desired_micro,
                     "min_micro": MIN_HEDGE_USDC_MICRO,
@@ -511,39 +846,192 @@ async def on_swap_event(ev: Dict[str, Any]) -> None:
 
             capped_micro = min(desired_micro, MAX_HEDGE_USDC_MICRO_PER_SWAP)
             if capped_micro != desired_micro:
-                await debug_emit("rebalance_cap_applied", {"desired_micro": desired_micro, "capped_micro": capped_micro})
+                debug_emit("rebalance_cap_applied", {"desired_micro": desired_micro, "capped_micro": capped_micro})
 
             action = plan["action"]
             buy_purr = action == "BUY_PURR_SPOT"
 
-            await broadcast({"type": "rebalance_intent", "data": {
+            intent = {
                 "action": action,
                 "usdc_micro": capped_micro,
                 "usdc": micro_to_usdc(capped_micro),
                 "ratio": r,
                 "abs_dev": abs_dev,
                 "q_mid_usdc_per_purr": q_mid,
-            }})
-
-            if ENABLE_HL_TRADING:
-                result = await execute_spot_rebalance_by_usdc_notional(capped_micro, buy_purr=buy_purr)
-            else:
-                result = {"ok": False, "reason": "trading_disabled"}
-
-            await debug_emit("rebalance_result", {"result": result})
-            await broadcast({"type": "rebalance_result", "data": result})
+            }
+            _decided()
+            hedge_seq = None
+            # this hedge's records all go to the journal its intent went to (step_down() drops the global)
+            hedge_journal = journal
+            if HL_EXECUTION:
+                if lease is not None:
+                    lease.check()
+                # on disk before anything is shown or sent: after a crash the hedge is found and reconciled
+                with stage("journal"):
+                    hedge_seq = await hedge_journal.begin(swap_key, {
+                        "txHash": ev.get("txHash"),
+                        "blockNumber": ev.get("blockNumber"),
+                        "intent": intent,
+                        "maxOrders": MAX_BOOK_LEVELS,
+                    })
+            # the swap it answers, so a client (replay.py) can pair decisions with swaps
+            broadcast({"type": "rebalance_intent", "data": {**intent, "txHash": ev.get("txHash")}})
+
+            open_hedges[ev["id"]] = {"txHash": ev.get("txHash"), "startedMs": now, "intent": intent, "seq": hedge_seq}
+            result = None
+            try:
+                if HL_EXECUTION:
+                    result = await execute_spot_rebalance_by_usdc_notional(
+                        capped_micro, buy_purr=buy_purr, hedge_seq=hedge_seq, hedge_journal=hedge_journal,
+                    )
+                else:
+                    result = {"ok": False, "reason": "trading_disabled"}
+            finally:
+                open_hedges.pop(ev["id"], None)
+                if hedge_seq is not None:
+                    if result is not None:
+                        outcome = "filled" if result.get("fills") else str(result.get("reason", "failed"))
+                        hedge_journal.write_nowait({"t": "done", "seq": hedge_seq, "outcome": outcome})
+                    elif role["leader"]:
+                        # failed part-way: which child orders went out is only known to HL
+                        # (a fenced ex-leader leaves it to the new one)
+                        asyncio.create_task(reconcile_hedge_logged(hedge_seq))
+
+            outcome = "filled" if result.get("fills") else str(result.get("reason", "failed"))
+            M_HEDGES.inc(outcome)
+            if trace is not None:
+                trace.outcome = outcome
+                if outcome == "filled":
+                    M_SWAP_TO_FILL.observe(time.perf_counter() - trace.t0)
+                    trace.mark("filled", {"fills": len(result["fills"])})
+
+            debug_emit("rebalance_result", {"result": result})
+            broadcast({"type": "rebalance_result", "data": {**result, "txHash": ev.get("txHash")}})
+
+            event_store.append("hedge", {
+                "txHash": ev.get("txHash"),
+                "blockNumber": ev.get("blockNumber"),
+                "intent": intent,
+                "result": result,
+            }, now_ms())
 
     except Exception:
-        await debug_emit("on_swap_event_crash", {"trace": traceback.format_exc()})
+        M_CRASHES.inc()
+        if trace is not None:
+            trace.outcome = "crash"
+        debug_emit("on_swap_event_crash", {"trace": traceback.format_exc()}, ERROR)
+    finally:
+        if trace is not None:
+            trace.finish()
+            swap_traces.put(trace)
 
 # -----------------------------
 # EVM WS: Swap logs listener
 # -----------------------------
 async def heartbeat_loop() -> None:
     while True:
-        print(f"[heartbeat] alive clients={len(CLIENTS)} events={len(EVENTS)}", flush=True)
+        print(f"[heartbeat] alive clients={len(hub)} events={len(EVENTS)}", flush=True)
         await asyncio.sleep(10)
 
+def _log_key(payload: Dict[str, Any]) -> str:
+    return f"{payload.get('transactionHash')}:{payload.get('logIndex')}"
+
+async def ingest_log(payload: Dict[str, Any], t_arrival: float, decide: bool = True) -> Optional[Dict[str, Any]]:
+    """Decode, dedupe, store and broadcast one swap log; start its decision task if `decide`."""
+    global cursor_block
+    key = _log_key(payload)
+    if key in seen_logs:
+        return None
+
+    try:
+        ev = decode_swap_log(payload)
+    except Exception:
+        M_DECODE_FAILED.inc()
+        debug_emit("decode_swap_failed", {"trace": traceback.format_exc(), "payload": payload}, ERROR)
+        return None
+
+    seen_logs[key] = None
+    if len(seen_logs) > SEEN_LOGS_KEPT:
+        seen_logs.popitem(last=False)
+    if ev["blockNumber"] > cursor_block:
+        cursor_block = ev["blockNumber"]
+
+    t_decoded = time.perf_counter()
+    M_ARRIVAL_TO_DECODE.observe(t_decoded - t_arrival)
+    M_SWAPS.inc()
+    ev["tsMs"] = now_ms()
+    async with state_lock:
+        ev["id"] = event_store.append("swap", ev, ev["tsMs"])
+        EVENTS.append(ev)
+        if shared is not None:
+            shared.append(ev)  # before the broadcast: a worker relaying it already has the row
+
+    broadcast({"type": "swap", "data": ev})
+
+    if not decide:
+        return ev
+
+    bts = payload.get("blockTimestamp")
+    trace = SwapTrace(
+        ev.get("txHash"),
+        ev["blockNumber"],
+        t_arrival,
+        ev["tsMs"],
+        block_ts=None if bts is None else int(bts, 16) if isinstance(bts, str) else int(bts),
+    )
+    trace.t_decoded = t_decoded
+    trace.add("decode", t_arrival, t_decoded)
+
+    # Always run decision logic so you can see thinking even if trading disabled
+    # (the task copies the current context, so it runs under this swap's trace; the listener itself must not)
+    token = current_swap.set(trace)
+    try:
+        asyncio.create_task(on_swap_event(ev))
+    finally:
+        current_swap.reset(token)
+    return ev
+
+def _get_swap_logs(from_block: int, to_block: int) -> List[Dict[str, Any]]:
+    # raw JSON-RPC so the logs have the same shape as subscription payloads
+    resp = w3_http.provider.make_request("eth_getLogs", [{
+        "address": WATCH_POOL,
+        "topics": [SWAP_TOPIC0],
+        "fromBlock": hex(from_block),
+        "toBlock": hex(to_block),
+    }])
+    if "error" in resp:
+        raise RuntimeError(resp["error"])
+    return resp["result"]
+
+async def backfill_logs() -> int:
+    """
+    Ingest swap logs from the cursor block up to head, for the gap while the
+    subscription was down (or the process was). Logs already seen are
+    skipped; the cursor block itself is re-read because it may have been
+    only partly delivered. Only the newest backfilled swap gets a decision:
+    the decision reads current balances, so one is enough.
+    """
+    if cursor_block <= 0:
+        return 0
+    head = await pools["chain"].run(lambda: w3_http.eth.block_number)
+    start = max(cursor_block, head - BACKFILL_MAX_BLOCKS)
+    if start > cursor_block:
+        debug_emit("backfill_truncated", {"cursor": cursor_block, "from": start, "head": head}, WARN)
+
+    logs: List[Dict[str, Any]] = []
+    for lo in range(start, head + 1, BACKFILL_CHUNK_BLOCKS):
+        hi = min(lo + BACKFILL_CHUNK_BLOCKS - 1, head)
+        logs.extend(await pools["chain"].run(_get_swap_logs, lo, hi))
+    logs = [lg for lg in logs if not lg.get("removed") and _log_key(lg) not in seen_logs]
+
+    t_arrival = time.perf_counter()
+    for i, payload in enumerate(logs):
+        await ingest_log(payload, t_arrival, decide=i == len(logs) - 1)
+    if logs:
+        print(f"[evm_swap_listener] backfilled {len(logs)} swap logs from block {start} to {head}", flush=True)
+        debug_emit("backfill", {"from": start, "to": head, "logs": len(logs)}, WARN)
+    return len(logs)
+
 async def evm_swap_listener_loop() -> None:
     while True:
         try:
@@ -565,12 +1053,21 @@ async def evm_swap_listener_loop() -> None:
                 sub_id = resp.get("result")
                 print(f"[evm_swap_listener] subscribed: {sub_id} pool={WATCH_POOL}", flush=True)
 
+                # subscribed first, so nothing lands between the backfill and the live stream;
+                # live logs received meanwhile wait in the socket and are deduped against it
+                try:
+                    await backfill_logs()
+                except Exception as e:
+                    print(f"[evm_swap_listener] backfill failed: {e}", flush=True)
+                    debug_emit("backfill_failed", {"error": str(e), "cursor": cursor_block}, ERROR)
+
                 async for raw in ws:
+                    t_arrival = time.perf_counter()
                     try:
                         msg = json.loads(raw)
                     except Exception:
                         print("[evm_swap_listener] bad json:", raw[:200], flush=True)
-                        await debug_emit("ws_bad_json", {"raw_prefix": raw[:200]})
+                        debug_emit("ws_bad_json", {"raw_prefix": raw[:200]}, WARN)
                         continue
 
                     if msg.get("method") != "eth_subscription":
@@ -580,86 +1077,649 @@ async def evm_swap_listener_loop() -> None:
                     if not payload:
                         continue
 
-                    await debug_emit("raw_log", {"payload": payload})
-
-                    try:
-                        ev = decode_swap_log(payload)
-                    except Exception:
-                        await debug_emit("decode_swap_failed", {"trace": traceback.format_exc(), "payload": payload})
-                        continue
-
-                    async with state_lock:
-                        EVENTS.append(ev)
-                        if len(EVENTS) > MAX_EVENTS_STORED:
-                            del EVENTS[: len(EVENTS) - MAX_EVENTS_STORED]
-
-                    await broadcast({"type": "swap", "data": ev})
-
-                    # Always run decision logic so you can see thinking even if trading disabled
-                    asyncio.create_task(on_swap_event(ev))
+                    debug_emit("raw_log", {"payload": payload})
+                    await ingest_log(payload, t_arrival)
 
         except asyncio.CancelledError:
             print("[evm_swap_listener] cancelled", flush=True)
             raise
         except Exception as e:
+            M_RECONNECTS.inc()
             print(f"[evm_swap_listener] error: {e} — reconnecting...", flush=True)
             print(traceback.format_exc(), flush=True)
-            await debug_emit("listener_error", {"error": str(e), "trace": traceback.format_exc()})
+            debug_emit("listener_error", {"error": str(e), "trace": traceback.format_exc()}, ERROR)
             await asyncio.sleep(2.0)
 
 # -----------------------------
-# API + Lifespan
+# Warm-restart snapshots
 # -----------------------------
-from contextlib import asynccontextmanager
+# paper balances from the snapshot, applied when the PaperExchange is built
+restored_paper: Optional[Dict[str, Any]] = None
+
+def _snapshot_state() -> Dict[str, Any]:
+    # copies: serialized on a pool thread while the loop carries on
+    paper = restored_paper
+    if PAPER_TRADING and hl_exchange is not None:
+        paper = {"balances": dict(hl_exchange.balances)}
+    return {
+        "eventStore": EVENT_STORE_PATH,
+        "cursorBlock": cursor_block,
+        "seenLogs": list(seen_logs)[-1024:],
+        "inventory": dict(inventory),
+        "lastHedgeMs": last_hedge_ms,
+        "openHedges": [{"id": i, **h} for i, h in open_hedges.items()],
+        "paper": paper,
+        "addresses": list(EVENTS.addresses.values),
+        "overflow": {str(i): big for i, big in EVENTS.overflow.items()},
+    }
+
+async def save_snapshot() -> None:
+    t0 = time.perf_counter()
+    async with state_lock:
+        rows = EVENTS.export()
+        state = _snapshot_state()
+    size = await pools["diag"].run(snapshot.save, STATE_DIR, rows, state)
+    snapshot_stats.update({
+        "saves": snapshot_stats["saves"] + 1,
+        "lastSavedMs": now_ms(),
+        "bytes": size,
+        "saveMs": round((time.perf_counter() - t0) * 1000, 3),
+    })
+
+async def snapshot_loop() -> None:
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL_S)
+        if not role["leader"]:
+            continue  # the leader's snapshot is the shared one
+        try:
+            await save_snapshot()
+        except Exception as e:
+            print(f"[snapshot] save failed: {e}", flush=True)
+            debug_emit("snapshot_failed", {"error": str(e)}, ERROR)
+
+async def restore_snapshot() -> None:
+    global cursor_block, last_hedge_ms, restored_paper
+    t0 = time.perf_counter()
+    loaded = await pools["diag"].run(snapshot.load, STATE_DIR)
+    if loaded is None:
+        print(f"[startup] no snapshot in {STATE_DIR}, cold start", flush=True)
+        return
+    state, rows = loaded
+
+    # ring ids and the block cursor belong to one event store; a standby with its own only takes the shared part
+    own = state.get("eventStore") == EVENT_STORE_PATH
+    if not own:
+        rows = None
+    dropped = np.empty(0, dtype=ROW_DTYPE)
+    if rows is not None:
+        # the store may have lost its last commits (synchronous=NORMAL, or a kill before the writer
+        # flushed): ring rows past its max id would have their ids handed out again
+        keep = int(np.searchsorted(rows["id"], event_store.last_id, side="right"))
+        rows, dropped = rows[:keep], rows[keep:]
+        EVENTS.restore(rows, state["addresses"], {int(i): big for i, big in state["overflow"].items()})
+    if own:
+        cursor_block = int(state["cursorBlock"])
+        seen_logs.update((k, None) for k in state["seenLogs"])
+        if len(dropped):
+            # never stored, so fetched again by backfill (which re-reads the cursor block)
+            cursor_block = min(cursor_block, int(dropped["block"].min()))
+            for r in dropped:
+                seen_logs.pop(f"0x{bytes(r['tx']).ljust(32, bytes(1)).hex()}:{hex(int(r['log_index']))}", None)
+    inventory.update(state["inventory"])
+    last_hedge_ms = int(state["lastHedgeMs"])
+    restored_paper = state.get("paper")
+
+    snapshot_stats["loaded"] = {
+        "ms": round((time.perf_counter() - t0) * 1000, 3),
+        "ageMs": now_ms() - state["savedMs"],
+        "rows": len(EVENTS),
+        "ringRestored": rows is not None,
+        "ringClamped": len(dropped),
+        "cursorBlock": cursor_block,
+    }
+    print(f"[startup] snapshot restored: {snapshot_stats['loaded']}", flush=True)
+    if state["openHedges"]:
+        # what they did is reconciled from the hedge journal once the HL clients are up (recover_journal)
+        print(f"[startup] {len(state['openHedges'])} hedge(s) were in flight at the last shutdown: {state['openHedges']}", flush=True)
+
+# -----------------------------
+# Leader election (hot standby, LEASE_PATH)
+# -----------------------------
+async def follow_leader() -> None:
+    """Standby: take the leader's cooldown clock, inventory and paper balances from its snapshot, refresh the book."""
+    global last_hedge_ms
+    state = await pools["diag"].run(snapshot.load_state, STATE_DIR)
+    if state is not None:
+        last_hedge_ms = max(last_hedge_ms, int(state["lastHedgeMs"]))
+        inventory.update(state["inventory"])
+        if PAPER_TRADING and hl_exchange is not None and state.get("paper"):
+            hl_exchange.balances.update(state["paper"]["balances"])
+    if HL_EXECUTION:
+        # keeps the HL connection open and the paper book current
+        await pools["hl_info"].run(hl_info.l2_snapshot, SPOT_MARKET, priority=LOW)
+
+async def become_leader() -> None:
+    global journal
+    t0 = time.perf_counter()
+    await follow_leader()  # the old leader's last snapshot
+    if HL_EXECUTION:
+        if journal is None:
+            # once per term, and read afresh: the last leader appended to (and compacted) the file.
+            # A retried takeover keeps this one; step_down() closes it.
+            journal = await pools["diag"].run(Journal, HEDGE_JOURNAL_PATH)
+        await take_journal()  # whatever it left open
+    role.update({"leader": True, "epoch": lease.epoch, "sinceMs": now_ms(), "takeovers": role["takeovers"] + 1,
+                 "takeoverMs": round((time.perf_counter() - t0) * 1000, 3)})
+    print(f"[leader] acquired epoch={lease.epoch} in {role['takeoverMs']}ms", flush=True)
+    debug_emit("leader_acquired", {"epoch": lease.epoch, "owner": lease.owner, "ms": role["takeoverMs"]}, WARN)
+
+    # swaps that arrived while nobody was leading got no decision; one on the newest is enough
+    n = len(EVENTS)
+    if n:
+        asyncio.create_task(on_swap_event(EVENTS.to_dicts(n - 1, n)[0]))
+
+async def step_down() -> None:
+    global journal
+    role.update({"leader": False, "epoch": None, "sinceMs": None})
+    print(f"[leader] lost lease epoch={lease.epoch}: now standby", flush=True)
+    debug_emit("leader_lost", {"epoch": lease.epoch, "holder": lease.holder()}, ERROR)
+    lease.release()
+    # hedges in flight stop at their next fence check; let them write their records first
+    deadline = time.perf_counter() + SHUTDOWN_HEDGE_WAIT_S
+    while open_hedges and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    # the next term opens the file afresh; hedges still in an order call hold this handle until they finish
+    old, journal = journal, None
+    if old is None:
+        return
+    if open_hedges:
+        print(f"[leader] {len(open_hedges)} hedge(s) still open after {SHUTDOWN_HEDGE_WAIT_S}s; journal closes when they finish", flush=True)
+        asyncio.create_task(close_journal_after(old, set(open_hedges)))
+    else:
+        await pools["diag"].run(old.close)
+
+async def close_journal_after(old: Journal, hedges: Set[int]) -> None:
+    """Closes a stepped-down term's journal once the hedges (open_hedges keys) that write to it are done."""
+    while hedges & open_hedges.keys():
+        await asyncio.sleep(0.05)
+    await pools["diag"].run(old.close)
+
+async def leadership_loop() -> None:
+    poll = LEASE_POLL_MS / 1000
+    while True:
+        followed = 0.0
+        while not lease.try_acquire():
+            if time.perf_counter() - followed >= STANDBY_REFRESH_MS / 1000:
+                followed = time.perf_counter()
+                try:
+                    await follow_leader()
+                except Exception as e:
+                    debug_emit("standby_refresh_failed", {"error": str(e)}, WARN)
+            await asyncio.sleep(poll)
+
+        while True:
+            try:
+                await become_leader()
+                break
+            except Exception as e:
+                # holding the lease, so nobody else trades meanwhile; retry until the journal is reconciled
+                print(f"[leader] takeover failed: {type(e).__name__}: {e}", flush=True)
+                debug_emit("leader_takeover_failed", {"error": str(e)}, ERROR)
+                await asyncio.sleep(STARTUP_RETRY_S)
+
+        while lease.held():
+            await asyncio.sleep(poll)
+        await step_down()
+
+# -----------------------------
+# Process split (PROCESS_ROLE): the ingest process publishes, API workers serve
+# -----------------------------
+broker: Optional[BrokerServer] = None
+broker_client: Optional[BrokerClient] = None
+broker_task: Optional[asyncio.Task] = None
+# API worker: the ingest process's state as last received
+ingest_state: Dict[str, Any] = {}
+# shared-memory segment: the writer in the ingest process, the reader in an API worker (where it's also EVENTS)
+shared: Optional[SharedState] = None
+shared_task: Optional[asyncio.Task] = None
+# API worker: its own ring, for when the ingest process has no segment
+local_events = EVENTS
+
+def _ingest_state() -> Dict[str, Any]:
+    return {
+        "type": "state",
+        "data": {
+            "ready": startup["ready"],
+            "chainId": CHAIN_ID,
+            "szDecimals": purr_sz_decimals,
+            "inventory": dict(inventory) or None,
+            "openHedges": list(open_hedges.values()),
+            "lastHedgeMs": last_hedge_ms,
+            "role": dict(role),
+            "journal": journal.stats() if journal is not None else None,
+            "cursorBlock": cursor_block,
+            "swaps": EVENTS.count,
+            "seq": hub.seq,
+            "ms": now_ms(),
+        },
+    }
+
+def _broker_sync() -> Callable[[], Dict[str, Any]]:
+    """
+    ws_snapshot for a worker: more swaps, plus the ingest state. Captured here without awaiting, as a
+    copy of the newest ring rows; the returned function builds the message from it off the loop.
+    """
+    n = len(EVENTS)
+    # workers reading the shared segment don't need the swaps, only which segment it is
+    last = 0 if shared is not None else BROKER_SYNC_SWAPS
+    rows = EVENTS.export(max(0, n - last), n)
+    addresses, overflow = list(EVENTS.addresses.values), dict(EVENTS.overflow)
+    head = {"type": "sync", "seq": hub.seq, "stream": hub.stream}
+    segment = {"name": shared.name, "pid": shared.writer} if shared is not None else None
+    state = _ingest_state()["data"]
+
+    def build() -> Dict[str, Any]:
+        ring = SwapRing(max(1, len(rows)))
+        ring.restore(rows, addresses, overflow)
+        return {**head, "data": {"swaps": ring.to_dicts(0, len(ring)), "state": state, "shm": segment}}
+    return build
+
+def _apply_ingest_state(st: Dict[str, Any]) -> None:
+    global CHAIN_ID, purr_sz_decimals, last_hedge_ms
+    ingest_state.clear()
+    ingest_state.update(st)
+    CHAIN_ID = st["chainId"]
+    purr_sz_decimals = st["szDecimals"]
+    inventory.clear()
+    inventory.update(st["inventory"] or {})
+    open_hedges.clear()
+    open_hedges.update(enumerate(st["openHedges"]))
+    last_hedge_ms = st["lastHedgeMs"]
+    startup["ready"] = st["ready"]
+
+def on_broker_message(msg: Dict[str, Any], payload: str) -> None:
+    """API worker: apply one message from the ingest process; on the loop, without awaiting."""
+    typ = msg.get("type")
+    if typ == "state":
+        _apply_ingest_state(msg["data"])
+        return
+    if typ == "sync":
+        segment = msg["data"].get("shm")
+        if segment is None or not attach_shared(segment):
+            detach_shared()
+            EVENTS.restore(np.empty(0, dtype=ROW_DTYPE), [], {})
+            for ev in msg["data"]["swaps"]:
+                EVENTS.append(ev)
+        hub.reset(msg["seq"], msg["stream"])
+        _apply_ingest_state(msg["data"]["state"])
+        # (re)synced: this worker's clients may have missed messages, so they start over too
+        for sub in list(hub.subs.values()):
+            sub.send(ws_snapshot())
+        print(f"[broker] synced at seq {msg['seq']} with {len(EVENTS)} swaps", flush=True)
+        return
+    if typ == "swap" and shared is None:
+        EVENTS.append(msg["data"])
+    hub.relay(msg, payload)
+
+def publish_shared() -> None:
+    nan = float("nan")
+    ratio = inventory.get("ratio")
+    shared.publish(
+        U_usdc=inventory.get("U_usdc", nan),
+        P_purr=inventory.get("P_purr", nan),
+        q_usdc_per_purr=inventory.get("q_usdc_per_purr", nan),
+        ratio=nan if ratio is None else ratio,
+        d_usdc=inventory.get("d_usdc", nan),
+        inventoryBlock=inventory.get("blockNumber") or 0,
+        inventoryMs=inventory.get("tsMs", 0),
+        inventoryTx=(inventory.get("txHash") or "").encode(),
+        lastHedgeMs=last_hedge_ms,
+        openHedges=len(open_hedges),
+        cursorBlock=cursor_block,
+        ready=int(startup["ready"]),
+        writtenMs=now_ms(),
+    )
+
+async def open_shared() -> None:
+    """Ingest: create the segment and copy the ring in (before the listener starts, so nothing appends meanwhile)."""
+    global shared
+    shared = await pools["diag"].run(SharedState.create, SHM_STATE, MAX_EVENTS_STORED + 1)
+
+    def seed() -> None:
+        for ev in EVENTS.to_dicts(0, len(EVENTS)):
+            shared.append(ev)
+    await pools["diag"].run(seed)
+    publish_shared()
+    print(f"[startup] shared state: /dev/shm/{SHM_STATE} ({shared.nbytes()} bytes, {len(shared)} swaps)", flush=True)
+
+async def shared_state_loop() -> None:
+    # cooldown clock, hedges in flight and readiness change between inventory updates
+    while True:
+        await asyncio.sleep(BROKER_STATE_MS / 1000)
+        publish_shared()
 
+def attach_shared(segment: Dict[str, Any]) -> bool:
+    """API worker: map the segment named in a sync, unless it's the one already mapped; from then on it is EVENTS.
+
+    The ingest process creates its segment before it accepts workers, so it exists by the time its sync
+    arrives. A restarted ingest process unlinks the old one and creates another under the same name; the
+    writer pid tells them apart.
+    """
+    global shared, EVENTS
+    if shared is not None and shared.name == segment["name"] and shared.writer == segment["pid"]:
+        return True
+    try:
+        new = SharedState.attach(segment["name"])
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[broker] cannot map shared state /dev/shm/{segment['name']}: {e!r}", flush=True)
+        return False
+    if new.writer != segment["pid"]:
+        print(f"[broker] /dev/shm/{segment['name']} is written by pid {new.writer}, not {segment['pid']}", flush=True)
+        new.close()
+        return False
+    detach_shared()
+    shared = EVENTS = new
+    print(f"[broker] reading shared state /dev/shm/{shared.name} (writer pid {shared.writer}): {len(shared)} swaps", flush=True)
+    return True
+
+def detach_shared() -> None:
+    """API worker: back to its own ring."""
+    global shared, EVENTS
+    old, shared, EVENTS = shared, None, local_events
+    if old is None:
+        return
+    try:
+        old.close()
+    except BufferError:
+        pass  # a read in a pool thread still has views; the mapping goes when they do
+
+def _inventory() -> Optional[Dict[str, Any]]:
+    if shared is not None and not shared.owner:
+        return shared.inventory()
+    return inventory or None
+
+def _ingest_only() -> None:
+    if PROCESS_ROLE == "api":
+        raise HTTPException(status_code=404, detail="served by the PROCESS_ROLE=ingest process")
+
+# -----------------------------
+# Startup (lifespan): upstream clients, concurrently
+# -----------------------------
 listener_task: Optional[asyncio.Task] = None
 heartbeat_task: Optional[asyncio.Task] = None
+startup_task: Optional[asyncio.Task] = None
+snapshot_task: Optional[asyncio.Task] = None
+leadership_task: Optional[asyncio.Task] = None
+
+# /ready reports this; /health is liveness only
+startup: Dict[str, Any] = {
+    "ready": False,
+    "attempts": 0,
+    "error": None,
+    "metaSource": None,  # cache | fetched
+    "steps": {},  # step -> ms, last attempt
+    "readyMs": None,
+}
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    global listener_task, heartbeat_task
-    print("[lifespan] startup begin", flush=True)
+async def _timed(step: str, coro) -> Any:
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        startup["steps"][step] = round((time.perf_counter() - t0) * 1000, 3)
 
-    if ENABLE_HL_TRADING:
-        await init_market_decimals()
-        print(f"[startup] trading enabled. szDecimals={purr_sz_decimals}, hlAccount={os.getenv('HL_ACCOUNT_ADDRESS')}", flush=True)
-        await debug_emit("startup", {"trading": True, "szDecimals": purr_sz_decimals})
+def _load_hl_meta_cache() -> Optional[Dict[str, Any]]:
+    try:
+        with open(HL_META_CACHE) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("baseUrl") != HL_BASE_URL:
+        return None  # testnet cache on mainnet or vice versa
+    return cached
+
+def _save_hl_meta_cache(meta: Dict[str, Any], spot_meta: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(HL_META_CACHE) or ".", exist_ok=True)
+    tmp = HL_META_CACHE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"baseUrl": HL_BASE_URL, "fetchedMs": now_ms(), "meta": meta, "spotMeta": spot_meta}, f)
+    os.replace(tmp, HL_META_CACHE)
+
+async def _fetch_hl_meta() -> List[Dict[str, Any]]:
+    from hyperliquid.api import API
+
+    api = API(HL_BASE_URL)
+    return await asyncio.gather(
+        pools["hl_info"].run(api.post, "/info", {"type": "meta", "dex": ""}),
+        pools["hl_info"].run(api.post, "/info", {"type": "spotMeta"}),
+    )
+
+def _market_sz_decimals() -> int:
+    return int(hl_info.asset_to_sz_decimals[hl_info.name_to_asset(SPOT_MARKET)])
+
+async def _init_chain() -> None:
+    global CHAIN_ID
+    if CHAIN_ID is None:
+        CHAIN_ID = int(await pools["chain"].run(lambda: w3_http.eth.chain_id))
     else:
-        await debug_emit("startup", {"trading": False})
+        # still open the RPC connection the first balance reads will reuse
+        await pools["chain"].run(lambda: w3_http.eth.block_number)
 
-    listener_task = asyncio.create_task(evm_swap_listener_loop(), name="evm_swap_listener")
-    heartbeat_task = asyncio.create_task(heartbeat_loop(), name="heartbeat")
+async def _init_hl() -> None:
+    global purr_sz_decimals
+    cached = await pools["diag"].run(_load_hl_meta_cache)
+    if cached is not None:
+        await pools["diag"].run(build_hl_clients, cached["meta"], cached["spotMeta"])
+        try:
+            purr_sz_decimals = _market_sz_decimals()
+            startup["metaSource"] = "cache"
+        except KeyError:
+            cached = None  # market listed after the cache was written
+    if cached is None:
+        meta, spot_meta = await _timed("hl_meta", _fetch_hl_meta())
+        await pools["diag"].run(build_hl_clients, meta, spot_meta)
+        purr_sz_decimals = _market_sz_decimals()
+        startup["metaSource"] = "fetched"
+        await pools["diag"].run(_save_hl_meta_cache, meta, spot_meta)
+
+    # first book read opens the HL connection the decision path reuses
+    await _timed("book_warmup", pools["hl_info"].run(hl_info.l2_snapshot, SPOT_MARKET))
+
+async def _refresh_hl_meta_cache() -> None:
+    # after starting from the cache: refresh it for the next start, and pick up a szDecimals change
+    global purr_sz_decimals
+    try:
+        meta, spot_meta = await _fetch_hl_meta()
+        await pools["diag"].run(_save_hl_meta_cache, meta, spot_meta)
+    except Exception as e:
+        print(f"[startup] HL meta refresh failed: {type(e).__name__}: {e}", flush=True)
+        return
+    token_by_index = {t["index"]: t for t in spot_meta["tokens"]}
+    for u in spot_meta["universe"]:
+        base, quote = u["tokens"]
+        if SPOT_MARKET in (u["name"], f'{token_by_index[base]["name"]}/{token_by_index[quote]["name"]}'):
+            fresh = int(token_by_index[base]["szDecimals"])
+            if fresh != purr_sz_decimals:
+                print(f"[startup] szDecimals changed {purr_sz_decimals} -> {fresh}", flush=True)
+                debug_emit("sz_decimals_changed", {"old": purr_sz_decimals, "new": fresh}, WARN)
+                purr_sz_decimals = fresh
+            return
 
+async def init_upstreams() -> None:
+    """
+    Everything that needs the network before swaps can be handled: chain id,
+    HL metadata + clients + szDecimals, book warm-up. Retries until it
+    succeeds; the swap listener only starts once it has.
+    """
+    global listener_task, leadership_task
+    t0 = time.perf_counter()
+    while True:
+        startup["attempts"] += 1
+        try:
+            steps = [_timed("chain", _init_chain())]
+            if HL_EXECUTION:
+                steps.append(_timed("hl", _init_hl()))
+            await asyncio.gather(*steps)
+            if journal is not None:
+                await _timed("journal_recovery", take_journal())
+            break
+        except Exception as e:
+            startup["error"] = f"{type(e).__name__}: {e}"
+            print(f"[startup] attempt {startup['attempts']} failed: {startup['error']}", flush=True)
+            debug_emit("startup_error", {"attempt": startup["attempts"], "error": startup["error"]}, ERROR)
+            await asyncio.sleep(STARTUP_RETRY_S)
+
+    startup["error"] = None
+    startup["ready"] = True
+    startup["readyMs"] = round((time.perf_counter() - t0) * 1000, 3)
+    print(f"[startup] ready in {startup['readyMs']}ms chainId={CHAIN_ID} steps={startup['steps']}", flush=True)
+    if HL_EXECUTION:
+        print(f"[startup] trading enabled. paper={PAPER_TRADING} szDecimals={purr_sz_decimals}, hlAccount={HL_ACCOUNT_ADDRESS} meta={startup['metaSource']}", flush=True)
+        debug_emit("startup", {"trading": True, "paper": PAPER_TRADING, "szDecimals": purr_sz_decimals, "chainId": CHAIN_ID})
+    else:
+        debug_emit("startup", {"trading": False, "chainId": CHAIN_ID})
+
+    listener_task = asyncio.create_task(evm_swap_listener_loop(), name="evm_swap_listener")
     print("Started: EVM swap listener", flush=True)
+    if lease is not None:
+        leadership_task = asyncio.create_task(leadership_loop(), name="leadership")
+
+    if startup["metaSource"] == "cache":
+        await _refresh_hl_meta_cache()
+
+# -----------------------------
+# API + Lifespan
+# -----------------------------
+from contextlib import asynccontextmanager
+
+def _check_ws_deflate() -> None:
+    if ws_deflate is None and "WS_DEFLATE" in os.environ:
+        print("[startup] WS_DEFLATE is ignored under the uvicorn CLI; pass --ws-per-message-deflate instead", flush=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global heartbeat_task, startup_task, snapshot_task, event_store, journal, broker, shared_task
+    print("[lifespan] startup begin", flush=True)
+    _check_ws_deflate()
+
+    os.makedirs(os.path.dirname(EVENT_STORE_PATH) or ".", exist_ok=True)
+    event_store = EventStore(EVENT_STORE_PATH)
+    print(f"[startup] event store: {EVENT_STORE_PATH}", flush=True)
+    if HL_EXECUTION and lease is None:
+        # with a lease, the journal is opened by whichever instance becomes leader
+        journal = await pools["diag"].run(Journal, HEDGE_JOURNAL_PATH)
+        print(f"[startup] hedge journal: {HEDGE_JOURNAL_PATH} ({len(journal.hedges)} open)", flush=True)
+    tracer.start()
+    loopmon.start()
+    await restore_snapshot()
+    if PROCESS_ROLE == "ingest" and SHM_STATE:
+        await open_shared()
+        shared_task = asyncio.create_task(shared_state_loop(), name="shared_state")
+    if PROCESS_ROLE == "ingest":
+        broker = BrokerServer(BROKER_PATH, hub, _broker_sync, _ingest_state, BROKER_STATE_MS / 1000,
+                              offload=lambda fn: pools["diag"].run(fn, priority=LOW))
+        await broker.start()
+        print(f"[startup] broker: {BROKER_PATH}", flush=True)
+
+    # network init runs in the background: the app serves /health right away, /ready once it's done
+    startup_task = asyncio.create_task(init_upstreams(), name="init_upstreams")
+    heartbeat_task = asyncio.create_task(heartbeat_loop(), name="heartbeat")
+    if SNAPSHOT_INTERVAL_S > 0:
+        snapshot_task = asyncio.create_task(snapshot_loop(), name="snapshot")
 
     try:
         yield
     finally:
         print("[lifespan] shutdown begin", flush=True)
-        for t in [listener_task, heartbeat_task]:
+        for t in [startup_task, leadership_task, listener_task, heartbeat_task, snapshot_task, shared_task]:
             if t:
                 t.cancel()
                 try:
                     await t
                 except asyncio.CancelledError:
                     pass
+        if broker is not None:
+            await broker.stop()
+        if shared is not None:
+            shared.close()  # unlinks it; workers keep their mapping until the next ingest process syncs them
+        # no new swaps now; let hedges already sent finish so the snapshot doesn't leave them open
+        deadline = time.perf_counter() + SHUTDOWN_HEDGE_WAIT_S
+        while open_hedges and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        if role["leader"]:
+            try:
+                await save_snapshot()
+                print(f"[lifespan] snapshot saved: {snapshot_stats['bytes']} bytes in {snapshot_stats['saveMs']}ms", flush=True)
+            except Exception as e:
+                print(f"[lifespan] snapshot failed: {e}", flush=True)
+        if lease is not None:
+            lease.release()  # a standby takes over within LEASE_POLL_MS
+        if journal is not None:
+            await pools["diag"].run(journal.close)
+        await pools["diag"].run(event_store.close)
+        await tracer.stop()
+        await loopmon.stop()
+        pools.shutdown()
         print("[lifespan] shutdown complete", flush=True)
 
+@asynccontextmanager
+async def api_lifespan(app: FastAPI):
+    """PROCESS_ROLE=api: no upstreams and no trading; swaps, state and /ws messages come from the broker."""
+    global event_store, broker_client, broker_task
+    print(f"[lifespan] api worker {os.getpid()} startup, broker {BROKER_PATH}", flush=True)
+    _check_ws_deflate()
+    event_store = EventStore(EVENT_STORE_PATH, readonly=True)
+    tracer.start()
+    loopmon.start()
+    broker_client = BrokerClient(BROKER_PATH, on_broker_message, retry_s=STARTUP_RETRY_S)
+    broker_task = asyncio.create_task(broker_client.run(), name="broker_client")
+    try:
+        yield
+    finally:
+        broker_task.cancel()
+        try:
+            await broker_task
+        except asyncio.CancelledError:
+            pass
+        detach_shared()
+        await tracer.stop()
+        await loopmon.stop()
+        pools.shutdown()
+        print(f"[lifespan] api worker {os.getpid()} shutdown complete", flush=True)
+
 app = FastAPI(
     title="Swap Listener + HL Rebalance (ratio-based)",
     version="2.1.0",
-    lifespan=lifespan,
+    lifespan=api_lifespan if PROCESS_ROLE == "api" else lifespan,
 )
 
 @app.get("/health")
 async def health() -> Dict[str, Any]:
-    default_core_vault = await get_default_core_vault()
+    if PROCESS_ROLE == "api":
+        return {
+            "ok": True,
+            "process": "api",
+            "pid": os.getpid(),
+            "ready": _is_ready(),
+            "watchPool": WATCH_POOL,
+            "swapsInMemory": len(EVENTS),
+            "broker": broker_client.stats(),
+            "shm": shared.stats() if shared is not None else None,
+            "inventory": _inventory(),
+            "ws": {**hub.stats(), "encodings": wire.available(), "deflate": ws_deflate},
+            "loop": loopmon.stats(),
+            "executors": pools.stats(),
+            "ingest": ingest_state,
+        }
+    # liveness: in-process state only, never an upstream call (the chain is checked by /ready)
     return {
         "ok": True,
+        "process": PROCESS_ROLE,
+        "ready": startup["ready"],
         "watchPool": WATCH_POOL,
         "swapTopic0": SWAP_TOPIC0,
-        "defaultCoreVault": default_core_vault,
         "tradingEnabled": ENABLE_HL_TRADING,
+        "paperTrading": PAPER_TRADING,
         "spotMarket": SPOT_MARKET,
         "band": REBALANCE_BAND,
         "chainId": CHAIN_ID,
@@ -667,35 +1727,295 @@ async def health() -> Dict[str, Any]:
         "usdcAddress": USDC_ADDRESS,
         "hlAccount": os.getenv("HL_ACCOUNT_ADDRESS"),
         "szDecimals": purr_sz_decimals,
+        "ws": {**hub.stats(), "encodings": wire.available(), "deflate": ws_deflate},
+        "tracing": tracer.stats(),
+        "loop": loopmon.stats(),
+        "executors": pools.stats(),
+        "snapshot": {**snapshot_stats, "cursorBlock": cursor_block, "recoveredHedges": recovered_hedges},
+        "journal": journal.stats() if journal is not None else None,
+        "eventStore": event_store.stats() if event_store is not None else None,
+        "role": {**role, "lease": LEASE_PATH, "holder": lease.holder() if lease is not None else None},
+        "broker": broker.stats() if broker is not None else None,
+        "shm": shared.stats() if shared is not None else None,
     }
 
+def _is_ready() -> bool:
+    # an API worker is ready once it's synced with an ingest process that is
+    return startup["ready"] and (broker_client is None or broker_client.synced)
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    # 503 until init_upstreams has finished (chain id, HL clients, book warm-up) and the listener is up,
+    # and, where the chain is read, while it doesn't answer
+    body = {**startup, "ready": _is_ready(), "chainId": CHAIN_ID, "szDecimals": purr_sz_decimals}
+    if broker_client is not None:
+        body["broker"] = broker_client.stats()
+    elif body["ready"]:
+        try:
+            body["defaultCoreVault"] = await get_default_core_vault()
+        except Exception as e:
+            body.update(ready=False, chainError=f"{type(e).__name__}: {e}")
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+async def get_traces(limit: int = 100, min_total_ms: float = 0.0, outcome: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Most recent finished swap -> hedge traces first; `min_total_ms` to look at the slow ones."""
+    _ingest_only()
+    return swap_traces.recent(max(1, min(limit, 2000)), min_total_ms, outcome)
+
+@app.get("/traces/summary")
+async def traces_summary() -> Dict[str, Any]:
+    """Per-stage latency percentiles (ms) over the stored traces, with the upstream each stage waits on."""
+    _ingest_only()
+    return swap_traces.summary(TRACE_PROVIDERS)
+
+@app.get("/traces/{tx_hash}")
+async def get_trace(tx_hash: str) -> Dict[str, Any]:
+    _ingest_only()
+    trace = swap_traces.get(tx_hash)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="no trace for this txHash (not seen, or aged out)")
+    return trace.to_dict()
+
 @app.get("/events")
-async def get_events(limit: int = 200) -> List[Dict[str, Any]]:
+async def get_events(
+    response: Response,
+    limit: int = 200,
+    cursor: Optional[int] = None,
+    kind: str = "swap",
+    sender: Optional[str] = None,
+    is_zero_to_one: Optional[bool] = None,
+    from_block: Optional[int] = None,
+    to_block: Optional[int] = None,
+    since_ms: Optional[int] = None,
+    until_ms: Optional[int] = None,
+    tx_hash: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Newest `limit` events with id < cursor, oldest first. When the page is
+    full, X-Next-Cursor carries the cursor for the page before it.
+    Unfiltered swap pages are served from the in-memory hot cache when it
+    covers them, everything else goes to the event store.
+    """
     limit = max(1, min(limit, 2000))
+    filtered = any(v is not None for v in (sender, is_zero_to_one, from_block, to_block, since_ms, until_ms, tx_hash))
+
+    evs: Optional[List[Dict[str, Any]]] = None
+    if kind == "swap" and not filtered:
+        async with state_lock:
+            evs = EVENTS.page(limit, cursor)
+
+    if evs is None:
+        evs = await pools["diag"].run(
+            event_store.query,
+            kind=kind,
+            limit=limit,
+            cursor=cursor,
+            sender=Web3.to_checksum_address(sender) if sender else None,
+            is_zero_to_one=is_zero_to_one,
+            from_block=from_block,
+            to_block=to_block,
+            since_ms=since_ms,
+            until_ms=until_ms,
+            tx_hash=tx_hash,
+        )
+
+    if len(evs) == limit:
+        response.headers["X-Next-Cursor"] = str(evs[0]["id"])
+    return evs
+
+def _flow_summary(last: int) -> Dict[str, Any]:
+    w = EVENTS.window(last)
+    n = int(len(w["id"]))
+    if n == 0:
+        return {"swaps": 0}
+    zero_to_one = (w["flags"] & FLAG_ZERO_TO_ONE) != 0
+    return {
+        "swaps": n,
+        "zeroToOne": int(zero_to_one.sum()),
+        "oneToZero": int(n - zero_to_one.sum()),
+        "netUsdcDelta": int(w["usdc_delta"].sum()),
+        "uniqueSenders": int(len(np.unique(w["sender"]))),
+        "fromBlock": int(w["block"][0]),
+        "toBlock": int(w["block"][-1]),
+        "fromId": int(w["id"][0]),
+        "toId": int(w["id"][-1]),
+    }
+
+@app.get("/events/summary")
+async def events_summary(last: int = 1000) -> Dict[str, Any]:
+    """Flow over the most recent `last` swaps in the hot cache, computed on zero-copy column views."""
     async with state_lock:
-        evs = list(EVENTS)
-    return evs[-limit:]
+        return EVENTS.read(lambda: _flow_summary(max(1, last)))
 
 @app.get("/hl/spot_state")
 async def hl_spot_state():
-    if not ENABLE_HL_TRADING:
+    _ingest_only()
+    if not HL_EXECUTION:
         return {"ok": False, "reason": "trading_disabled"}
-    st = await asyncio.to_thread(hl_info.spot_user_state, HL_ACCOUNT_ADDRESS)
+    if hl_info is None:
+        raise HTTPException(503, "starting")
+    st = await pools["diag"].run(_spot_user_state)
     return st
 
+@app.get("/paper/fills")
+async def paper_fills(limit: int = 200) -> Dict[str, Any]:
+    _ingest_only()
+    if not PAPER_TRADING:
+        return {"ok": False, "reason": "paper_trading_disabled"}
+    if hl_exchange is None:
+        raise HTTPException(503, "starting")
+    limit = max(1, min(limit, 2000))
+    return {"ok": True, "summary": hl_exchange.summary(), "fills": list(hl_exchange.fills)[-limit:]}
+
+@app.get("/debug/tracing")
+async def get_tracing() -> Dict[str, Any]:
+    return tracer.stats()
+
+@app.post("/debug/tracing")
+async def set_tracing(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Body: any of {"level": "debug|info|warn|error|off", "sample": {"raw_log": 0.1},
+    "stdout": bool, "file": "path" ("" to turn the file sink off)}.
+    """
+    try:
+        return tracer.configure(
+            level=cfg.get("level"),
+            sample=cfg.get("sample"),
+            stdout=cfg.get("stdout"),
+            file_path=cfg.get("file"),
+        )
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def ws_snapshot() -> Dict[str, Any]:
+    """
+    Everything a fresh client needs, as of hub.seq. Built without awaiting so
+    no message can be published between the snapshot and the first delta.
+    """
+    n = len(EVENTS)
+    return {
+        "type": "snapshot",
+        "seq": hub.seq,
+        "stream": hub.stream,
+        "data": {
+            "swaps": EVENTS.to_dicts(max(0, n - WS_SNAPSHOT_SWAPS), n),
+            "inventory": _inventory(),
+            "openHedges": list(open_hedges.values()),
+            "lastHedgeMs": last_hedge_ms,
+        },
+    }
+
+@app.get("/debug/stalls")
+async def debug_stalls() -> List[Dict[str, Any]]:
+    """Recent event-loop stalls, oldest first, with the loop thread's stack while it was held."""
+    return loopmon.recent_stalls()
+
+def _require_debug_token(request: Request) -> None:
+    if not DEBUG_ENDPOINT_TOKEN:
+        raise HTTPException(status_code=404, detail="profiling endpoints are disabled (set DEBUG_ENDPOINT_TOKEN)")
+    token = request.headers.get("x-debug-token") or request.query_params.get("token") or ""
+    if not hmac.compare_digest(token.encode(), DEBUG_ENDPOINT_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="bad debug token")
+    if profiler.session.locked():
+        raise HTTPException(status_code=409, detail="another profiling session is running")
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = 10.0, hz: int = 100, threads: str = "loop") -> Response:
+    """
+    Samples stacks for `seconds` (max 60) at `hz` (max 250) and returns
+    collapsed stacks for flamegraph.pl / speedscope. threads=loop (default)
+    samples the event loop thread only, threads=all every thread.
+    """
+    _require_debug_token(request)
+    async with profiler.session:
+        thread_ids = None if threads == "all" else [threading.get_ident()]
+        text, samples = await profiler.profile(seconds, hz, thread_ids, offload=pools["diag"].run)
+    return Response(text, media_type="text/plain", headers={"X-Samples": str(samples)})
+
+@app.get("/debug/memory")
+async def debug_memory(request: Request, seconds: float = 10.0, top: int = 30, group_by: str = "lineno", nframes: int = 1) -> Dict[str, Any]:
+    """
+    tracemalloc growth over `seconds` (max 60): the `top` allocation sites
+    by size_diff, grouped by lineno, filename or traceback (nframes deep).
+    """
+    _require_debug_token(request)
+    async with profiler.session:
+        try:
+            diff = await profiler.memory_diff(seconds, max(1, min(top, 200)), group_by, nframes, offload=pools["diag"].run)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    diff["app"] = {
+        "swaps_in_memory": len(EVENTS),
+        "swap_ring_bytes": EVENTS.nbytes(),
+        "ws_replay_buffered": len(hub.replay),
+        "swap_traces": len(swap_traces),
+        "trace_buffered": len(tracer.ring),
+        "event_store_pending": event_store.pending(),
+    }
+    return diff
+
 @app.websocket("/ws")
 async def ws_endpoint(ws: WebSocket):
+    """
+    On connect: hello, then either a snapshot followed by live deltas, or with
+    ?resume=<seq>&stream=<id> the deltas missed since seq (a snapshot if they've
+    aged out, or the stream id from hello is another one: the server restarted).
+    Every non-debug message carries `seq`; store the last one to resume.
+    ?encoding=json|msgpack|cbor picks the wire format (binary frames for the latter two).
+    """
+    encoding = ws.query_params.get("encoding", "json")
     await ws.accept()
-    CLIENTS.add(ws)
+    if encoding not in wire.available():
+        await ws.close(code=1003, reason=f"unsupported encoding {encoding!r}, available: {wire.available()}")
+        return
+    sub = hub.register(ws, encoding)
     try:
-        await ws.send_text(json.dumps({"type": "hello", "data": {"watchPool": WATCH_POOL, "debug": DEBUG}}))
+        # optional ?topics=swap,rebalance on connect; same as a subscribe message
+        if ws.query_params.get("topics"):
+            sub.subscribe(ws.query_params["topics"].split(","))
+        sub.send({"type": "hello", "data": {
+            "watchPool": WATCH_POOL,
+            "debug": tracer.enabled(),
+            "topics": sub.topics,
+            "seq": hub.seq,
+            "stream": hub.stream,
+            "encoding": encoding,
+        }})
+        resume = ws.query_params.get("resume")
+        resumed = (resume is not None and resume.lstrip("-").isdigit()
+                   and hub.resume(sub, int(resume), ws.query_params.get("stream")))
+        if resumed:
+            sub.send({"type": "resumed", "data": {"from": int(resume), "seq": hub.seq, "stream": hub.stream}})
+        else:
+            sub.send(ws_snapshot())
         while True:
-            _ = await ws.receive_text()
+            raw = await ws.receive_text()
+            try:
+                req = json.loads(raw)
+            except Exception:
+                continue
+            if not isinstance(req, dict):
+                continue
+            try:
+                if req.get("type") == "subscribe":
+                    topics = sub.subscribe(req.get("topics") or [], req.get("sample"))
+                    sub.send({"type": "subscribed", "data": {"topics": topics}})
+                elif req.get("type") == "unsubscribe":
+                    topics = sub.unsubscribe(req.get("topics") or [])
+                    sub.send({"type": "subscribed", "data": {"topics": topics}})
+            except ValueError as e:
+                sub.send({"type": "error", "data": {"request": req.get("type"), "detail": str(e)}})
     except WebSocketDisconnect:
         pass
     finally:
-        CLIENTS.discard(ws)
+        hub.unregister(ws)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="debug")
\ No newline at end of file
+    ws_deflate = WS_DEFLATE
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")), log_level="debug", ws_per_message_deflate=ws_deflate)
\ No newline at end of file
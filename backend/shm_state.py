@@ -0,0 +1,338 @@
+"""
+Shared-memory state segment: one writer, lock-free readers.
+
+The ingest process (PROCESS_ROLE=ingest) writes the decision path's current
+state and the recent-swap ring into one POSIX shared memory block; every
+API worker maps the same block and reads it in place, so /events,
+/events/summary and the /ws connect snapshot cost no copy through the broker
+and no chain I/O of their own.
+
+Layout (all offsets 64-byte aligned):
+
+  header  int64[8]   magic, layout version, ring capacity, rows published,
+                     state seqlock, writer pid
+  state   one record of STATE_DTYPE: inventory (U, P, mid, ratio, d),
+                     its tx / block / time, cooldown clock, hedges in flight,
+                     readiness, newest block
+  ring    ROW_DTYPE[2 * capacity]: the columns of swap_ring.SwapRing, with
+                     pool and sender as checksummed address strings instead
+                     of ids into a per-process table
+
+State is a seqlock: the writer makes the counter odd, writes, makes it even;
+a reader copies the record and retries if the counter was odd or moved.
+
+Ring rows are double-mapped like SwapRing (row i at slot i % capacity and
+slot i % capacity + capacity), so any window is one contiguous slice, and
+are published by the row counter, which the writer advances only after the
+row is written. Readers see at most capacity - 1 rows: the slot of the
+oldest one is where the writer's next row goes. A reader takes views, works
+on them, then checks the writer hasn't come round to the oldest row it
+looked at (`read()` retries if so).
+This relies on stores becoming visible in program order, as on x86-64.
+"""
+
+import os
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from swap_ring import FLAG_NO_TX, FLAG_OVERFLOW, FLAG_ZERO_TO_ONE, I64_MAX, I64_MIN, U64_MAX
+
+MAGIC = 0x5357415053484D31  # "SWAPSHM1"
+VERSION = 1
+H_MAGIC, H_VERSION, H_CAPACITY, H_COUNT, H_SEQ, H_PID = range(6)
+HEADER_BYTES = 64
+
+STATE_DTYPE = np.dtype([
+    ("U_usdc", "f8"),
+    ("P_purr", "f8"),
+    ("q_usdc_per_purr", "f8"),
+    ("ratio", "f8"),  # NaN = none
+    ("d_usdc", "f8"),
+    ("inventoryBlock", "i8"),
+    ("inventoryMs", "i8"),  # 0 = no inventory yet
+    ("lastHedgeMs", "i8"),
+    ("openHedges", "i8"),
+    ("cursorBlock", "i8"),
+    ("ready", "i8"),
+    ("writtenMs", "i8"),
+    ("inventoryTx", "S66"),
+])
+
+ROW_DTYPE = np.dtype([
+    ("id", "i8"),
+    ("ts_ms", "i8"),
+    ("block", "i8"),
+    ("usdc_delta", "i8"),
+    ("amount_in", "u8"),
+    ("fee", "u8"),
+    ("amount_out", "u8"),
+    ("log_index", "u4"),
+    ("flags", "u1"),
+    ("tx", "S32"),
+    ("pool", "S42"),
+    ("sender", "S42"),
+])
+
+def _align(n: int) -> int:
+    return (n + 63) // 64 * 64
+
+def _size(capacity: int) -> int:
+    return HEADER_BYTES + _align(STATE_DTYPE.itemsize) + 2 * capacity * ROW_DTYPE.itemsize
+
+class SegmentBusy(RuntimeError):
+    pass
+
+class SharedState:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.name = shm.name
+        self.owner = owner
+        buf = shm.buf
+        self.hdr = np.ndarray((8,), dtype=np.int64, buffer=buf)
+        if self.hdr[H_MAGIC] != MAGIC or self.hdr[H_VERSION] != VERSION:
+            raise ValueError(f"shared memory segment {shm.name!r} has another layout")
+        self.capacity = int(self.hdr[H_CAPACITY])
+        self._state = np.ndarray((1,), dtype=STATE_DTYPE, buffer=buf, offset=HEADER_BYTES)
+        self.rows = np.ndarray((2 * self.capacity,), dtype=ROW_DTYPE, buffer=buf,
+                               offset=HEADER_BYTES + _align(STATE_DTYPE.itemsize))
+        self.retries = 0
+
+    @classmethod
+    def create(cls, name: str, capacity: int) -> "SharedState":
+        """The one writer. Takes over a segment left by a dead writer; refuses one whose writer is alive."""
+        try:
+            old = cls.attach(name)
+        except (FileNotFoundError, ValueError):
+            old = None
+        if old is not None:
+            pid = int(old.hdr[H_PID])
+            old.close()
+            if pid and pid != os.getpid() and _alive(pid):
+                raise SegmentBusy(f"shared memory segment {name!r} is written by pid {pid}")
+        try:
+            shared_memory.SharedMemory(name=name).unlink()
+        except FileNotFoundError:
+            pass
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_size(capacity))
+        hdr = np.ndarray((8,), dtype=np.int64, buffer=shm.buf)
+        hdr[:] = 0
+        hdr[H_CAPACITY] = capacity
+        hdr[H_PID] = os.getpid()
+        hdr[H_VERSION] = VERSION
+        hdr[H_MAGIC] = MAGIC  # last: a reader attaching meanwhile sees "another layout" and retries
+        del hdr
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedState":
+        """A reader; FileNotFoundError until the writer has created the segment."""
+        shm = shared_memory.SharedMemory(name=name)
+        # attaching registers the segment with this process's resource tracker, which would
+        # unlink it when a reader exits; only the writer owns it
+        resource_tracker.unregister(shm._name, "shared_memory")
+        try:
+            return cls(shm, owner=False)
+        except ValueError:
+            shm.close()
+            raise
+
+    def close(self) -> None:
+        # numpy views hold exported pointers into the mapping; drop them first
+        del self.hdr, self._state, self.rows
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    # -----------------------------
+    # Writer
+    # -----------------------------
+    def append(self, ev: Dict[str, Any]) -> None:
+        count = int(self.hdr[H_COUNT])
+        slot = count % self.capacity
+        flags = FLAG_ZERO_TO_ONE if ev.get("isZeroToOne") else 0
+        amounts = {}
+        for col, key in (("amount_in", "amountIn"), ("fee", "fee"), ("amount_out", "amountOut")):
+            v = int(ev.get(key, 0))
+            amounts[col] = v if 0 <= v <= U64_MAX else 0
+            if amounts[col] != v:
+                flags |= FLAG_OVERFLOW  # the value is only in the event store
+        delta = int(ev.get("usdcDelta", 0))
+        if not I64_MIN <= delta <= I64_MAX:
+            flags |= FLAG_OVERFLOW
+            delta = 0
+        tx = ev.get("txHash")
+        if not tx:
+            flags |= FLAG_NO_TX
+        row = (
+            int(ev["id"]),
+            int(ev.get("tsMs", 0)),
+            int(ev.get("blockNumber", 0)),
+            delta,
+            amounts["amount_in"],
+            amounts["fee"],
+            amounts["amount_out"],
+            int(ev.get("logIndex", 0)),
+            flags,
+            bytes.fromhex(tx[2:] if tx.startswith("0x") else tx) if tx else b"",
+            ev["pool"].encode(),
+            ev["sender"].encode(),
+        )
+        self.rows[slot] = row
+        self.rows[slot + self.capacity] = row
+        self.hdr[H_COUNT] = count + 1  # publishes the row
+
+    def publish(self, **fields: Any) -> None:
+        """Seqlock write of the state record; fields not given keep their value."""
+        self.hdr[H_SEQ] += 1
+        for k, v in fields.items():
+            self._state[k] = v
+        self.hdr[H_SEQ] += 1
+
+    # -----------------------------
+    # Readers
+    # -----------------------------
+    def state(self, attempts: int = 100_000) -> Dict[str, Any]:
+        for _ in range(attempts):
+            s1 = int(self.hdr[H_SEQ])
+            if s1 & 1:
+                continue
+            rec = self._state.copy()[0]
+            if int(self.hdr[H_SEQ]) == s1:
+                break
+            self.retries += 1
+        else:
+            raise RuntimeError(f"shared state {self.name!r} stayed mid-write (writer died in publish?)")
+        out = {name: rec[name].item() for name in STATE_DTYPE.names}
+        out["inventoryTx"] = out["inventoryTx"].decode() or None
+        if out["ratio"] != out["ratio"]:
+            out["ratio"] = None
+        out["ready"] = bool(out["ready"])
+        return out
+
+    def inventory(self) -> Optional[Dict[str, Any]]:
+        """The state in the shape of the server's `inventory` dict, or None before the first decision."""
+        st = self.state()
+        if not st["inventoryMs"]:
+            return None
+        return {
+            "U_usdc": st["U_usdc"],
+            "P_purr": st["P_purr"],
+            "q_usdc_per_purr": st["q_usdc_per_purr"],
+            "ratio": st["ratio"],
+            "d_usdc": st["d_usdc"],
+            "txHash": st["inventoryTx"],
+            "blockNumber": st["inventoryBlock"],
+            "tsMs": st["inventoryMs"],
+        }
+
+    @property
+    def count(self) -> int:
+        return int(self.hdr[H_COUNT])
+
+    def _live(self, count: int) -> int:
+        return min(count, self.capacity - 1)
+
+    def __len__(self) -> int:
+        return self._live(self.count)
+
+    def read(self, fn: Callable[[], Any], attempts: int = 8) -> Any:
+        """
+        fn() over views of the ring, retried while the writer overwrote rows
+        it may have looked at (anything older than one lap before now).
+        """
+        for _ in range(attempts):
+            start = self.count
+            out = fn()
+            # fn saw rows published by `start`, the oldest being start - live; the writer
+            # is at most one row into `count`, which overwrites it once it reaches oldest + capacity
+            if self.count < start - self._live(start) + self.capacity:
+                return out
+            self.retries += 1
+        raise RuntimeError("shared ring reader kept being lapped by the writer")
+
+    def columns(self, start: int = 0, stop: Optional[int] = None, count: Optional[int] = None) -> Dict[str, np.ndarray]:
+        count = self.count if count is None else count
+        n = self._live(count)
+        stop = n if stop is None else min(stop, n)
+        base = (count - n) % self.capacity
+        rows = self.rows[base + max(0, start):base + stop]
+        return {name: rows[name] for name in ROW_DTYPE.names}
+
+    def window(self, last: Optional[int] = None) -> Dict[str, np.ndarray]:
+        count = self.count
+        n = self._live(count)
+        last = n if last is None else min(last, n)
+        return self.columns(n - last, n, count)
+
+    def to_dicts(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        return self.read(lambda: self._dicts(self.columns(start, stop)))
+
+    @staticmethod
+    def _dicts(c: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for i, row_id in enumerate(c["id"].tolist()):
+            flags = int(c["flags"][i])
+            out.append({
+                "pool": c["pool"][i].decode(),
+                "sender": c["sender"][i].decode(),
+                "isZeroToOne": bool(flags & FLAG_ZERO_TO_ONE),
+                "amountIn": int(c["amount_in"][i]),
+                "fee": int(c["fee"][i]),
+                "amountOut": int(c["amount_out"][i]),
+                "usdcDelta": int(c["usdc_delta"][i]),
+                "txHash": None if flags & FLAG_NO_TX else "0x" + c["tx"][i].ljust(32, b"\0").hex(),
+                "blockNumber": int(c["block"][i]),
+                "logIndex": int(c["log_index"][i]),
+                "tsMs": int(c["ts_ms"][i]),
+                "id": row_id,
+            })
+        return out
+
+    def page(self, limit: int, cursor: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """SwapRing.page; also None when a row on the page has an amount only the event store holds."""
+        def _page() -> Optional[List[Dict[str, Any]]]:
+            count = self.count
+            ids = self.columns(count=count)["id"]
+            end = len(ids) if cursor is None else int(np.searchsorted(ids, cursor, side="left"))
+            if end < limit:
+                return None
+            c = self.columns(end - limit, end, count)
+            if (c["flags"] & FLAG_OVERFLOW).any():
+                return None
+            return self._dicts(c)
+        return self.read(_page)
+
+    @property
+    def writer(self) -> int:
+        """Pid of the process that created the segment: a restarted writer makes a new one under the same name"""
+        return int(self.hdr[H_PID])
+
+    def nbytes(self) -> int:
+        return self.shm.size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "writer": self.owner,
+            "writerPid": self.writer,
+            "capacity": self.capacity,
+            "rows": len(self),
+            "count": self.count,
+            "bytes": self.shm.size,
+            "retries": self.retries,
+        }
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
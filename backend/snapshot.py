@@ -0,0 +1,86 @@
+"""
+Warm-restart state snapshots.
+
+A snapshot is two files in one directory:
+
+  ring.npy    the swap ring's live window as one structured array
+              (SwapRing.export), in .npy format so it opens with
+              mmap_mode="r" and is copied straight into the ring's columns
+  state.json  everything else the decision path carries between swaps:
+              block cursor and recently seen logs, inventory, cooldown
+              clock, hedges in flight, paper balances, plus the ring's
+              address table and overflow amounts
+
+Each file is written to a temp name, fsynced and renamed (and the directory
+fsynced), ring first. state.json
+records the newest ring row id it was written with; after a crash between
+the two renames the ring doesn't match, and only state.json is restored.
+"""
+
+import os
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from swap_ring import ROW_DTYPE
+
+VERSION = 1
+RING_FILE = "ring.npy"
+STATE_FILE = "state.json"
+
+def _replace(path: str, write) -> int:
+    # data on disk before the rename, and the rename on disk before the next file's
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        size = f.tell()
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return size
+
+def save(state_dir: str, rows: np.ndarray, state: Dict[str, Any]) -> int:
+    """Blocking; returns bytes written. `state` must be JSON-serializable."""
+    os.makedirs(state_dir, exist_ok=True)
+    size = _replace(os.path.join(state_dir, RING_FILE), lambda f: np.save(f, rows, allow_pickle=False))
+    body = {
+        **state,
+        "version": VERSION,
+        "savedMs": int(time.time() * 1000),
+        "ringRows": len(rows),
+        "ringLastId": int(rows["id"][-1]) if len(rows) else None,
+    }
+    data = json.dumps(body, separators=(",", ":"), default=str).encode()
+    size += _replace(os.path.join(state_dir, STATE_FILE), lambda f: f.write(data))
+    return size
+
+def load_state(state_dir: str) -> Optional[Dict[str, Any]]:
+    """state.json alone (what a standby follows), or None."""
+    try:
+        with open(os.path.join(state_dir, STATE_FILE), "rb") as f:
+            state = json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == VERSION else None
+
+def load(state_dir: str) -> Optional[Tuple[Dict[str, Any], Optional[np.ndarray]]]:
+    """(state, ring rows mmap'd read-only or None), or None if there's no usable snapshot."""
+    state = load_state(state_dir)
+    if state is None:
+        return None
+
+    try:
+        rows = np.load(os.path.join(state_dir, RING_FILE), mmap_mode="r", allow_pickle=False)
+    except (OSError, ValueError):
+        return state, None
+    last_id = int(rows["id"][-1]) if len(rows) else None
+    if rows.dtype != ROW_DTYPE or len(rows) != state.get("ringRows") or last_id != state.get("ringLastId"):
+        return state, None
+    return state, rows
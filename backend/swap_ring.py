@@ -0,0 +1,253 @@
+"""
+Columnar ring buffer for recent decoded swaps.
+
+Each swap is ~100 bytes across fixed-width NumPy columns instead of a ~1 KB
+dict: amounts, flags, block numbers and timestamps as integers, pool and
+sender as ids into an interned address table, tx hashes as raw 32 bytes.
+The address table is rebuilt each time the ring wraps, keeping only the
+addresses live rows still refer to, so it is bounded by the capacity.
+
+Every column is allocated twice the capacity and each row is written to
+slot i and slot i + capacity. Any window of the last n <= capacity rows is
+then one contiguous slice, so `window()` / `columns()` hand out zero-copy
+views whatever the wrap position. Append and eviction are O(1): the oldest
+row is simply overwritten.
+
+Values that don't fit their column (uint256 amounts above 2**64) are kept
+in a small side table keyed by row id and flagged.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+FLAG_ZERO_TO_ONE = 1 << 0
+FLAG_OVERFLOW = 1 << 1
+FLAG_NO_TX = 1 << 2
+
+U64_MAX = 2**64 - 1
+I64_MIN, I64_MAX = -(2**63), 2**63 - 1
+
+COLUMNS = {
+    "id": np.int64,
+    "ts_ms": np.int64,
+    "block": np.int64,
+    "log_index": np.uint32,
+    "amount_in": np.uint64,
+    "fee": np.uint64,
+    "amount_out": np.uint64,
+    "usdc_delta": np.int64,
+    "pool": np.uint32,
+    "sender": np.uint32,
+    "flags": np.uint8,
+}
+# one row of export() / restore()
+ROW_DTYPE = np.dtype([(name, dt) for name, dt in COLUMNS.items()] + [("tx", "S32")])
+
+class AddressTable:
+    """Interns checksummed address strings to dense uint32 ids."""
+    def __init__(self, values: Iterable[str] = ()) -> None:
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+        for addr in values:
+            self.intern(addr)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def intern(self, addr: str) -> int:
+        i = self.ids.get(addr)
+        if i is None:
+            i = len(self.values)
+            self.ids[addr] = i
+            self.values.append(addr)
+        return i
+
+    def __getitem__(self, i: int) -> str:
+        return self.values[i]
+
+class SwapRing:
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.count = 0  # total rows ever appended
+        self.addresses = AddressTable()
+        self.cols: Dict[str, np.ndarray] = {name: np.zeros(2 * capacity, dtype=dt) for name, dt in COLUMNS.items()}
+        self.tx = np.zeros(2 * capacity, dtype="S32")
+        self.overflow: Dict[int, Dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def append(self, ev: Dict[str, Any]) -> None:
+        slot = self.count % self.capacity
+        if slot == 0 and self.count >= self.capacity:
+            self._compact_addresses()
+        if self.count >= self.capacity:
+            evicted = int(self.cols["id"][slot])
+            if self.cols["flags"][slot] & FLAG_OVERFLOW:
+                self.overflow.pop(evicted, None)
+
+        flags = FLAG_ZERO_TO_ONE if ev.get("isZeroToOne") else 0
+        big: Dict[str, int] = {}
+        amounts = {}
+        for col, key in (("amount_in", "amountIn"), ("fee", "fee"), ("amount_out", "amountOut")):
+            v = int(ev.get(key, 0))
+            if 0 <= v <= U64_MAX:
+                amounts[col] = v
+            else:
+                amounts[col] = 0
+                big[key] = v
+        delta = int(ev.get("usdcDelta", 0))
+        if not I64_MIN <= delta <= I64_MAX:
+            big["usdcDelta"] = delta
+            delta = 0
+        if big:
+            flags |= FLAG_OVERFLOW
+            self.overflow[int(ev["id"])] = big
+
+        tx = ev.get("txHash")
+        if tx:
+            tx_bytes = bytes.fromhex(tx[2:] if tx.startswith("0x") else tx)
+        else:
+            tx_bytes = b""
+            flags |= FLAG_NO_TX
+
+        row = {
+            "id": int(ev["id"]),
+            "ts_ms": int(ev.get("tsMs", 0)),
+            "block": int(ev.get("blockNumber", 0)),
+            "log_index": int(ev.get("logIndex", 0)),
+            "usdc_delta": delta,
+            "pool": self.addresses.intern(ev["pool"]),
+            "sender": self.addresses.intern(ev["sender"]),
+            "flags": flags,
+            **amounts,
+        }
+        for slot_i in (slot, slot + self.capacity):
+            for name, v in row.items():
+                self.cols[name][slot_i] = v
+            self.tx[slot_i] = tx_bytes
+
+        self.count += 1
+
+    def _compact_addresses(self) -> None:
+        """Drops addresses no live row refers to any more and renumbers the pool/sender ids. Once per wrap."""
+        c = self.columns(1)  # the oldest row is about to be overwritten
+        used = np.zeros(len(self.addresses), dtype=bool)
+        used[c["pool"]] = True
+        used[c["sender"]] = True
+        keep = np.flatnonzero(used)
+        if len(keep) == len(self.addresses):
+            return
+        remap = np.zeros(len(self.addresses), dtype=np.uint32)
+        remap[keep] = np.arange(len(keep), dtype=np.uint32)
+        self.addresses = AddressTable(self.addresses[i] for i in keep.tolist())
+        for name in ("pool", "sender"):
+            self.cols[name][:] = remap[self.cols[name]]
+
+    # -----------------------------
+    # Zero-copy reads
+    # -----------------------------
+    def _bounds(self, start: int, stop: int) -> slice:
+        # start/stop are offsets into the live window (0 = oldest)
+        base = (self.count - len(self)) % self.capacity
+        return slice(base + start, base + stop)
+
+    def columns(self, start: int = 0, stop: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Views (not copies) of every column for live rows [start, stop)."""
+        n = len(self)
+        stop = n if stop is None else min(stop, n)
+        sl = self._bounds(max(0, start), stop)
+        out = {name: arr[sl] for name, arr in self.cols.items()}
+        out["tx"] = self.tx[sl]
+        return out
+
+    def window(self, last: Optional[int] = None) -> Dict[str, np.ndarray]:
+        n = len(self)
+        last = n if last is None else min(last, n)
+        return self.columns(n - last, n)
+
+    def read(self, fn: Callable[[], Any]) -> Any:
+        """fn() over this ring's views. In-process they can't move underneath (callers hold state_lock); see shm_state."""
+        return fn()
+
+    # -----------------------------
+    # /events
+    # -----------------------------
+    def to_dicts(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        c = self.columns(start, stop)
+        addr = self.addresses
+        out: List[Dict[str, Any]] = []
+        for i, row_id in enumerate(c["id"].tolist()):
+            flags = int(c["flags"][i])
+            ev = {
+                "pool": addr[int(c["pool"][i])],
+                "sender": addr[int(c["sender"][i])],
+                "isZeroToOne": bool(flags & FLAG_ZERO_TO_ONE),
+                "amountIn": int(c["amount_in"][i]),
+                "fee": int(c["fee"][i]),
+                "amountOut": int(c["amount_out"][i]),
+                "usdcDelta": int(c["usdc_delta"][i]),
+                "txHash": None if flags & FLAG_NO_TX else "0x" + c["tx"][i].ljust(32, b"\0").hex(),
+                "blockNumber": int(c["block"][i]),
+                "logIndex": int(c["log_index"][i]),
+                "tsMs": int(c["ts_ms"][i]),
+                "id": row_id,
+            }
+            if flags & FLAG_OVERFLOW:
+                ev.update(self.overflow.get(row_id, {}))
+            out.append(ev)
+        return out
+
+    def page(self, limit: int, cursor: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        The newest `limit` rows with id < cursor, oldest first, or None if
+        the ring doesn't hold enough rows to answer without the store.
+        """
+        n = len(self)
+        end = n
+        if cursor is not None:
+            end = int(np.searchsorted(self.columns()["id"], cursor, side="left"))
+        if end < limit:
+            return None
+        return self.to_dicts(end - limit, end)
+
+    # -----------------------------
+    # Snapshots
+    # -----------------------------
+    def export(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Live rows [start, stop) (default the whole window), oldest first, as one structured array (a copy)."""
+        c = self.columns(start, stop)
+        out = np.empty(len(c["id"]), dtype=ROW_DTYPE)
+        for name in ROW_DTYPE.names:
+            out[name] = c[name]
+        return out
+
+    def restore(self, rows: np.ndarray, addresses: List[str], overflow: Dict[int, Dict[str, int]]) -> None:
+        """
+        Replace the contents with `rows` from export() (an mmap'd array is
+        fine: it's copied in). `addresses` is the exporting ring's address
+        table, which the pool/sender ids in `rows` refer to.
+        """
+        rows = rows[-self.capacity:]
+        n = len(rows)
+        self.addresses = AddressTable(addresses)
+        for name in COLUMNS:
+            col = self.cols[name]
+            col[:] = 0
+            col[:n] = rows[name]
+            col[self.capacity:self.capacity + n] = rows[name]
+        self.tx[:] = b""
+        self.tx[:n] = rows["tx"]
+        self.tx[self.capacity:self.capacity + n] = rows["tx"]
+        live = set(rows["id"].tolist())
+        self.overflow = {i: big for i, big in overflow.items() if i in live}
+        self.count = n
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.cols.values()) + self.tx.nbytes
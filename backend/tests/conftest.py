@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# backend modules import each other as siblings (python backend/server.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """backend/server.py, importable without upstreams (env as in loadgen.py); module state is patched per test."""
+    for key, value in {
+        "ALCHEMY_WS_URL": "ws://127.0.0.1:9/ws",
+        "EVM_RPC_HTTP_URL": "http://127.0.0.1:9/rpc",
+        "STRATEGIST_EVM_PRIVATE_KEY": "0x" + "11" * 32,
+        "SOVEREIGN_VAULT": "0x000000000000000000000000000000000000bEEF",
+        "USDC_ADDRESS": "0x00000000000000000000000000000000000000a1",
+        "PURR_ADDRESS": "0x00000000000000000000000000000000000000a2",
+        "WATCH_POOL": "0x000000000000000000000000000000000000dEaD",
+        "PAPER_TRADING": "true",
+        "DEBUG": "false",
+    }.items():
+        monkeypatch.setenv(key, value)
+    import server
+    monkeypatch.setattr(server, "SHUTDOWN_HEDGE_WAIT_S", 0.1)
+    monkeypatch.setattr(server, "purr_sz_decimals", 2)
+    monkeypatch.setattr(server, "open_hedges", {})
+    monkeypatch.setattr(server, "role", dict(server.role))
+    return server
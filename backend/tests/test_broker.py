@@ -0,0 +1,37 @@
+import asyncio
+
+from broker import BrokerClient, BrokerServer
+from fanout import FanoutHub
+
+def test_failed_sync_drops_only_that_worker(tmp_path):
+    path = str(tmp_path / "broker.sock")
+
+    async def run() -> None:
+        hub = FanoutHub()
+        calls = []
+
+        def sync():
+            calls.append(hub.seq)
+            if len(calls) == 1:
+                raise RuntimeError("ring not ready")
+            return lambda: {"type": "sync", "seq": hub.seq, "stream": hub.stream, "data": {}}
+        server = BrokerServer(path, hub, sync, lambda: {"type": "state", "data": {}})
+        await server.start()
+        received = []
+        client = BrokerClient(path, lambda msg, text: received.append(msg), retry_s=0.01)
+        task = asyncio.create_task(client.run())
+        try:
+            while not client.synced:
+                await asyncio.sleep(0.01)
+            hub.publish({"type": "swap", "data": {"pool": "0xa"}})
+            while len(received) < 2:
+                await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+            await server.stop()
+
+        assert server.stats()["syncFailures"] == 1
+        assert "ring not ready" in server.stats()["lastError"]
+        assert [m["type"] for m in received] == ["sync", "swap"]
+        assert client.connects == 2  # the first connection was closed, the retry synced
+    asyncio.run(run())
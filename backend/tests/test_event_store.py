@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from event_store import EventStore
+
+def test_block_range_with_backfilled_blocks_out_of_order(tmp_path):
+    store = EventStore(str(tmp_path / "events.db"))
+    # live swaps, then a reconnect backfills the blocks it missed
+    for block in (100, 105, 110, 101, 102, 103):
+        store.append("swap", {"blockNumber": block, "sender": "0xa", "isZeroToOne": True}, ts_ms=block)
+    store.close()
+
+    reader = EventStore(str(tmp_path / "events.db"), readonly=True)
+    assert [ev["blockNumber"] for ev in reader.query(from_block=101, to_block=104)] == [101, 102, 103]
+    assert [ev["blockNumber"] for ev in reader.query(from_block=105)] == [105, 110]
+    # the oldest row at or above block 102 isn't the oldest id at or above it
+    assert [ev["blockNumber"] for ev in reader.query(from_block=102)] == [105, 110, 102, 103]
+    assert [ev["blockNumber"] for ev in reader.query(to_block=102)] == [100, 101, 102]
+    assert [ev["blockNumber"] for ev in reader.query(to_block=101)] == [100, 101]
+    # pages are still newest-id first, oldest first within a page
+    page = reader.query(from_block=100, limit=2)
+    assert [ev["id"] for ev in page] == [5, 6]
+    assert [ev["blockNumber"] for ev in reader.query(from_block=100, cursor=page[0]["id"])] == [100, 105, 110, 101]
+
+def test_failed_write_drops_only_the_bad_row_and_the_writer_survives(tmp_path):
+    store = EventStore(str(tmp_path / "events.db"))
+    store.append("swap", {"blockNumber": 1}, ts_ms=1)
+    store.append("swap", {"blockNumber": {"not": "a number"}}, ts_ms=2)  # sqlite can't bind it
+    store.append("swap", {"blockNumber": 3}, ts_ms=3)
+    while store.pending():
+        time.sleep(0.01)
+    store.append("swap", {"blockNumber": 4}, ts_ms=4)
+    store.close()
+
+    assert store.rows_dropped == 1
+    assert "binding parameter" in store.stats()["lastError"]
+    reader = EventStore(str(tmp_path / "events.db"), readonly=True)
+    assert [ev["blockNumber"] for ev in reader.query()] == [1, 3, 4]
+
+def test_append_without_a_writer_raises(tmp_path):
+    store = EventStore(str(tmp_path / "events.db"))
+    store.close()
+    with pytest.raises(RuntimeError):
+        store.append("swap", {"blockNumber": 1}, ts_ms=1)
@@ -0,0 +1,225 @@
+import asyncio
+import json
+from typing import Any, Callable, List
+
+import pytest
+
+from fanout import FanoutHub
+
+POOL = "0x000000000000000000000000000000000000dEaD"
+
+class _Socket:
+    """Stands in for a /ws client socket; records what was written."""
+    def __init__(self) -> None:
+        self.sent: List[Any] = []
+        self.closed_with = None
+
+    async def send_text(self, payload: str) -> None:
+        self.sent.append(payload)
+
+    async def send_bytes(self, payload: bytes) -> None:
+        self.sent.append(payload)
+
+    async def close(self, code: int) -> None:
+        self.closed_with = code
+
+def _run(fn: Callable[[], Any]) -> Any:
+    # subscribers start a writer task, so hubs are used inside a running loop; nothing is written until
+    # the test awaits, which keeps queue contents deterministic
+    async def main() -> Any:
+        return fn()
+    return asyncio.run(main())
+
+def _swap(pool: str = POOL) -> dict:
+    return {"type": "swap", "data": {"pool": pool}}
+
+def test_pool_topics_match_whatever_the_address_case():
+    def check() -> None:
+        hub = FanoutHub()
+        sub = hub.register(_Socket())
+        sub.subscribe([f"pool:{POOL}"], sample={f"pool:{POOL}": 0.5})
+        assert sub.topics == {f"pool:{POOL.lower()}": 0.5}
+        assert [sub.wants([f"pool:{POOL.lower()}"]) for _ in range(4)] == [False, True, False, True]
+
+        sub.unsubscribe([f"pool:{POOL}"])
+        assert sub.topics == {}
+        assert not sub.wants([f"pool:{POOL.lower()}"])
+    _run(check)
+
+def _queued(sub) -> list:
+    return [payload for _, payload, _ in sub.queue]
+
+def test_drop_oldest_makes_room_for_the_newest():
+    def check() -> None:
+        hub = FanoutHub(queue_size=2, policy="drop_oldest")
+        sub = hub.register(_Socket())
+        for payload in ("a", "b", "c"):
+            sub.offer(payload)
+        assert _queued(sub) == ["b", "c"]
+        assert sub.dropped == 1
+    _run(check)
+
+def test_skip_debug_drops_debug_messages_first():
+    def check() -> None:
+        hub = FanoutHub(queue_size=2, policy="skip_debug")
+        sub = hub.register(_Socket())
+        sub.offer("a")
+        sub.offer("dbg", is_debug=True)
+        sub.offer("dbg2", is_debug=True)  # the incoming debug message goes
+        assert _queued(sub) == ["a", "dbg"]
+        sub.offer("b")  # the queued one makes room
+        assert _queued(sub) == ["a", "b"]
+        sub.offer("c")  # nothing left to skip: the oldest goes
+        assert _queued(sub) == ["b", "c"]
+        assert sub.dropped == 3
+    _run(check)
+
+def test_disconnect_closes_a_slow_client_and_spares_the_rest():
+    async def check() -> None:
+        hub = FanoutHub(queue_size=2, policy="disconnect")
+        slow, fast = _Socket(), _Socket()
+        sub = hub.register(slow)
+        hub.register(fast)
+        for payload in ("a", "b", "c"):
+            sub.offer(payload)
+        assert sub.closed and len(hub) == 1 and hub.disconnected_slow == 1
+        sub.offer("d")  # ignored once closed
+
+        hub.publish(_swap())
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert slow.closed_with == 1013 and slow.sent == []
+        assert len(fast.sent) == 1
+    asyncio.run(check())
+
+def test_writer_drains_the_queue_in_order():
+    async def check() -> None:
+        hub = FanoutHub()
+        ws = _Socket()
+        sub = hub.register(ws)
+        for i in range(3):
+            hub.publish({"type": "rebalance", "data": {"i": i}})
+        await asyncio.sleep(0)
+        assert [json.loads(p)["data"]["i"] for p in ws.sent] == [0, 1, 2]
+        assert sub.sent == 3 and not sub.queue
+    asyncio.run(check())
+
+def test_wants_matches_families_and_wildcards():
+    def check() -> None:
+        hub = FanoutHub()
+        sub = hub.register(_Socket())
+        assert sub.wants(["debug:ws"])  # everything until the first subscribe
+
+        sub.subscribe(["pool:*", "debug"])
+        assert sub.wants(["swap", f"pool:{POOL.lower()}"])
+        assert sub.wants(["debug:hedge"])
+        assert not sub.wants(["rebalance"])
+
+        sub.unsubscribe(["pool:*", "debug"])
+        sub.subscribe(["*"])
+        assert sub.wants(["rebalance"])
+        assert sub.filtered == 1
+    _run(check)
+
+def test_sampling_is_deterministic_and_per_pattern():
+    def check() -> None:
+        hub = FanoutHub()
+        sub = hub.register(_Socket())
+        sub.subscribe(["swap", "debug:*"], sample={"swap": 0.25, "debug:*": 0.5})
+        assert [sub.wants(["swap"]) for _ in range(8)] == [False, False, False, True] * 2
+        assert [sub.wants(["debug:x"]) for _ in range(4)] == [False, True, False, True]
+
+        sub.subscribe(["rebalance"], sample={"rebalance": 7})  # clamped to every message
+        assert sub.topics["rebalance"] == 1.0
+    _run(check)
+
+def test_publish_only_reaches_clients_that_want_it():
+    def check() -> None:
+        hub = FanoutHub()
+        swaps, rebalances = hub.register(_Socket()), hub.register(_Socket())
+        swaps.subscribe([f"pool:{POOL}"])
+        rebalances.subscribe(["rebalance"])
+        hub.publish(_swap())
+        hub.publish(_swap("0x000000000000000000000000000000000000bEEF"))
+        hub.publish({"type": "rebalance_result", "data": {}})
+        assert len(swaps.queue) == 1 and len(rebalances.queue) == 1
+    _run(check)
+
+def test_bad_subscriptions_change_nothing():
+    def check() -> None:
+        hub = FanoutHub()
+        sub = hub.register(_Socket())
+        sub.subscribe(["swap"])
+        for topics, sample in ((f"pool:{POOL}", None), (["swap"], {"swap": True}), (["rebalance"], [0.5])):
+            with pytest.raises(ValueError):
+                sub.subscribe(topics, sample)
+        assert sub.topics == {"swap": 1.0}
+    _run(check)
+
+def _seqs(sub) -> list:
+    return [json.loads(payload)["seq"] for payload in _queued(sub)]
+
+def test_resume_replays_what_the_client_missed():
+    def check() -> None:
+        hub = FanoutHub()
+        for _ in range(3):
+            hub.publish(_swap())
+        hub.publish({"type": "debug", "data": {"event": "x"}})  # not sequenced, not replayed
+        hub.publish({"type": "rebalance", "data": {}})
+
+        sub = hub.register(_Socket())
+        assert hub.resume(sub, 1, hub.stream)
+        assert _seqs(sub) == [2, 3, 4]
+
+        picky = hub.register(_Socket())
+        picky.subscribe(["rebalance"])
+        assert hub.resume(picky, 1, hub.stream)
+        assert _seqs(picky) == [4]
+
+        current = hub.register(_Socket())
+        assert hub.resume(current, 4, hub.stream) and not current.queue
+        assert hub.resumed == 3
+    _run(check)
+
+def test_resume_from_another_stream_or_a_future_seq_needs_a_snapshot():
+    def check() -> None:
+        hub = FanoutHub()
+        hub.publish(_swap())
+        sub = hub.register(_Socket())
+        assert not hub.resume(sub, 0, "0123456789abcdef")  # a restarted server
+        assert not hub.resume(sub, 0, None)
+        assert not hub.resume(sub, 2, hub.stream)  # ahead of this stream
+        assert not sub.queue and hub.resumed == 0
+    _run(check)
+
+def test_resume_across_a_gap_in_the_replay_buffer_needs_a_snapshot():
+    def check() -> None:
+        hub = FanoutHub(queue_size=3, replay_size=3)
+        for _ in range(5):
+            hub.publish(_swap())
+        sub = hub.register(_Socket())
+        assert not hub.resume(sub, 1, hub.stream)  # seq 2 has left the buffer
+        assert hub.resume(sub, 2, hub.stream)
+        assert _seqs(sub) == [3, 4, 5]
+
+        # the buffer reaches back, but the gap would not fit in the client's queue
+        hub.queue_size = 2
+        assert not hub.resume(hub.register(_Socket()), 2, hub.stream)
+
+        hub.reset(40, "0123456789abcdef")  # now relaying another process's stream
+        assert not hub.resume(hub.register(_Socket()), 5, "0123456789abcdef")
+        assert hub.resume(hub.register(_Socket()), 40, "0123456789abcdef")
+    _run(check)
+
+def test_relayed_messages_keep_their_seq():
+    def check() -> None:
+        source, relay = FanoutHub(), FanoutHub()
+        relay.reset(source.seq, source.stream)
+        for _ in range(2):
+            msg = _swap()
+            source.publish(msg)
+            relay.relay(msg, json.dumps(msg))
+        sub = relay.register(_Socket())
+        assert relay.resume(sub, 0, source.stream)
+        assert _seqs(sub) == [1, 2]
+    _run(check)
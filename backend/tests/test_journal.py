@@ -0,0 +1,72 @@
+import asyncio
+
+from journal import Journal
+
+SWAP = "0xabc:0"
+
+def _hedge(path: str, done: bool = False) -> int:
+    """Journal one hedge with two child orders, the first acked; optionally finish it. Returns its seq."""
+    async def run() -> int:
+        j = Journal(path)
+        seq = await j.begin(SWAP, {"txHash": "0xabc", "intent": {"usdc": 10.0}, "maxOrders": 3})
+        for k in range(2):
+            await j.write({"t": "order", "seq": seq, "k": k, "cloid": j.cloid(seq, k), "isBuy": True, "sz": 1.0})
+        await j.write({"t": "ack", "seq": seq, "k": 0, "res": {"status": "ok"}})
+        if done:
+            await j.write({"t": "done", "seq": seq, "outcome": "filled"})
+        j.close()
+        return seq
+    return asyncio.run(run())
+
+def test_open_hedge_replays_with_its_cloids(tmp_path):
+    path = str(tmp_path / "hedges.journal")
+    seq = _hedge(path)
+    before = Journal(path)
+    cloids = [before.cloid(seq, k) for k in range(3)]
+    before.close()
+
+    j = Journal(path)
+    try:
+        open_hedges = j.unresolved()
+        assert list(open_hedges) == [seq]
+        assert open_hedges[seq]["intent"]["txHash"] == "0xabc"
+        assert [r["cloid"] for r in open_hedges[seq]["orders"].values()] == cloids[:2]
+        assert list(open_hedges[seq]["acks"]) == [0]
+        # the salt survives a reopen, so every cloid the hedge could have used is derivable again
+        assert [j.cloid(seq, k) for k in range(3)] == cloids
+        assert j.was_hedged(SWAP)
+        assert j.next_seq == seq + 1
+    finally:
+        j.close()
+
+def test_compaction_keeps_open_hedges_only(tmp_path):
+    path = str(tmp_path / "hedges.journal")
+    finished = _hedge(path, done=True)
+    still_open = _hedge(path)
+
+    async def compact() -> None:
+        j = Journal(path)
+        await j.compact()
+        j.close()
+    asyncio.run(compact())
+
+    j = Journal(path)
+    try:
+        assert list(j.unresolved()) == [still_open]
+        assert len(j.unresolved()[still_open]["orders"]) == 2
+        assert j.next_seq > max(finished, still_open)  # seqs, and so cloids, are never reused
+        assert j.was_hedged(SWAP)
+    finally:
+        j.close()
+
+def test_torn_last_line_is_dropped(tmp_path):
+    path = str(tmp_path / "hedges.journal")
+    seq = _hedge(path)
+    with open(path, "ab") as f:
+        f.write(b'{"t":"done","seq":')  # crash mid-write
+
+    j = Journal(path)
+    try:
+        assert list(j.unresolved()) == [seq]
+    finally:
+        j.close()
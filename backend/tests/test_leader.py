@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+from journal import Journal, read_records
+from leader import Lease, LeaseLost
+
+def test_one_holder_and_epoch_bumps_on_takeover(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    a, b = Lease(path, owner="a"), Lease(path, owner="b")
+
+    assert a.try_acquire()
+    assert a.epoch == 1
+    assert not b.try_acquire()
+    a.check()
+
+    a.release()
+    assert b.try_acquire()
+    assert b.epoch == 2
+    assert b.holder()["owner"] == "b"
+    b.release()
+
+def test_stale_epoch_is_fenced(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    a = Lease(path, owner="a")
+    assert a.try_acquire()
+
+    # a newer holder's epoch in the lock file, with `a` none the wiser
+    with open(path, "r+b") as f:
+        f.write(json.dumps({"epoch": a.epoch + 1, "owner": "b"}).encode())
+        f.truncate()
+    assert not a.held()
+    with pytest.raises(LeaseLost):
+        a.check()
+    a.release()
+
+def test_replaced_lock_file_is_fenced(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    a = Lease(path, owner="a")
+    assert a.try_acquire()
+
+    # same epoch, but another inode: a lock nobody holds any more
+    tmp = path + ".new"
+    with open(tmp, "w") as f:
+        json.dump({"epoch": a.epoch, "owner": "a"}, f)
+    os.replace(tmp, path)
+    with pytest.raises(LeaseLost):
+        a.check()
+    a.release()
+
+def test_released_lease_is_fenced(tmp_path):
+    a = Lease(str(tmp_path / "leader.lock"), owner="a")
+    assert a.try_acquire()
+    a.release()
+    with pytest.raises(LeaseLost):
+        a.check()
+
+class _ParkedExchange:
+    """Stands in for hl_exchange: market_open blocks until released, as if HL never answered in time."""
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def spot_user_state(self):
+        return {"balances": [{"coin": "USDC", "total": "1000"}, {"coin": "PURR", "total": "0"}]}
+
+    def market_open(self, name, is_buy, sz, cloid=None):
+        self.entered.set()
+        self.release.wait(10)
+        return {"status": "ok", "response": {"type": "order", "data": {"statuses": [{"filled": {"totalSz": str(sz)}}]}}}
+
+class _Book:
+    def l2_snapshot(self, name):
+        return {"levels": [[{"px": "4.9", "sz": "100", "n": 1}], [{"px": "5.1", "sz": "100", "n": 1}]]}
+
+def test_step_down_keeps_the_journal_for_a_hedge_parked_in_market_open(server, tmp_path, monkeypatch):
+    path = str(tmp_path / "hedges.journal")
+    lease = Lease(str(tmp_path / "leader.lock"), owner="a")
+    assert lease.try_acquire()
+    exchange = _ParkedExchange()
+    monkeypatch.setattr(server, "lease", lease)
+    monkeypatch.setattr(server, "hl_exchange", exchange)
+    monkeypatch.setattr(server, "hl_info", _Book())
+
+    async def run() -> Journal:
+        jr = Journal(path)
+        monkeypatch.setattr(server, "journal", jr)
+        seq = await jr.begin("0xabc:0", {"txHash": "0xabc", "intent": {"usdc": 10.0}, "maxOrders": 3})
+        server.open_hedges[1] = {"txHash": "0xabc", "seq": seq}
+
+        async def hedge() -> None:
+            # on_swap_event's hedge, from the journaled intent to its `done` record
+            try:
+                result = await server.execute_spot_rebalance_by_usdc_notional(10_000_000, True, seq, jr)
+            finally:
+                server.open_hedges.pop(1, None)
+            jr.write_nowait({"t": "done", "seq": seq, "outcome": "filled" if result.get("fills") else "failed"})
+        task = asyncio.create_task(hedge())
+        while not exchange.entered.is_set():
+            await asyncio.sleep(0.01)
+
+        await server.step_down()  # gives up after SHUTDOWN_HEDGE_WAIT_S, the order still in flight
+        assert server.journal is None
+        assert not jr._f.closed
+
+        exchange.release.set()
+        await task
+        while not jr._f.closed:
+            await asyncio.sleep(0.01)
+        return jr
+    asyncio.run(run())
+
+    records = read_records(path)
+    assert [r["t"] for r in records if r.get("seq") == 1] == ["intent", "order", "ack", "done"]
+    assert records[-1]["outcome"] == "filled"
+    j = Journal(path)
+    try:
+        assert j.unresolved() == {}
+    finally:
+        j.close()
@@ -0,0 +1,119 @@
+import pytest
+
+import paper
+from paper import PaperExchange
+
+ASKS = [(5.0, 10.0), (5.1, 10.0), (5.3, 10.0)]
+BIDS = [(4.9, 10.0), (4.8, 10.0)]
+MID = 4.95
+
+class _Info:
+    """Stands in for hl_info: the same L2 book every time, counting how often it was fetched."""
+    def __init__(self) -> None:
+        self.snapshots = 0
+
+    def l2_snapshot(self, name: str) -> dict:
+        self.snapshots += 1
+        return {"levels": [[{"px": str(px), "sz": str(sz), "n": 1} for px, sz in BIDS],
+                           [{"px": str(px), "sz": str(sz), "n": 1} for px, sz in ASKS]]}
+
+class _Clock:
+    """paper.time, with wall time moved by hand"""
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    @staticmethod
+    def perf_counter() -> float:
+        return 0.0
+
+    @staticmethod
+    def sleep(s: float) -> None:
+        pass
+
+@pytest.fixture
+def clock(monkeypatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(paper, "time", clock)
+    return clock
+
+def _exchange(**kwargs) -> PaperExchange:
+    params = {"balances": {"USDC": 1_000.0, "PURR": 100.0}, "latency_ms": 0, "queue_ahead": 0.0,
+              "taker_fee_bps": 0.0, "book_ttl_ms": 500.0, **kwargs}
+    return PaperExchange(_Info(), "PURR/USDC", **params)
+
+def _status(resp: dict) -> dict:
+    return resp["response"]["data"]["statuses"][0]
+
+def test_walks_levels_up_to_the_limit_price(clock):
+    ex = _exchange()
+    # limit mid * 1.05 = 5.1975: the 5.3 level is out of reach, the rest is left unfilled
+    filled = _status(ex.market_open("PURR/USDC", True, 25))["filled"]
+    assert float(filled["totalSz"]) == 20
+    assert float(filled["avgPx"]) == pytest.approx((5.0 * 10 + 5.1 * 10) / 20)
+    assert ex.fills[-1]["levels"] == 2
+    assert ex.fills[-1]["slippage_bps"] == pytest.approx((5.05 - MID) / MID * 10_000)
+
+    sold = _status(ex.market_open("PURR/USDC", False, 15))["filled"]
+    assert float(sold["avgPx"]) == pytest.approx((4.9 * 10 + 4.8 * 5) / 15)
+
+    # an explicit price: limit 4.9 * 1.01 is below the best ask
+    assert "could not immediately match" in _status(ex.market_open("PURR/USDC", True, 1, px=4.9, slippage=0.01))["error"]
+
+def test_own_fills_deplete_the_book_until_it_is_refreshed(clock):
+    ex = _exchange()
+    info = ex.info
+    first = _status(ex.market_open("PURR/USDC", True, 10))["filled"]
+    second = _status(ex.market_open("PURR/USDC", True, 10))["filled"]
+    assert (float(first["avgPx"]), float(second["avgPx"])) == (5.0, 5.1)
+    assert info.snapshots == 1
+
+    clock.now += 0.501  # past book_ttl_ms: a fresh book, nothing consumed
+    third = _status(ex.market_open("PURR/USDC", True, 10))["filled"]
+    assert float(third["avgPx"]) == 5.0
+    assert info.snapshots == 2
+
+def test_queue_ahead_scales_what_each_level_offers(clock):
+    ex = _exchange(queue_ahead=0.4)
+    filled = _status(ex.market_open("PURR/USDC", True, 10))["filled"]
+    assert float(filled["avgPx"]) == pytest.approx((5.0 * 6 + 5.1 * 4) / 10)
+    # 6 of each level are reachable: 2 are left at 5.1, and 5.3 is past the limit
+    assert float(_status(ex.market_open("PURR/USDC", True, 6))["filled"]["totalSz"]) == pytest.approx(2)
+
+def test_taker_fee_is_charged_in_usdc(clock):
+    ex = _exchange(taker_fee_bps=7.0)
+    ex.market_open("PURR/USDC", True, 10)
+    fee = 50.0 * 7 / 10_000
+    assert ex.fills[-1]["fee_usdc"] == pytest.approx(fee)
+    assert ex.balances == pytest.approx({"USDC": 1_000.0 - 50.0 - fee, "PURR": 110.0})
+
+    ex.market_open("PURR/USDC", False, 10)
+    sell_fee = 49.0 * 7 / 10_000
+    assert ex.balances["USDC"] == pytest.approx(1_000.0 - 50.0 - fee + 49.0 - sell_fee)
+    assert ex.summary()["fees_usdc"] == pytest.approx(fee + sell_fee)
+
+def test_insufficient_balance_is_rejected_without_touching_the_book(clock):
+    ex = _exchange(balances={"USDC": 50.0, "PURR": 5.0}, taker_fee_bps=7.0)
+    assert _status(ex.market_open("PURR/USDC", True, 10))["error"] == "Insufficient spot balance"  # 50 + fee
+    assert _status(ex.market_open("PURR/USDC", False, 6))["error"] == "Insufficient spot balance"
+    assert ex.balances == {"USDC": 50.0, "PURR": 5.0} and not ex.fills
+
+    # nothing was consumed by the rejected orders
+    assert float(_status(ex.market_open("PURR/USDC", True, 9))["filled"]["avgPx"]) == 5.0
+
+def test_query_order_by_cloid_reports_filled_and_partial_orders(clock):
+    ex = _exchange()
+    ex.market_open("PURR/USDC", True, 10, cloid="0x01")
+    ex.market_open("PURR/USDC", True, 25, cloid="0x02")  # 10 left at 5.1 in reach
+
+    full = ex.query_order_by_cloid(None, "0x01")["order"]
+    assert full["status"] == "filled"
+    assert full["order"]["side"] == "B" and full["order"]["origSz"] == "10.0"
+
+    partial = ex.query_order_by_cloid(None, "0x02")["order"]
+    assert partial["status"] == "canceled"
+    assert float(partial["order"]["sz"]) == 15
+
+    assert ex.query_order_by_cloid(None, "0x03") == {"status": "unknownOid"}
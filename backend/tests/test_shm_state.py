@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from fanout import FanoutHub
+from shm_state import H_PID, H_SEQ, SharedState
+from swap_ring import SwapRing
+
+POOL = "0x000000000000000000000000000000000000dEaD"
+
+def _swap(i: int) -> dict:
+    return {"id": i, "pool": POOL, "sender": f"0x{i:040x}", "isZeroToOne": True, "amountIn": i, "fee": 0,
+            "amountOut": i, "usdcDelta": -i, "txHash": f"0x{i:064x}", "blockNumber": i, "logIndex": 0, "tsMs": i}
+
+@pytest.fixture
+def segment():
+    """A fresh segment name per test; whatever the test created under it is unlinked after"""
+    name = f"test-shm-{os.getpid()}-{os.urandom(4).hex()}"
+    yield name
+    try:
+        SharedState.attach(name).shm.unlink()
+    except FileNotFoundError:
+        pass
+
+def test_read_retries_when_the_writer_laps_it(segment):
+    writer = SharedState.create(segment, 4)
+    reader = SharedState.attach(segment)
+    for i in range(1, 4):
+        writer.append(_swap(i))
+
+    calls = []
+    def fn():
+        out = reader._dicts(reader.columns())
+        if not calls:
+            for i in range(4, 8):  # a full lap while fn was looking: its rows may be torn
+                writer.append(_swap(i))
+        calls.append(out)
+        return out
+    assert [row["id"] for row in reader.read(fn)] == [5, 6, 7]
+    assert len(calls) == 2 and reader.retries == 1
+
+    def always_lapped():
+        for i in range(4):
+            writer.append(_swap(100 + i))
+    with pytest.raises(RuntimeError, match="lapped"):
+        reader.read(always_lapped, attempts=3)
+    assert reader.retries == 4
+    reader.close()
+    writer.close()
+
+def test_state_reads_are_never_torn(segment):
+    writer = SharedState.create(segment, 4)
+    reader = SharedState.attach(segment)
+    writer.publish(U_usdc=1.0, inventoryMs=5, inventoryTx=b"0xabc")
+    assert reader.inventory()["U_usdc"] == 1.0 and reader.inventory()["txHash"] == "0xabc"
+
+    writer.hdr[H_SEQ] += 1  # the writer died halfway through publish()
+    with pytest.raises(RuntimeError, match="mid-write"):
+        reader.state(attempts=10)
+    reader.close()
+    writer.close()
+
+def _sync(server, segment=None, swaps=()) -> dict:
+    state = server._ingest_state()["data"]
+    return {"type": "sync", "seq": 7, "stream": "0123456789abcdef",
+            "data": {"swaps": [_swap(i) for i in swaps], "state": state, "shm": segment}}
+
+@pytest.fixture
+def worker(server, monkeypatch):
+    """server.py as an API worker that has synced nothing yet"""
+    ring = SwapRing(16)
+    monkeypatch.setattr(server, "shared", None)
+    monkeypatch.setattr(server, "EVENTS", ring)
+    monkeypatch.setattr(server, "local_events", ring)
+    monkeypatch.setattr(server, "hub", FanoutHub())
+    for name in ("inventory", "ingest_state", "startup"):
+        monkeypatch.setattr(server, name, dict(getattr(server, name)))
+    monkeypatch.setattr(server, "CHAIN_ID", server.CHAIN_ID)
+    monkeypatch.setattr(server, "last_hedge_ms", server.last_hedge_ms)
+    yield server
+    server.detach_shared()
+
+def test_worker_maps_whichever_segment_the_sync_names(worker, segment):
+    first = SharedState.create(segment, 8)
+    first.hdr[H_PID] = 1  # stands in for the ingest process that made it
+    first.append(_swap(1))
+    worker.on_broker_message(_sync(worker, {"name": segment, "pid": 1}), "")
+    assert worker.shared is worker.EVENTS and worker.shared.writer == 1
+    assert [s["id"] for s in worker.EVENTS.to_dicts(0, len(worker.EVENTS))] == [1]
+
+    mapped = worker.shared
+    worker.on_broker_message(_sync(worker, {"name": segment, "pid": 1}), "")
+    assert worker.shared is mapped  # the same segment: kept
+
+    # the ingest process restarted: same name, a new segment and writer
+    first.close()
+    second = SharedState.create(segment, 8)
+    for i in (2, 3):
+        second.append(_swap(i))
+    worker.on_broker_message(_sync(worker, {"name": segment, "pid": os.getpid()}), "")
+    assert worker.shared is not mapped and worker.shared.writer == os.getpid()
+    assert [s["id"] for s in worker.EVENTS.to_dicts(0, len(worker.EVENTS))] == [2, 3]
+
+    # a sync whose segment can't be the one named, or none at all: back to the swaps it carries
+    worker.on_broker_message(_sync(worker, {"name": segment, "pid": 1}, swaps=(4,)), "")
+    assert worker.shared is None and worker.EVENTS is worker.local_events
+    worker.on_broker_message(_sync(worker, None, swaps=(5, 6)), "")
+    assert [s["id"] for s in worker.EVENTS.to_dicts(0, len(worker.EVENTS))] == [5, 6]
+    second.close()
@@ -0,0 +1,25 @@
+from swap_ring import SwapRing
+
+POOL = "0x000000000000000000000000000000000000dEaD"
+
+def _swap(i: int) -> dict:
+    return {"id": i, "pool": POOL, "sender": f"0x{i:040x}", "isZeroToOne": True, "amountIn": i, "fee": 0,
+            "amountOut": i, "usdcDelta": -i, "txHash": f"0x{i:064x}", "blockNumber": i, "logIndex": 0, "tsMs": i}
+
+def test_address_table_is_bounded_by_live_rows():
+    ring = SwapRing(4)
+    for i in range(1, 42):
+        ring.append(_swap(i))
+
+    # a distinct sender per swap: only the pool and the senders still in the ring survive the last wrap
+    assert len(ring.addresses) <= 1 + 2 * ring.capacity
+    assert ring.to_dicts(0, len(ring)) == [_swap(i) for i in range(38, 42)]
+
+def test_export_restore_round_trip():
+    ring = SwapRing(8)
+    for i in range(1, 12):
+        ring.append(_swap(i))
+    copy = SwapRing(3)
+    copy.restore(ring.export(2, 7), list(ring.addresses.values), dict(ring.overflow))
+    # only the newest rows that fit, with pool/sender ids resolved through the exporting table
+    assert copy.to_dicts(0, len(copy)) == ring.to_dicts(4, 7)
@@ -0,0 +1,374 @@
+"""
+Structured tracing off the hot path.
+
+`Tracer.event()` is a level check, a sampling check and a `deque.append`
+(atomic under the GIL, no lock, never blocks). Nothing is serialized,
+printed or sent on the calling path. A background drainer task pops the
+ring in batches and:
+  - on the loop, resolves which /ws clients want each record (cheap)
+  - on the `offload` pool (the default executor if none is given),
+    serializes the batch once (per wire encoding in use) and writes the
+    stdout and file sinks
+  - back on the loop, hands the pre-serialized payloads to the hub
+
+If the ring overflows, the oldest records are dropped and counted.
+Level, per-event sampling and sinks can be changed at runtime.
+
+Per-swap latency traces: the listener creates a `SwapTrace` when a log
+arrives and puts it in the `current_swap` context variable; tasks spawned
+from there inherit it, so every `stage()` on the decision and hedge path
+lands in the right trace without passing it around. Finished traces go to
+a bounded `TraceStore` keyed by txHash.
+"""
+
+import sys
+import json
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+import wire
+
+LEVELS = {"debug": 10, "info": 20, "warn": 30, "error": 40, "off": 100}
+DEBUG, INFO, WARN, ERROR = 10, 20, 30, 40
+
+# (ts_ms, event, level, data)
+Record = Tuple[int, str, int, Dict[str, Any]]
+
+class Tracer:
+    def __init__(
+        self,
+        hub: Any = None,
+        level: str = "debug",
+        sample: Optional[Dict[str, float]] = None,
+        stdout: bool = True,
+        file_path: Optional[str] = None,
+        capacity: int = 65536,
+        drain_interval: float = 0.05,
+        stdout_max_chars: int = 3000,
+        offload: Optional[Callable[..., Awaitable[Any]]] = None,
+    ):
+        """`offload(fn, *args)` runs the drainer's serialization and sink writes, e.g. a dedicated pool's `run`."""
+        self.hub = hub
+        self.offload = offload or asyncio.to_thread
+        self.ring: Deque[Record] = deque(maxlen=capacity)
+        self.capacity = capacity
+        self.drain_interval = drain_interval
+        self.stdout_max_chars = stdout_max_chars
+        self.level = LEVELS["debug"]
+        self.sample: Dict[str, float] = {}
+        self._sample_acc: Dict[str, float] = {}
+        self.stdout = stdout
+        self.file_path = file_path
+        self._file: Any = None
+        self.emitted = 0
+        self.sampled_out = 0
+        self.overflowed = 0
+        self.drained = 0
+        self._task: Optional[asyncio.Task] = None
+        self.configure(level=level, sample=sample or {})
+
+    # -----------------------------
+    # Hot path
+    # -----------------------------
+    def enabled(self, level: int = DEBUG) -> bool:
+        return level >= self.level
+
+    def event(self, name: str, data: Dict[str, Any], level: int = DEBUG) -> None:
+        if level < self.level:
+            return
+        if self.sample:
+            rate = self.sample.get(name, self.sample.get("*", 1.0))
+            if rate < 1.0:
+                acc = self._sample_acc.get(name, 0.0) + rate
+                if acc < 1.0:
+                    self._sample_acc[name] = acc
+                    self.sampled_out += 1
+                    return
+                self._sample_acc[name] = acc - 1.0
+        if len(self.ring) >= self.capacity:
+            self.overflowed += 1
+        self.ring.append((time.time_ns() // 1_000_000, name, level, data))
+        self.emitted += 1
+
+    @contextmanager
+    def span(self, name: str, level: int = DEBUG, **data: Any) -> Iterator[Dict[str, Any]]:
+        """Emits `name` with dur_ms when the block exits; the yielded dict can be filled in."""
+        if level < self.level:
+            yield data
+            return
+        t0 = time.perf_counter()
+        try:
+            yield data
+        finally:
+            data["dur_ms"] = (time.perf_counter() - t0) * 1000
+            self.event(name, data, level)
+
+    # -----------------------------
+    # Runtime config
+    # -----------------------------
+    def configure(
+        self,
+        level: Optional[str] = None,
+        sample: Optional[Dict[str, float]] = None,
+        stdout: Optional[bool] = None,
+        file_path: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        if level is not None:
+            if level not in LEVELS:
+                raise ValueError(f"unknown level {level!r}, expected one of {list(LEVELS)}")
+            self.level = LEVELS[level]
+        if sample is not None:
+            self.sample = {k: min(max(float(v), 0.0), 1.0) for k, v in sample.items()}
+            self._sample_acc = {}
+        if stdout is not None:
+            self.stdout = stdout
+        if file_path is not None:
+            # swapped by the drainer thread on its next write
+            self.file_path = file_path or None
+        return self.config()
+
+    def config(self) -> Dict[str, Any]:
+        level = next(k for k, v in LEVELS.items() if v == self.level)
+        return {"level": level, "sample": self.sample, "stdout": self.stdout, "file": self.file_path}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.config(),
+            "buffered": len(self.ring),
+            "capacity": self.capacity,
+            "emitted": self.emitted,
+            "sampled_out": self.sampled_out,
+            "overflowed": self.overflowed,
+            "drained": self.drained,
+        }
+
+    # -----------------------------
+    # Drainer
+    # -----------------------------
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain_loop(), name="trace_drainer")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    async def _drain_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.drain_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[tracing] drain failed: {e}", flush=True)
+
+    async def flush(self) -> None:
+        batch: List[Record] = []
+        ring = self.ring
+        while ring:
+            batch.append(ring.popleft())
+        if not batch:
+            return
+        self.drained += len(batch)
+
+        receivers: List[Any] = []
+        if self.hub is not None:
+            for _, name, _, _ in batch:
+                receivers.append(self.hub.receivers([f"debug:{name}"]))
+
+        encodings = [{sub.encoding for sub in subs} for subs in receivers]
+        payloads = await self.offload(self._serialize_and_sink, batch, encodings)
+
+        for subs, by_encoding in zip(receivers, payloads):
+            if subs:
+                self.hub.deliver(subs, by_encoding, is_debug=True)
+
+    def _serialize_and_sink(self, batch: List[Record], encodings: List[Set[str]]) -> List[Dict[str, Any]]:
+        payloads: List[Dict[str, Any]] = []
+        lines: List[str] = []
+        file_lines: List[str] = []
+        for i, (ts_ms, name, level, data) in enumerate(batch):
+            body = {"event": name, "ts_ms": ts_ms, **data}
+            want = encodings[i] if encodings else set()
+            by_encoding: Dict[str, Any] = {}
+            payloads.append(by_encoding)
+            for enc in want:
+                if enc != "json":
+                    by_encoding[enc] = wire.encode({"type": "debug", "data": body}, enc)
+            if not ("json" in want or self.stdout or self.file_path):
+                continue
+            body_json = json.dumps(body, default=str)
+            if "json" in want:
+                by_encoding["json"] = '{"type": "debug", "data": ' + body_json + "}"
+            if self.stdout:
+                lines.append(f"[debug:{name}] {body_json[:self.stdout_max_chars]}\n")
+            if self.file_path:
+                file_lines.append(body_json + "\n")
+
+        if lines:
+            sys.stdout.write("".join(lines))
+            sys.stdout.flush()
+        if file_lines:
+            self._write_file(file_lines)
+        return payloads
+
+    def _write_file(self, lines: List[str]) -> None:
+        path = self.file_path
+        if self._file is None or self._file.name != path:
+            if self._file:
+                self._file.close()
+            self._file = open(path, "a", encoding="utf-8")
+        self._file.write("".join(lines))
+        self._file.flush()
+
+# -----------------------------
+# Swap -> hedge traces
+# -----------------------------
+class SwapTrace:
+    __slots__ = ("tx_hash", "block_number", "block_ts", "arrival_ms", "t0", "t_decoded", "stages", "outcome", "total_ms")
+
+    def __init__(self, tx_hash: Optional[str], block_number: int, t_arrival: float, arrival_ms: int, block_ts: Optional[int] = None):
+        self.tx_hash = tx_hash
+        self.block_number = block_number
+        self.block_ts = block_ts  # seconds, when the provider includes blockTimestamp in the log
+        self.arrival_ms = arrival_ms
+        self.t0 = t_arrival
+        self.t_decoded = t_arrival
+        # (name, start ms after arrival, duration ms or None for a point-in-time mark, attrs)
+        self.stages: List[Tuple[str, float, Optional[float], Optional[Dict[str, Any]]]] = []
+        self.outcome: Optional[str] = None
+        self.total_ms: Optional[float] = None
+
+    def add(self, name: str, start: float, end: float, attrs: Optional[Dict[str, Any]] = None) -> None:
+        self.stages.append((name, (start - self.t0) * 1000, (end - start) * 1000, attrs))
+
+    def mark(self, name: str, attrs: Optional[Dict[str, Any]] = None) -> None:
+        self.stages.append((name, (time.perf_counter() - self.t0) * 1000, None, attrs))
+
+    def finish(self, outcome: Optional[str] = None) -> None:
+        if outcome and not self.outcome:
+            self.outcome = outcome
+        self.total_ms = (time.perf_counter() - self.t0) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "txHash": self.tx_hash,
+            "blockNumber": self.block_number,
+            "blockTimestamp": self.block_ts,
+            "arrivalMs": self.arrival_ms,
+            "blockToArrivalMs": None if self.block_ts is None else self.arrival_ms - self.block_ts * 1000,
+            "outcome": self.outcome,
+            "totalMs": self.total_ms,
+            "stages": [
+                {"stage": name, "startMs": round(start, 3), **({} if dur is None else {"durMs": round(dur, 3)}), **(attrs or {})}
+                for name, start, dur, attrs in self.stages
+            ],
+        }
+
+current_swap: ContextVar[Optional[SwapTrace]] = ContextVar("current_swap", default=None)
+
+@contextmanager
+def stage(name: str, histogram: Any = None, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Times the block into `histogram` (if given) and, when running under a
+    swap trace, records it as a stage. The yielded dict is stored as the
+    stage's attributes and may be filled in inside the block.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        t1 = time.perf_counter()
+        if histogram is not None:
+            histogram.observe(t1 - t0)
+        trace = current_swap.get()
+        if trace is not None:
+            trace.add(name, t0, t1, attrs or None)
+
+class TraceStore:
+    """The last `capacity` finished swap traces, by txHash."""
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self.traces: "OrderedDict[str, SwapTrace]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.traces)
+
+    def put(self, trace: SwapTrace) -> None:
+        key = trace.tx_hash or f"block:{trace.block_number}:{trace.arrival_ms}"
+        self.traces.pop(key, None)
+        self.traces[key] = trace
+        while len(self.traces) > self.capacity:
+            self.traces.popitem(last=False)
+
+    def get(self, tx_hash: str) -> Optional[SwapTrace]:
+        return self.traces.get(tx_hash) or self.traces.get(tx_hash.lower())
+
+    def recent(self, limit: int = 100, min_total_ms: float = 0.0, outcome: Optional[str] = None) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for trace in reversed(self.traces.values()):
+            if (trace.total_ms or 0.0) < min_total_ms:
+                continue
+            if outcome is not None and trace.outcome != outcome:
+                continue
+            out.append(trace.to_dict())
+            if len(out) >= limit:
+                break
+        return out
+
+    def summary(self, providers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        p50/p90/p99/max (ms) over the stored traces: duration per stage (summed
+        per trace when a stage repeats) and time from arrival to each mark.
+        """
+        per_stage: Dict[str, List[float]] = {}
+        per_mark: Dict[str, List[float]] = {}
+        totals: List[float] = []
+        block_lag: List[float] = []
+        for trace in self.traces.values():
+            if trace.total_ms is not None:
+                totals.append(trace.total_ms)
+            if trace.block_ts is not None:
+                block_lag.append(trace.arrival_ms - trace.block_ts * 1000)
+            summed: Dict[str, float] = {}
+            for name, start, dur, _ in trace.stages:
+                if dur is None:
+                    per_mark.setdefault(name, []).append(start)
+                else:
+                    summed[name] = summed.get(name, 0.0) + dur
+            for name, dur in summed.items():
+                per_stage.setdefault(name, []).append(dur)
+
+        def pct(values: List[float]) -> Dict[str, Any]:
+            a = np.asarray(values)
+            p50, p90, p99 = np.percentile(a, [50, 90, 99])
+            return {"count": int(a.size), "p50": round(float(p50), 3), "p90": round(float(p90), 3),
+                    "p99": round(float(p99), 3), "max": round(float(a.max()), 3)}
+
+        providers = providers or {}
+        out: Dict[str, Any] = {"traces": len(self.traces), "stages": {}, "arrival_to": {}}
+        for name, values in per_stage.items():
+            out["stages"][name] = {**pct(values), "provider": providers.get(name)}
+        for name, values in per_mark.items():
+            out["arrival_to"][name] = pct(values)
+        if totals:
+            out["total"] = pct(totals)
+        if block_lag:
+            out["block_to_arrival"] = {**pct(block_lag), "provider": providers.get("logs")}
+        return out
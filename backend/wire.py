@@ -0,0 +1,62 @@
+"""
+Wire encodings for /ws.
+
+  json     text frames, json.dumps(default=str) as always
+  msgpack  binary frames (needs `pip install msgpack`)
+  cbor     binary frames (needs `pip install cbor2`)
+
+Binary encodings are optional; `available()` lists what this process can
+serve. uint256 amounts above 2**64 don't fit a MessagePack integer, so such
+messages are re-encoded with those values as decimal strings.
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Union
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # optional
+    cbor2 = None
+
+Payload = Union[str, bytes]
+
+def _plain(obj: Any) -> Any:
+    # big ints -> str, tuples -> lists; only used when msgpack refuses a message
+    if isinstance(obj, dict):
+        return {k: _plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_plain(v) for v in obj]
+    if isinstance(obj, int) and not isinstance(obj, bool) and not -(2**63) <= obj < 2**64:
+        return str(obj)
+    return obj
+
+def _json(msg: Dict[str, Any]) -> str:
+    return json.dumps(msg, default=str)
+
+def _msgpack(msg: Dict[str, Any]) -> bytes:
+    try:
+        return msgpack.packb(msg, default=str)
+    except OverflowError:
+        return msgpack.packb(_plain(msg), default=str)
+
+def _cbor(msg: Dict[str, Any]) -> bytes:
+    return cbor2.dumps(msg, default=lambda enc, v: enc.encode(str(v)))
+
+ENCODERS: Dict[str, Callable[[Dict[str, Any]], Payload]] = {"json": _json}
+if msgpack is not None:
+    ENCODERS["msgpack"] = _msgpack
+if cbor2 is not None:
+    ENCODERS["cbor"] = _cbor
+
+ALL_ENCODINGS = ("json", "msgpack", "cbor")
+
+def available() -> List[str]:
+    return list(ENCODERS)
+
+def encode(msg: Dict[str, Any], encoding: str = "json") -> Payload:
+    return ENCODERS[encoding](msg)
@@ -25,6 +25,15 @@ Usage:
   # Deploy to mainnet (default is testnet)
   python deploy.py --vault --mainnet
 
+  # Roll out the vaults, modules and wiring for many pools from a plan file
+  python deploy.py --plan deploy-plan.json -o deployment.json
+
+Transactions are signed with locally assigned nonces and broadcast back to
+back, in two batches: the deployments, then (once every deployment has a
+successful receipt) the wiring. A full vault/ALM/fee-module run takes about
+two blocks rather than one block per transaction. Pass --serial to wait for
+each receipt before sending the next.
+
 Environment variables (or .env file):
   PRIVATE_KEY        - Deployer private key (with 0x prefix)
   RPC_URL            - Optional override for RPC URL
@@ -33,10 +42,16 @@ Environment variables (or .env file):
 import os
 import sys
 import json
+import time
+import hashlib
+import inspect
 import argparse
+import threading
 import subprocess
 from pathlib import Path
-from typing import Optional, Dict, Any, Tuple
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from dataclasses import dataclass, field
 
 try:
@@ -50,6 +65,10 @@ except ImportError:
     from web3 import Web3
     from dotenv import load_dotenv
 
+from eth_utils import abi_to_signature, function_signature_to_4byte_selector
+from web3.exceptions import TransactionNotFound
+from web3.utils.address import get_create_address
+
 # Load environment
 load_dotenv()
 
@@ -91,6 +110,14 @@ TESTNET_TOKENS = {
     "PURR": "0xa9056c15938f9aff34CD497c722Ce33dB0C2fD57",
 }
 
+# Transaction pipeline
+TX_TIMEOUT_S = 120          # per transaction, from its first broadcast
+RECEIPT_POLL_S = 0.5        # HyperEVM small blocks are ~1s
+STUCK_AFTER_S = 20          # head-of-queue tx unmined this long gets rebroadcast
+GAS_BUMP = 1.15             # replacements must pay >10% more to be accepted
+MAX_INFLIGHT = 8            # HyperEVM's mempool only holds the next 8 nonces per address
+PENDING_CALL_GAS = 300_000  # calls into a contract deployed earlier in the same batch
+
 # ==============================================================================
 # Contract Artifacts
 # ==============================================================================
@@ -98,27 +125,81 @@ TESTNET_TOKENS = {
 CONTRACTS_DIR = Path(__file__).parent / "contracts"
 OUT_DIR = CONTRACTS_DIR / "out"
 
+# What deployments need from each forge artifact (ABI, bytecode, selectors, link
+# references), keyed by the sha256 of the artifact file. Paths map to a hash
+# through (size, mtime), so a lookup is a stat and two dict reads; a rebuilt
+# artifact is re-hashed, and only re-parsed if its contents changed.
+ARTIFACT_INDEX = OUT_DIR / ".artifact-index.json"
+ARTIFACT_INDEX_VERSION = 1
+
+_artifact_index: Optional[Dict[str, Any]] = None
+
 def get_artifact_path(contract_name: str, source_file: Optional[str] = None) -> Path:
     """Get the path to a compiled contract artifact"""
     source = source_file or f"{contract_name}.sol"
     return OUT_DIR / source / f"{contract_name}.json"
 
+def _load_artifact_index() -> Dict[str, Any]:
+    global _artifact_index
+    if _artifact_index is None:
+        try:
+            index = json.loads(ARTIFACT_INDEX.read_bytes())
+            if index.get("version") != ARTIFACT_INDEX_VERSION:
+                raise ValueError("stale index")
+        except (OSError, ValueError):
+            index = {"version": ARTIFACT_INDEX_VERSION, "paths": {}, "artifacts": {}}
+        _artifact_index = index
+    return _artifact_index
+
+def _save_artifact_index(index: Dict[str, Any]) -> None:
+    live = {entry["sha256"] for entry in index["paths"].values()}
+    index["artifacts"] = {digest: a for digest, a in index["artifacts"].items() if digest in live}
+    tmp = ARTIFACT_INDEX.with_name(ARTIFACT_INDEX.name + ".tmp")
+    try:
+        tmp.write_text(json.dumps(index, separators=(",", ":")))
+        os.replace(tmp, ARTIFACT_INDEX)
+    except OSError as e:
+        print(f"Could not write artifact index: {e}")  # still cached for this run
+
+def _compact_artifact(artifact: Dict[str, Any]) -> Dict[str, Any]:
+    abi = artifact["abi"]
+    selectors = artifact.get("methodIdentifiers")
+    if selectors is None:
+        signatures = [abi_to_signature(e) for e in abi if e["type"] == "function"]
+        selectors = {sig: function_signature_to_4byte_selector(sig).hex() for sig in signatures}
+    return {
+        "abi": abi,
+        "bytecode": artifact["bytecode"]["object"],
+        "selectors": selectors,
+        "link_references": artifact["bytecode"].get("linkReferences", {}),
+    }
+
 def load_contract_artifact(contract_name: str, source_file: Optional[str] = None) -> Dict[str, Any]:
-    """Load compiled contract ABI and bytecode"""
+    """Load compiled contract ABI, bytecode, selectors and link references (shared; don't modify)"""
     artifact_path = get_artifact_path(contract_name, source_file)
-    if not artifact_path.exists():
+    try:
+        st = artifact_path.stat()
+    except FileNotFoundError:
         raise FileNotFoundError(
             f"Contract artifact not found: {artifact_path}\n"
             f"Run 'forge build' in the contracts directory first."
         )
     
-    with open(artifact_path) as f:
-        artifact = json.load(f)
+    index = _load_artifact_index()
+    key = artifact_path.relative_to(OUT_DIR).as_posix()
+    entry = index["paths"].get(key)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        cached = index["artifacts"].get(entry["sha256"])
+        if cached is not None:
+            return cached
     
-    return {
-        "abi": artifact["abi"],
-        "bytecode": artifact["bytecode"]["object"],
-    }
+    data = artifact_path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest not in index["artifacts"]:
+        index["artifacts"][digest] = _compact_artifact(json.loads(data))
+    index["paths"][key] = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    _save_artifact_index(index)
+    return index["artifacts"][digest]
 
 # ==============================================================================
 # Deployment Results
@@ -133,6 +214,81 @@ class DeploymentResult:
     constructor_args: Dict[str, Any] = field(default_factory=dict)
     gas_used: int = 0
 
+@dataclass
+class PendingTx:
+    """A broadcast transaction at a fixed nonce, and every hash it was sent under"""
+    label: str
+    nonce: int
+    tx: Dict
+    hashes: List[str] = field(default_factory=list)
+    first_sent: float = 0.0
+    last_sent: float = 0.0
+    result: Optional[DeploymentResult] = None  # filled in when the receipt arrives
+    receipt: Optional[Any] = None
+    error: Optional[str] = None
+    step: Optional[str] = None  # plan step it belongs to
+
+    @property
+    def tx_hash(self) -> str:
+        if self.receipt is not None:
+            return Web3.to_hex(self.receipt["transactionHash"])
+        return self.hashes[-1]
+
+# ==============================================================================
+# Nonce Manager
+# ==============================================================================
+
+class NonceManager:
+    """
+    Hands out the deployer's nonces locally, so independent transactions can be
+    signed and broadcast back to back instead of one receipt at a time.
+
+    The counter is seeded once from the pending transaction count. At most
+    `max_inflight` nonces are handed out ahead of the last mined one; past
+    that, reserve() waits up to TX_TIMEOUT_S for the chain to catch up.
+    A pipeline never gets there on its own: it settles its batch in chunks
+    of `max_inflight`, which is where stuck transactions are resent.
+    """
+
+    def __init__(self, w3: Web3, address: str, max_inflight: int = MAX_INFLIGHT):
+        self.w3 = w3
+        self.address = address
+        self.max_inflight = max_inflight
+        self._next: Optional[int] = None
+        self._mined = 0
+        self._lock = threading.Lock()
+
+    def mined(self) -> int:
+        """The nonce the chain expects next: everything below it is mined"""
+        self._mined = self.w3.eth.get_transaction_count(self.address, "latest")
+        return self._mined
+
+    def reserve(self) -> int:
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.address, "pending")
+                self.mined()
+            if self._next - self._mined >= self.max_inflight:  # cached count first: no RPC per nonce
+                deadline = time.time() + TX_TIMEOUT_S
+                while self._next - self.mined() >= self.max_inflight:
+                    if time.time() > deadline:
+                        raise TimeoutError(
+                            f"nonce {self._next}: the chain is still at nonce {self._mined} after "
+                            f"{TX_TIMEOUT_S}s, with {self.max_inflight} nonces in flight"
+                        )
+                    time.sleep(RECEIPT_POLL_S)
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def release(self, nonce: int) -> None:
+        """Give back a nonce whose transaction never reached the node"""
+        with self._lock:
+            if self._next == nonce + 1:
+                self._next = nonce
+            else:
+                self._next = None  # later nonces are out already: re-read the node's pending count
+
 # ==============================================================================
 # Deployer Class
 # ==============================================================================
@@ -140,13 +296,14 @@ class DeploymentResult:
 class ContractDeployer:
     """Deploy contracts to Hyperliquid EVM"""
     
-    def __init__(self, network: str = "testnet", private_key: Optional[str] = None):
+    def __init__(self, network: str = "testnet", private_key: Optional[str] = None, w3: Optional[Web3] = None):
+        """`w3`: a client to use instead of connecting to the network's RPC (tests pass a stub)"""
         self.network_config = NETWORKS[network]
         self.network = network
         
         # Override RPC if provided
         rpc_url = os.getenv("RPC_URL", self.network_config.rpc_url)
-        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
+        self.w3 = w3 or Web3(Web3.HTTPProvider(rpc_url))
         
         if not self.w3.is_connected():
             raise ConnectionError(f"Failed to connect to {rpc_url}")
@@ -172,31 +329,179 @@ class ContractDeployer:
         balance = self.w3.eth.get_balance(self.deployer_address)
         print(f"Balance:  {self.w3.from_wei(balance, 'ether'):.6f} ETH")
         print(f"{'='*60}\n")
+        
+        self.nonces = NonceManager(self.w3, self.deployer_address)
+        self._batch: Optional[List[PendingTx]] = None  # set inside pipeline()
+        self.step: Optional[str] = None  # plan step the next transactions belong to
+        self.on_broadcast: Optional[Callable[[PendingTx, str], None]] = None
+        self.on_void: Optional[Callable[[PendingTx], None]] = None  # a broadcast failed, its nonce goes back
     
     def _get_nonce(self) -> int:
-        return self.w3.eth.get_transaction_count(self.deployer_address)
+        return self.nonces.reserve()
     
     def _estimate_gas(self, tx: Dict) -> int:
+        if tx.get("to") and not self.w3.eth.get_code(tx["to"]):
+            # Deployed earlier in this batch and not mined yet: an estimate
+            # against empty code would come back as a plain transfer
+            return PENDING_CALL_GAS
         try:
             return self.w3.eth.estimate_gas(tx)
         except Exception as e:
             print(f"Gas estimation failed: {e}")
             return 3_000_000  # Default fallback
     
-    def _send_transaction(self, tx: Dict) -> Tuple[str, int]:
-        """Sign and send a transaction, return (tx_hash, gas_used)"""
-        signed = self.account.sign_transaction(tx)
-        tx_hash = self.w3.eth.send_raw_transaction(signed.raw_transaction)
+    def _broadcast(self, pending: PendingTx) -> None:
+        """Sign pending.tx and send it; the hash is computed locally"""
+        signed = self.account.sign_transaction(pending.tx)
+        if self.on_broadcast is not None:
+            self.on_broadcast(pending, Web3.to_hex(signed.hash))  # before the node can see it
+        try:
+            self.w3.eth.send_raw_transaction(signed.raw_transaction)
+        except Exception as e:
+            if "already known" not in str(e):
+                raise
+        pending.hashes.append(Web3.to_hex(signed.hash))
+        pending.last_sent = time.time()
+        pending.first_sent = pending.first_sent or pending.last_sent
+    
+    def _send_transaction(self, tx: Dict, label: str, result: Optional[DeploymentResult] = None) -> PendingTx:
+        """Assign a nonce, sign and send; outside a pipeline, also wait for the receipt"""
+        if self._batch is not None:
+            # A full window: await it here, where a stalled head gets resent,
+            # rather than wait on the chain in reserve()
+            unsettled = [p for p in self._batch if p.receipt is None and p.error is None]
+            if len(unsettled) >= self.nonces.max_inflight:
+                print(f"  {len(unsettled)} transactions in flight, awaiting their receipts...")
+                self.settle(unsettled)
+        tx["nonce"] = self._get_nonce()
+        pending = PendingTx(label=label, nonce=tx["nonce"], tx=tx, result=result, step=self.step)
+        if result is not None:
+            # Fixed by deployer and nonce: known before anything is mined
+            result.address = get_create_address(self.deployer_address, pending.nonce)
+        try:
+            self._broadcast(pending)
+        except Exception:
+            if self.on_void is not None:
+                self.on_void(pending)
+            self.nonces.release(pending.nonce)
+            raise
         
-        print(f"  Transaction sent: {tx_hash.hex()}")
-        print(f"  Waiting for confirmation...")
+        print(f"  Transaction sent: {pending.tx_hash} (nonce {pending.nonce})")
         
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+        if self._batch is not None:
+            self._batch.append(pending)
+        else:
+            print(f"  Waiting for confirmation...")
+            self.wait_all([pending])
+        return pending
+    
+    @contextmanager
+    def pipeline(self, check: bool = True):
+        """
+        Broadcast every transaction sent inside the block back to back, then
+        await all receipts concurrently on exit.
         
+        Deployment results carry their address as soon as they are sent, but
+        wiring that points a contract at them belongs in a later pipeline:
+        nothing here stops a later nonce from mining after an earlier one
+        reverted. Yields the batch; with check=False failures are left on
+        each PendingTx.error instead of raised.
+        """
+        batch: List[PendingTx] = []
+        self._batch = batch
+        try:
+            yield batch
+        finally:
+            self._batch = None
+        unsettled = sum(1 for p in batch if p.receipt is None and p.error is None)
+        if unsettled:
+            print(f"\nAwaiting {unsettled} receipts...")
+        errors = self.settle(batch)
+        if check and errors:
+            raise Exception("Transaction failed!\n  " + "\n  ".join(errors))
+    
+    def settle(self, batch: List[PendingTx]) -> List[str]:
+        """Await receipts concurrently; returns the errors once every transaction has settled"""
+        todo = [p for p in batch if p.receipt is None and p.error is None]
+        if todo:
+            with ThreadPoolExecutor(max_workers=min(len(todo), 16)) as pool:
+                for pending, error in zip(todo, pool.map(self._await_receipt, todo)):
+                    pending.error = error
+        return [p.error for p in batch if p.error]
+    
+    def wait_all(self, batch: List[PendingTx]) -> None:
+        """Await receipts concurrently; raise once all have settled if any failed"""
+        errors = self.settle(batch)
+        if errors:
+            raise Exception("Transaction failed!\n  " + "\n  ".join(errors))
+    
+    def _find_receipt(self, pending: PendingTx) -> Optional[Any]:
+        for tx_hash in reversed(pending.hashes):
+            try:
+                return self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+    
+    def find_creation(self, tx_hashes: List[str], address: str) -> Optional[Any]:
+        """The successful receipt among tx_hashes that created the contract at address, if any"""
+        for tx_hash in tx_hashes:
+            try:
+                receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+            created = receipt.get("contractAddress")
+            if receipt["status"] == 1 and created and Web3.to_checksum_address(created) == Web3.to_checksum_address(address):
+                return receipt
+        return None
+    
+    def _await_receipt(self, pending: PendingTx) -> Optional[str]:
+        """Poll until one of pending's hashes is mined; returns an error message or None"""
+        while True:
+            receipt = self._find_receipt(pending)
+            if receipt is not None:
+                break
+            now = time.time()
+            if now - pending.first_sent > TX_TIMEOUT_S:
+                return f"{pending.label}: no receipt after {TX_TIMEOUT_S}s (nonce {pending.nonce}, sent as {', '.join(pending.hashes)})"
+            if now - pending.last_sent > STUCK_AFTER_S:
+                mined = self.nonces.mined()
+                if mined > pending.nonce:
+                    # The nonce is used up; unless our receipt landed between
+                    # the two reads, some other transaction took it
+                    receipt = self._find_receipt(pending)
+                    if receipt is not None:
+                        break
+                    return f"{pending.label}: nonce {pending.nonce} was used by another transaction"
+                if mined == pending.nonce:
+                    self._bump(pending)  # head of the queue only; later nonces wait behind it
+            time.sleep(RECEIPT_POLL_S)
+        
+        pending.receipt = receipt
         if receipt["status"] != 1:
-            raise Exception(f"Transaction failed! Receipt: {receipt}")
+            return f"{pending.label}: reverted. Receipt: {dict(receipt)}"
         
-        return tx_hash.hex(), receipt["gasUsed"]
+        result = pending.result
+        if result is None:
+            print(f"  ✓ {pending.label} mined. TX: {pending.tx_hash}")
+            return None
+        if receipt["contractAddress"] != result.address:
+            return f"{pending.label}: deployed at {receipt['contractAddress']}, expected {result.address}"
+        result.tx_hash = pending.tx_hash
+        result.gas_used = receipt["gasUsed"]
+        print(f"  ✓ {result.contract_name} deployed at: {result.address} (gas used: {result.gas_used:,})")
+        return None
+    
+    def _bump(self, pending: PendingTx) -> None:
+        """Resend a stuck or dropped transaction at the same nonce for a higher gas price"""
+        price = max(int(pending.tx["gasPrice"] * GAS_BUMP) + 1, self.w3.eth.gas_price)
+        pending.tx = {**pending.tx, "gasPrice": price}
+        print(f"  ↻ {pending.label}: nonce {pending.nonce} unmined after {STUCK_AFTER_S}s, resending at {price} wei")
+        try:
+            self._broadcast(pending)
+        except Exception as e:
+            pending.last_sent = time.time()  # try again after another interval
+            print(f"  Resend failed: {e}")
     
     def deploy_contract(
         self,
@@ -205,10 +510,13 @@ class ContractDeployer:
         source_file: Optional[str] = None,
         constructor_arg_names: Optional[Dict[str, Any]] = None,
     ) -> DeploymentResult:
-        """Deploy a contract and return the result"""
+        """Deploy a contract and return the result (tx_hash and gas_used are final once mined)"""
         print(f"\nDeploying {contract_name}...")
         
         artifact = load_contract_artifact(contract_name, source_file)
+        if artifact["link_references"]:
+            libraries = [f"{src}:{lib}" for src, libs in artifact["link_references"].items() for lib in libs]
+            raise ValueError(f"{contract_name} bytecode needs libraries linked: {', '.join(libraries)}")
         
         contract = self.w3.eth.contract(
             abi=artifact["abi"],
@@ -222,27 +530,23 @@ class ContractDeployer:
             "from": self.deployer_address,
             "data": construct_tx.data_in_transaction,
             "chainId": self.network_config.chain_id,
-            "nonce": self._get_nonce(),
             "gasPrice": self.w3.eth.gas_price,
         }
         tx["gas"] = self._estimate_gas(tx)
         
-        tx_hash, gas_used = self._send_transaction(tx)
-        
-        # Get deployed address from receipt
-        receipt = self.w3.eth.get_transaction_receipt(tx_hash)
-        contract_address = receipt["contractAddress"]
-        
-        print(f"  ✓ {contract_name} deployed at: {contract_address}")
-        print(f"  Gas used: {gas_used:,}")
-        
-        return DeploymentResult(
+        result = DeploymentResult(
             contract_name=contract_name,
-            address=contract_address,
-            tx_hash=tx_hash,
+            address="",
+            tx_hash="",
             constructor_args=constructor_arg_names or {},
-            gas_used=gas_used,
         )
+        pending = self._send_transaction(tx, contract_name, result)
+        result.tx_hash = result.tx_hash or pending.tx_hash
+        
+        if self._batch is not None:
+            print(f"  → {contract_name} will be at: {result.address}")
+        
+        return result
     
     def call_contract_write(self, address: str, abi: list, function_name: str, *args) -> str:
         """Call a contract write function"""
@@ -252,13 +556,17 @@ class ContractDeployer:
         tx = func.build_transaction({
             "from": self.deployer_address,
             "chainId": self.network_config.chain_id,
-            "nonce": self._get_nonce(),
             "gasPrice": self.w3.eth.gas_price,
+            "gas": PENDING_CALL_GAS,  # placeholder, so building doesn't estimate
         })
         tx["gas"] = self._estimate_gas(tx)
         
-        tx_hash, _ = self._send_transaction(tx)
-        return tx_hash
+        return self._send_transaction(tx, function_name).tx_hash
+    
+    def call_contract_read(self, address: str, abi: list, function_name: str, *args) -> Any:
+        """Call a contract view function"""
+        contract = self.w3.eth.contract(address=address, abi=abi)
+        return getattr(contract.functions, function_name)(*args).call()
 
     # =========================================================================
     # Contract-specific deployment methods
@@ -357,7 +665,6 @@ class ContractDeployer:
         }]
         
         tx_hash = self.call_contract_write(vault_address, abi, "setAuthorizedPool", pool_address, True)
-        print(f"  ✓ Pool authorized. TX: {tx_hash}")
         return tx_hash
     
     def set_alm_on_pool(self, pool_address: str, alm_address: str) -> str:
@@ -373,7 +680,6 @@ class ContractDeployer:
         }]
         
         tx_hash = self.call_contract_write(pool_address, abi, "setALM", alm_address)
-        print(f"  ✓ ALM set on pool. TX: {tx_hash}")
         return tx_hash
     
     def set_swap_fee_module_on_pool(self, pool_address: str, module_address: str) -> str:
@@ -389,7 +695,6 @@ class ContractDeployer:
         }]
         
         tx_hash = self.call_contract_write(pool_address, abi, "setSwapFeeModule", module_address)
-        print(f"  ✓ SwapFeeModule set on pool. TX: {tx_hash}")
         return tx_hash
     
     def change_default_vault(self, vault_address: str, new_default_vault: str) -> str:
@@ -405,9 +710,509 @@ class ContractDeployer:
         }]
         
         tx_hash = self.call_contract_write(vault_address, abi, "changeDefaultVault", new_default_vault)
-        print(f"  ✓ Default vault changed. TX: {tx_hash}")
         return tx_hash
 
+    # =========================================================================
+    # On-chain reads (what a resumed plan checks before repeating a step)
+    # =========================================================================
+    
+    def has_code(self, address: str) -> bool:
+        return len(self.w3.eth.get_code(address)) > 0
+    
+    def get_pool_alm(self, pool_address: str) -> str:
+        """pool.alm()"""
+        abi = [{
+            "type": "function",
+            "name": "alm",
+            "inputs": [],
+            "outputs": [{"name": "", "type": "address"}],
+            "stateMutability": "view"
+        }]
+        return self.call_contract_read(pool_address, abi, "alm")
+    
+    def get_pool_swap_fee_module(self, pool_address: str) -> str:
+        """pool.swapFeeModule()"""
+        abi = [{
+            "type": "function",
+            "name": "swapFeeModule",
+            "inputs": [],
+            "outputs": [{"name": "", "type": "address"}],
+            "stateMutability": "view"
+        }]
+        return self.call_contract_read(pool_address, abi, "swapFeeModule")
+    
+    def is_pool_authorized(self, vault_address: str, pool_address: str) -> bool:
+        """vault.authorizedPools(pool)"""
+        abi = [{
+            "type": "function",
+            "name": "authorizedPools",
+            "inputs": [{"name": "", "type": "address"}],
+            "outputs": [{"name": "", "type": "bool"}],
+            "stateMutability": "view"
+        }]
+        return self.call_contract_read(vault_address, abi, "authorizedPools", pool_address)
+    
+    def get_default_vault(self, vault_address: str) -> str:
+        """vault.defaultVault()"""
+        abi = [{
+            "type": "function",
+            "name": "defaultVault",
+            "inputs": [],
+            "outputs": [{"name": "", "type": "address"}],
+            "stateMutability": "view"
+        }]
+        return self.call_contract_read(vault_address, abi, "defaultVault")
+
+# ==============================================================================
+# Deployment Plans
+# ==============================================================================
+
+@dataclass
+class PlanStep:
+    """One deployment or wiring call; runs once every step in `deps` has succeeded"""
+    id: str
+    kind: str  # "deploy" | "call"
+    deps: List[str]
+    spec: Dict[str, Any]  # the step as planned, with references unresolved; journaled
+    run: Callable[["ContractDeployer"], Any]  # DeploymentResult for deployments, a configuration dict for calls
+    check: Optional[Callable[["ContractDeployer"], bool]] = None  # calls: is it already in effect on-chain?
+    status: str = "planned"  # planned -> sent -> done | failed | skipped
+    result: Any = None
+    txs: List[PendingTx] = field(default_factory=list)
+    tx_hash: Optional[str] = None
+    error: Optional[str] = None
+
+class DeployJournal:
+    """
+    Append-only JSONL record of a plan's steps: planned, sent (nonce, hash
+    and the signed transaction), void (the send failed and the nonce was
+    given back), mined, verified or failed.
+    
+    A `sent` line is fsynced before the transaction is handed to the node, so
+    after a crash or a timeout the next run knows every transaction that may
+    have reached the chain, and can see the unmined ones through.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.runs, self.steps = self._replay(path)
+        self._lock = threading.Lock()
+        self._f = open(path, "a")
+    
+    @staticmethod
+    def _replay(path: str) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """(run headers, latest state per step)"""
+        runs: List[Dict[str, Any]] = []
+        steps: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return runs, steps
+        
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line
+            if entry["status"] == "run":
+                runs.append(entry)
+                continue
+            if entry["status"] == "planned":
+                steps[entry["step"]] = {}  # a new attempt
+            state = steps.setdefault(entry["step"], {})
+            if entry["status"] == "sent":
+                state.setdefault("hashes", []).append(entry["tx_hash"])
+            if entry["status"] == "void" and state.get("nonce") == entry["nonce"]:
+                # Never reached the node; its nonce, and so its CREATE address, went to the next send
+                state["hashes"] = [h for h in state.get("hashes", []) if h != state.get("tx_hash")]
+                for key in ("nonce", "tx", "tx_hash", "address"):
+                    state.pop(key, None)
+                state["status"] = "void"
+                continue
+            state.update(entry)
+        return runs, steps
+    
+    def append(self, status: str, step: Optional[str] = None, **fields: Any) -> None:
+        entry = {"ts": int(time.time() * 1000), "status": status, **({"step": step} if step else {}), **fields}
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+    
+    def sent(self, pending: PendingTx, tx_hash: str) -> None:
+        """ContractDeployer.on_broadcast hook"""
+        fields: Dict[str, Any] = {
+            "nonce": pending.nonce,
+            "tx_hash": tx_hash,
+            "tx": {k: Web3.to_hex(v) if isinstance(v, bytes) else v for k, v in pending.tx.items()},
+        }
+        if pending.result is not None:
+            fields.update(
+                contract=pending.result.contract_name,
+                address=pending.result.address,
+                constructor_args=pending.result.constructor_args,
+            )
+        self.append("sent", pending.step, **fields)
+    
+    def void(self, pending: PendingTx) -> None:
+        """ContractDeployer.on_void hook: the `sent` line for this nonce no longer holds"""
+        self.append("void", pending.step, nonce=pending.nonce)
+    
+    def close(self) -> None:
+        self._f.close()
+
+class DeployPlan:
+    """
+    A rollout described in a JSON plan file, resolved into a dependency DAG.
+    
+    {
+      "network": "testnet",
+      "vaults": {
+        "main": {"usdc": "0x..."},            # deployed (usdc defaults to the network's)
+        "old":  {"address": "0x..."}          # already deployed
+      },
+      "pools": {
+        "purr-usdc": {
+          "address": "0x...",                 # pools themselves come from DeployAll.s.sol
+          "vault": "main",                    # vault name or address: setAuthorizedPool
+          "alm": true,                        # deploy SovereignALM + setALM (or an address to wire)
+          "fee_module": {"base_fee_bips": 15} # deploy fee module + setSwapFeeModule (true, params or an address)
+        }
+      }
+    }
+    
+    A vault may also carry "default_vault" (changeDefaultVault). Steps are
+    executed in waves: every step whose dependencies are done goes out in one
+    pipeline, so all deployments of a rollout share a batch and all wiring the
+    next. A failed step only skips the steps that depend on it.
+    
+    Before a step is sent it is checked on-chain: a wiring call whose effect is
+    already there, or a deployment the journal has an address for and that has
+    code, is not repeated.
+    """
+    
+    FEE_MODULE_PARAMS = set(inspect.signature(ContractDeployer.deploy_swap_fee_module).parameters) - {"self", "pool_address"}
+    
+    def __init__(self, plan: Dict[str, Any], source: str = "<plan>"):
+        self.source = source
+        self.network = plan.get("network", "testnet")
+        if self.network not in NETWORKS:
+            raise ValueError(f"{source}: unknown network {self.network!r}")
+        self.steps: Dict[str, PlanStep] = {}
+        self.vaults: Dict[str, str] = {}  # name -> step id or address
+        self.pools: Dict[str, Dict[str, Optional[str]]] = {}
+        
+        for name, spec in plan.get("vaults", {}).items():
+            self._add_vault(name, spec)
+        for name, spec in plan.get("pools", {}).items():
+            self._add_pool(name, spec)
+        if not self.steps:
+            raise ValueError(f"{source}: nothing to do")
+        self.waves()  # fail on a bad graph before anything is sent
+    
+    @classmethod
+    def load(cls, path: str) -> "DeployPlan":
+        with open(path) as f:
+            return cls(json.load(f), source=path)
+    
+    def _address(self, where: str, value: Any) -> str:
+        if not isinstance(value, str) or not Web3.is_address(value):
+            raise ValueError(f"{self.source}: {where} is not an address: {value!r}")
+        return Web3.to_checksum_address(value)
+    
+    def resolve(self, ref: Any) -> Any:
+        """A step id's deployed address (None unless it succeeded); anything else as is"""
+        if not isinstance(ref, str) or ref not in self.steps:
+            return ref
+        step = self.steps[ref]
+        return step.result.address if step.status == "done" else None
+    
+    def _deploy(self, step_id: str, spec: Dict[str, Any], run: Callable[["ContractDeployer"], DeploymentResult]) -> str:
+        self.steps[step_id] = PlanStep(step_id, "deploy", [], spec, run)
+        return step_id
+    
+    def _call(self, step_id: str, spec: Dict[str, Any], send: Callable[..., Any], check: Callable[..., bool]) -> None:
+        """`send` and `check` get the deployer and spec's fields with references resolved"""
+        def config() -> Dict[str, Any]:
+            return {key: self.resolve(ref) for key, ref in spec.items()}
+        
+        def run(d: "ContractDeployer") -> Dict[str, Any]:
+            send(d, **config())
+            return config()
+        
+        deps = [ref for ref in spec.values() if isinstance(ref, str) and ref in self.steps]
+        self.steps[step_id] = PlanStep(step_id, "call", deps, spec, run, lambda d: check(d, **config()))
+    
+    def _add_vault(self, name: str, spec: Dict[str, Any]) -> None:
+        if "address" in spec:
+            self.vaults[name] = self._address(f"vaults.{name}.address", spec["address"])
+        else:
+            usdc = self._address(f"vaults.{name}.usdc", spec["usdc"]) if "usdc" in spec else None
+            self.vaults[name] = self._deploy(
+                f"vault:{name}", {"contract": "SovereignVault", "usdc": usdc},
+                lambda d: d.deploy_sovereign_vault(usdc_address=usdc),
+            )
+        
+        if "default_vault" in spec:
+            self._call(
+                f"changeDefaultVault:{name}",
+                {
+                    "action": "changeDefaultVault",
+                    "vault": self.vaults[name],
+                    "defaultVault": self._address(f"vaults.{name}.default_vault", spec["default_vault"]),
+                },
+                send=lambda d, vault, defaultVault, **_: d.change_default_vault(vault, defaultVault),
+                check=lambda d, vault, defaultVault, **_: d.get_default_vault(vault) == defaultVault,
+            )
+    
+    def _add_pool(self, name: str, spec: Dict[str, Any]) -> None:
+        pool = self._address(f"pools.{name}.address", spec.get("address"))
+        refs: Dict[str, Optional[str]] = {"address": pool, "vault": None, "alm": None, "fee_module": None}
+        
+        vault = spec.get("vault")
+        if vault is not None:
+            refs["vault"] = self.vaults[vault] if vault in self.vaults else self._address(f"pools.{name}.vault", vault)
+            self._call(
+                f"authorizePool:{name}",
+                {"action": "authorizePool", "vault": refs["vault"], "pool": pool},
+                send=lambda d, vault, pool, **_: d.authorize_pool_on_vault(vault, pool),
+                check=lambda d, vault, pool, **_: d.is_pool_authorized(vault, pool),
+            )
+        
+        alm = spec.get("alm")
+        if alm:
+            if alm is True:
+                refs["alm"] = self._deploy(
+                    f"alm:{name}", {"contract": "SovereignALM", "pool": pool},
+                    lambda d: d.deploy_sovereign_alm(pool),
+                )
+            else:
+                refs["alm"] = self._address(f"pools.{name}.alm", alm)
+            self._call(
+                f"setALM:{name}",
+                {"action": "setALM", "pool": pool, "alm": refs["alm"]},
+                send=lambda d, pool, alm, **_: d.set_alm_on_pool(pool, alm),
+                check=lambda d, pool, alm, **_: d.get_pool_alm(pool) == alm,
+            )
+        
+        module = spec.get("fee_module")
+        if module:
+            if module is True or isinstance(module, dict):
+                params = module if isinstance(module, dict) else {}
+                unknown = set(params) - self.FEE_MODULE_PARAMS
+                if unknown:
+                    raise ValueError(f"{self.source}: pools.{name}.fee_module: unknown parameters {sorted(unknown)}")
+                refs["fee_module"] = self._deploy(
+                    f"fee_module:{name}", {"contract": "BalanceSeekingSwapFeeModule", "pool": pool, **params},
+                    lambda d: d.deploy_swap_fee_module(pool, **params),
+                )
+            else:
+                refs["fee_module"] = self._address(f"pools.{name}.fee_module", module)
+            self._call(
+                f"setSwapFeeModule:{name}",
+                {"action": "setSwapFeeModule", "pool": pool, "module": refs["fee_module"]},
+                send=lambda d, pool, module, **_: d.set_swap_fee_module_on_pool(pool, module),
+                check=lambda d, pool, module, **_: d.get_pool_swap_fee_module(pool) == module,
+            )
+        
+        self.pools[name] = refs
+    
+    def waves(self) -> List[List[PlanStep]]:
+        """Topological layers: each wave depends only on earlier ones"""
+        depth: Dict[str, int] = {}
+        
+        def visit(step_id: str, path: Tuple[str, ...]) -> int:
+            if step_id in path:
+                raise ValueError(f"{self.source}: dependency cycle: {' -> '.join(path + (step_id,))}")
+            if step_id not in depth:
+                deps = self.steps[step_id].deps
+                depth[step_id] = 1 + max((visit(d, path + (step_id,)) for d in deps), default=-1)
+            return depth[step_id]
+        
+        for step_id in self.steps:
+            visit(step_id, ())
+        waves: List[List[PlanStep]] = [[] for _ in range(max(depth.values()) + 1)]
+        for step_id, step in self.steps.items():
+            waves[depth[step_id]].append(step)
+        return waves
+    
+    def _in_effect(self, deployer: "ContractDeployer", step: PlanStep) -> bool:
+        """Cheap reads: the deployed contract has code, the wiring reads back as planned"""
+        try:
+            if step.kind == "deploy":
+                return deployer.has_code(step.result.address)
+            return step.check(deployer)
+        except Exception:
+            return False  # unreadable counts as not done
+    
+    def _on_chain(self, deployer: "ContractDeployer", step: PlanStep, journaled: Dict[str, Any]) -> bool:
+        """Is the step already done, by this plan or by hand? Fills in its result if so"""
+        if step.kind == "deploy":
+            if not journaled.get("address"):
+                return False  # only the journal knows where a deployment went
+            # Code at the predicted address is not enough: a nonce given back
+            # after a failed send puts the next deployment there. Trust it only
+            # if one of this step's own transactions created it.
+            receipt = deployer.find_creation(journaled.get("hashes", []), journaled["address"])
+            if receipt is None:
+                return False
+            step.result = DeploymentResult(
+                contract_name=step.spec["contract"],
+                address=journaled["address"],
+                tx_hash=Web3.to_hex(receipt["transactionHash"]),
+                constructor_args=journaled.get("constructor_args", {}),
+                gas_used=receipt["gasUsed"],
+            )
+        else:
+            step.result = {key: self.resolve(ref) for key, ref in step.spec.items()}
+        if not self._in_effect(deployer, step):
+            step.result = None
+            return False
+        step.tx_hash = step.result.tx_hash if step.kind == "deploy" else journaled.get("tx_hash")
+        return True
+    
+    def _resume(self, deployer: "ContractDeployer", journal: DeployJournal) -> Dict[str, Dict[str, Any]]:
+        """Journaled state of each step still as planned, after seeing through what the last run left unmined"""
+        chain_id = deployer.network_config.chain_id
+        for run in journal.runs:
+            if run.get("chainId") != chain_id or run.get("deployer") != deployer.deployer_address:
+                raise ValueError(
+                    f"{journal.path} is for {run.get('deployer')} on chain {run.get('chainId')}; "
+                    f"pass another --journal"
+                )
+        journal.append("run", plan=self.source, chainId=chain_id, deployer=deployer.deployer_address)
+        
+        state: Dict[str, Dict[str, Any]] = {}
+        for step_id, journaled in journal.steps.items():
+            step = self.steps.get(step_id)
+            if step is None:
+                continue
+            if journaled.get("spec") != step.spec:
+                print(f"  {step_id} changed in the plan since it was journaled; starting it over")
+                continue
+            state[step_id] = journaled
+        if state:
+            print(f"\nResuming from {journal.path}: {len(state)} steps journaled")
+        
+        # Sent but never seen mined: settle them before any new nonce is handed out
+        mined = deployer.nonces.mined()
+        now = time.time()
+        adopted = [
+            PendingTx(
+                label=step_id, nonce=journaled["nonce"], tx=journaled["tx"], hashes=list(journaled["hashes"]),
+                first_sent=now, last_sent=now, step=step_id,
+            )
+            for step_id, journaled in state.items()
+            if journaled["status"] == "sent" and journaled["nonce"] >= mined
+        ]
+        if adopted:
+            print(f"Awaiting {len(adopted)} transactions sent by the previous run...")
+            deployer.settle(adopted)
+            for pending in adopted:
+                if pending.error is None:
+                    journal.append("mined", pending.step, tx_hash=pending.tx_hash,
+                                   gas_used=pending.receipt["gasUsed"], block=pending.receipt["blockNumber"])
+                    state[pending.step].update(tx_hash=pending.tx_hash, gas_used=pending.receipt["gasUsed"])
+        return state
+    
+    def execute(self, deployer: "ContractDeployer", journal: Optional[DeployJournal] = None) -> None:
+        def log(status: str, step: PlanStep, **fields: Any) -> None:
+            if journal is not None:
+                journal.append(status, step.id, **fields)
+        
+        if journal is not None:
+            deployer.on_broadcast = journal.sent
+            deployer.on_void = journal.void
+        try:
+            state = self._resume(deployer, journal) if journal is not None else {}
+            
+            for n, wave in enumerate(self.waves(), 1):
+                print(f"\n{'='*60}")
+                print(f"Wave {n}: {len(wave)} steps")
+                print(f"{'='*60}")
+                
+                with deployer.pipeline(check=False) as batch:
+                    for step in wave:
+                        blocked = [d for d in step.deps if self.steps[d].status != "done"]
+                        if blocked:
+                            step.status = "skipped"
+                            step.error = f"depends on {', '.join(blocked)}"
+                            continue
+                        if self._on_chain(deployer, step, state.get(step.id, {})):
+                            step.status = "done"
+                            print(f"  ✓ {step.id} already on-chain, skipping")
+                            if state.get(step.id, {}).get("status") != "verified":
+                                log("verified", step, spec=step.spec)
+                            continue
+                        
+                        log("planned", step, spec=step.spec)
+                        start = len(batch)
+                        deployer.step = step.id
+                        try:
+                            step.result = step.run(deployer)
+                        except Exception as e:
+                            step.status = "failed"
+                            step.error = f"{type(e).__name__}: {e}"
+                            print(f"  ❌ {step.id}: {step.error}")
+                            log("failed", step, error=step.error)
+                            continue
+                        finally:
+                            deployer.step = None
+                        step.txs = batch[start:]
+                        step.status = "sent"
+                
+                for step in wave:
+                    if step.status != "sent":
+                        continue
+                    errors = [p.error for p in step.txs if p.error]
+                    if not errors:
+                        last = step.txs[-1]
+                        step.tx_hash = last.tx_hash
+                        log("mined", step, tx_hash=last.tx_hash, gas_used=last.receipt["gasUsed"],
+                            block=last.receipt["blockNumber"])
+                        if not self._in_effect(deployer, step):
+                            errors.append("mined, but not in effect on-chain")
+                    if errors:
+                        step.status = "failed"
+                        step.error = "; ".join(errors)
+                        log("failed", step, error=step.error)
+                    else:
+                        step.status = "done"
+                        log("verified", step, spec=step.spec)
+        finally:
+            deployer.on_broadcast = None
+            deployer.on_void = None
+    
+    def record(self, deployer: "ContractDeployer") -> Dict[str, Any]:
+        """One consolidated deployment record for the whole rollout"""
+        record: Dict[str, Any] = {
+            "network": self.network,
+            "deployer": deployer.deployer_address,
+            "plan": self.source,
+            "contracts": {},
+            "configurations": [],
+            "pools": {},
+            "failed": {},
+        }
+        for step in self.steps.values():
+            if step.status != "done":
+                record["failed"][step.id] = {"status": step.status, "error": step.error}
+            elif step.kind == "deploy":
+                record["contracts"][step.id] = {
+                    "contract": step.result.contract_name,
+                    "address": step.result.address,
+                    "tx_hash": step.result.tx_hash,
+                    "constructor_args": step.result.constructor_args,
+                    "gas_used": step.result.gas_used,
+                }
+            else:
+                record["configurations"].append({"step": step.id, **step.result, "tx_hash": step.tx_hash})
+        for name, refs in self.pools.items():
+            record["pools"][name] = {key: self.resolve(ref) for key, ref in refs.items()}
+        return record
+
 # ==============================================================================
 # Helper Functions
 # ==============================================================================
@@ -442,6 +1247,41 @@ def save_deployment(deployment_data: Dict, filename: str):
 # Main CLI
 # ==============================================================================
 
+def run_plan(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    """Deploy and wire everything in args.plan, then write one consolidated record"""
+    try:
+        plan = DeployPlan.load(args.plan)
+    except (OSError, ValueError) as e:
+        parser.error(f"Invalid plan: {e}")
+    
+    if not args.skip_compile and any(step.kind == "deploy" for step in plan.steps.values()):
+        compile_contracts()
+    
+    deployer = ContractDeployer(network="mainnet" if args.mainnet else plan.network)
+    journal = DeployJournal(args.journal or args.plan + ".journal")
+    
+    started = time.time()
+    try:
+        plan.execute(deployer, journal)
+    except Exception as e:
+        print(f"\n❌ Deployment failed: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        journal.close()
+    record = plan.record(deployer)
+    record["elapsed_s"] = round(time.time() - started, 1)
+    
+    print(f"\n{'='*60}")
+    print("ROLLOUT COMPLETE" if not record["failed"] else f"ROLLOUT INCOMPLETE: {len(record['failed'])} steps not done")
+    print(f"{'='*60}")
+    print(json.dumps(record, indent=2))
+    
+    if args.output:
+        save_deployment(record, args.output)
+    if record["failed"]:
+        sys.exit(1)
+
 def main():
     parser = argparse.ArgumentParser(
         description="Deploy SovereignVault contracts to Hyperliquid EVM",
@@ -465,10 +1305,15 @@ Examples:
 
   # Use custom USDC address
   python deploy.py --vault --usdc 0xCustomUSDC
+
+  # Roll out everything described in a plan file (see DeployPlan)
+  python deploy.py --plan deploy-plan.json -o deployment.json
         """
     )
     
     # What to deploy
+    parser.add_argument("--plan", type=str, help="JSON plan of vaults, pools, modules and wiring to roll out")
+    parser.add_argument("--journal", type=str, help="Step journal to resume the plan from (default: <plan>.journal)")
     parser.add_argument("--vault", action="store_true", help="Deploy SovereignVault")
     parser.add_argument("--alm", action="store_true", help="Deploy SovereignALM (requires --pool-address)")
     parser.add_argument("--fee-module", action="store_true", help="Deploy BalanceSeekingSwapFeeModule (requires --pool-address)")
@@ -488,10 +1333,17 @@ Examples:
     
     # Options
     parser.add_argument("--skip-compile", action="store_true", help="Skip forge build step")
+    parser.add_argument("--serial", action="store_true", help="Wait for each transaction's receipt before sending the next")
     parser.add_argument("--output", "-o", type=str, help="Output deployment info to JSON file")
     
     args = parser.parse_args()
     
+    if args.plan:
+        if any([args.vault, args.alm, args.fee_module, args.authorize_pool, args.set_alm, args.set_fee_module]):
+            parser.error("--plan can't be combined with individual deployment or configuration actions")
+        run_plan(args, parser)
+        return
+    
     # Validate arguments
     if not any([args.vault, args.alm, args.fee_module, args.authorize_pool, args.set_alm, args.set_fee_module]):
         parser.error("At least one deployment or configuration action is required")
@@ -502,9 +1354,12 @@ Examples:
     if args.fee_module and not args.pool_address:
         parser.error("--pool-address is required for --fee-module")
     
-    if (args.authorize_pool or args.set_alm or args.set_fee_module) and not args.pool_address and not args.vault:
-        # If we're doing config operations, we need either a deployed vault or pool address
-        pass  # We'll handle this logic below
+    # Checked before anything is sent, so a run can't stop halfway on a usage error
+    if args.authorize_pool and not (args.vault or args.vault_address):
+        parser.error("--vault-address is required for --authorize-pool (unless deploying vault)")
+    
+    if (args.set_alm or args.set_fee_module) and not args.pool_address:
+        parser.error("--pool-address is required for --set-alm and --set-fee-module")
     
     # Compile contracts if needed
     if not args.skip_compile and (args.vault or args.alm or args.fee_module):
@@ -523,86 +1378,78 @@ Examples:
     
     try:
         vault_address = args.vault_address
+        results: Dict[str, DeploymentResult] = {}
         
-        # Deploy SovereignVault
-        if args.vault:
-            result = deployer.deploy_sovereign_vault(usdc_address=args.usdc)
-            deployments["contracts"]["SovereignVault"] = {
-                "address": result.address,
-                "tx_hash": result.tx_hash,
-                "constructor_args": result.constructor_args,
-                "gas_used": result.gas_used,
-            }
-            vault_address = result.address
-        
-        # Deploy SovereignALM
-        if args.alm:
-            result = deployer.deploy_sovereign_alm(args.pool_address)
-            deployments["contracts"]["SovereignALM"] = {
-                "address": result.address,
-                "tx_hash": result.tx_hash,
-                "constructor_args": result.constructor_args,
-                "gas_used": result.gas_used,
-            }
+        # Deployments go out back to back and their receipts are awaited
+        # together (--serial waits after each one)
+        with (nullcontext() if args.serial else deployer.pipeline()):
+            # Deploy SovereignVault
+            if args.vault:
+                results["SovereignVault"] = deployer.deploy_sovereign_vault(usdc_address=args.usdc)
+                vault_address = results["SovereignVault"].address
+            
+            # Deploy SovereignALM
+            if args.alm:
+                results["SovereignALM"] = deployer.deploy_sovereign_alm(args.pool_address)
             
+            # Deploy Fee Module
+            if args.fee_module:
+                results["BalanceSeekingSwapFeeModule"] = deployer.deploy_swap_fee_module(args.pool_address)
+        
+        # Wiring only goes out once every deployment has a successful receipt:
+        # setALM can't be undone and setSwapFeeModule starts a 3-day timelock,
+        # so the pool must never be pointed at an address without code
+        with (nullcontext() if args.serial else deployer.pipeline()):
             # Optionally set ALM on pool
-            if args.set_alm is None:  # Auto-set if not explicitly specified
-                deployer.set_alm_on_pool(args.pool_address, result.address)
+            if args.alm and args.set_alm is None:  # Auto-set if not explicitly specified
+                deployer.set_alm_on_pool(args.pool_address, results["SovereignALM"].address)
                 deployments["configurations"].append({
                     "action": "setALM",
                     "pool": args.pool_address,
-                    "alm": result.address,
+                    "alm": results["SovereignALM"].address,
                 })
-        
-        # Deploy Fee Module
-        if args.fee_module:
-            result = deployer.deploy_swap_fee_module(args.pool_address)
-            deployments["contracts"]["BalanceSeekingSwapFeeModule"] = {
-                "address": result.address,
-                "tx_hash": result.tx_hash,
-                "constructor_args": result.constructor_args,
-                "gas_used": result.gas_used,
-            }
             
             # Optionally set fee module on pool
-            if args.set_fee_module is None:  # Auto-set if not explicitly specified
-                deployer.set_swap_fee_module_on_pool(args.pool_address, result.address)
+            if args.fee_module and args.set_fee_module is None:  # Auto-set if not explicitly specified
+                deployer.set_swap_fee_module_on_pool(args.pool_address, results["BalanceSeekingSwapFeeModule"].address)
                 deployments["configurations"].append({
                     "action": "setSwapFeeModule",
                     "pool": args.pool_address,
-                    "module": result.address,
+                    "module": results["BalanceSeekingSwapFeeModule"].address,
+                })
+            
+            # Configuration actions
+            if args.authorize_pool:
+                deployer.authorize_pool_on_vault(vault_address, args.authorize_pool)
+                deployments["configurations"].append({
+                    "action": "authorizePool",
+                    "vault": vault_address,
+                    "pool": args.authorize_pool,
+                })
+            
+            if args.set_alm:
+                deployer.set_alm_on_pool(args.pool_address, args.set_alm)
+                deployments["configurations"].append({
+                    "action": "setALM",
+                    "pool": args.pool_address,
+                    "alm": args.set_alm,
+                })
+            
+            if args.set_fee_module:
+                deployer.set_swap_fee_module_on_pool(args.pool_address, args.set_fee_module)
+                deployments["configurations"].append({
+                    "action": "setSwapFeeModule",
+                    "pool": args.pool_address,
+                    "module": args.set_fee_module,
                 })
         
-        # Configuration actions
-        if args.authorize_pool:
-            if not vault_address:
-                parser.error("--vault-address is required for --authorize-pool (unless deploying vault)")
-            deployer.authorize_pool_on_vault(vault_address, args.authorize_pool)
-            deployments["configurations"].append({
-                "action": "authorizePool",
-                "vault": vault_address,
-                "pool": args.authorize_pool,
-            })
-        
-        if args.set_alm:
-            if not args.pool_address:
-                parser.error("--pool-address is required for --set-alm")
-            deployer.set_alm_on_pool(args.pool_address, args.set_alm)
-            deployments["configurations"].append({
-                "action": "setALM",
-                "pool": args.pool_address,
-                "alm": args.set_alm,
-            })
-        
-        if args.set_fee_module:
-            if not args.pool_address:
-                parser.error("--pool-address is required for --set-fee-module")
-            deployer.set_swap_fee_module_on_pool(args.pool_address, args.set_fee_module)
-            deployments["configurations"].append({
-                "action": "setSwapFeeModule",
-                "pool": args.pool_address,
-                "module": args.set_fee_module,
-            })
+        for name, result in results.items():
+            deployments["contracts"][name] = {
+                "address": result.address,
+                "tx_hash": result.tx_hash,
+                "constructor_args": result.constructor_args,
+                "gas_used": result.gas_used,
+            }
         
         # Print summary
         print(f"\n{'='*60}")
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# deploy.py sits at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import deploy  # noqa: E402
+from fakechain import PRIVATE_KEY, FakeEth, FakeWeb3  # noqa: E402
+
+@pytest.fixture
+def fast(monkeypatch):
+    """Pipeline timings short enough for tests."""
+    monkeypatch.setattr(deploy, "TX_TIMEOUT_S", 2.0)
+    monkeypatch.setattr(deploy, "RECEIPT_POLL_S", 0.01)
+    monkeypatch.setattr(deploy, "STUCK_AFTER_S", 0.05)
+
+@pytest.fixture
+def chain() -> FakeEth:
+    return FakeEth()
+
+@pytest.fixture
+def deployer(chain, fast) -> "deploy.ContractDeployer":
+    d = deploy.ContractDeployer("testnet", PRIVATE_KEY, w3=FakeWeb3(chain))
+    chain.sender = d.deployer_address
+    return d
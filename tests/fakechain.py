@@ -0,0 +1,152 @@
+"""An in-memory stand-in for the web3 client deploy.py talks to."""
+
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import rlp
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+from web3.utils.address import get_create_address
+
+PRIVATE_KEY = "0x" + "11" * 32
+
+class FakeEth:
+    """
+    The parts of w3.eth deploy.py uses, over an in-memory chain with one
+    sender. Transactions are mined lazily, in nonce order, whenever a receipt
+    is asked for; the highest-priced transaction at a nonce wins.
+    """
+    def __init__(self) -> None:
+        self.nonce = 0  # next nonce the chain expects
+        self.gas_price = 100
+        self.block = 1
+        self.pool: Dict[str, Tuple[int, Optional[str], int]] = {}  # hash -> (nonce, to, gas price)
+        self.receipts: Dict[str, Dict[str, Any]] = {}
+        self.code: Dict[str, bytes] = {}
+        self.sent: List[Tuple[int, int]] = []  # (nonce, gas price) per broadcast the node accepted
+        self.inflight_max = 0  # most unmined nonces ever held by the pool
+        self.mining = True
+        self.drop_next = 0  # accept, then silently lose, this many broadcasts
+        self.reject_next = 0  # refuse this many broadcasts
+        self.revert: Set[int] = set()  # nonces whose transaction reverts
+        self.sender: Optional[str] = None
+        self._lock = threading.RLock()  # settle() polls receipts from a thread pool
+
+    # -----------------------------
+    # w3.eth
+    # -----------------------------
+    def get_transaction_count(self, address: str, block: str = "latest") -> int:
+        if block == "pending":
+            return max([self.nonce] + [n + 1 for n, _, _ in self.pool.values()])
+        return self.nonce
+
+    def get_balance(self, address: str) -> int:
+        return 10**18
+
+    def get_code(self, address: str) -> bytes:
+        return self.code.get(Web3.to_checksum_address(address), b"")
+
+    def estimate_gas(self, tx: Dict[str, Any]) -> int:
+        return 100_000
+
+    def send_raw_transaction(self, raw: bytes) -> bytes:
+        with self._lock:
+            if self.reject_next:
+                self.reject_next -= 1
+                raise ValueError("insufficient funds for gas * price + value")
+            fields = rlp.decode(bytes(raw))
+            nonce, price = int.from_bytes(fields[0], "big"), int.from_bytes(fields[1], "big")
+            to = Web3.to_checksum_address(fields[3]) if fields[3] else None
+            tx_hash = Web3.to_hex(Web3.keccak(bytes(raw)))
+            if nonce < self.nonce:
+                raise ValueError("nonce too low")
+            self.sent.append((nonce, price))
+            if self.drop_next:
+                self.drop_next -= 1
+                return Web3.to_bytes(hexstr=tx_hash)
+            self.pool[tx_hash] = (nonce, to, price)
+            self.inflight_max = max(self.inflight_max, len({n for n, _, _ in self.pool.values()}))
+            return Web3.to_bytes(hexstr=tx_hash)
+
+    def get_transaction_receipt(self, tx_hash: str) -> Dict[str, Any]:
+        with self._lock:
+            if self.mining:
+                self.mine()
+            if tx_hash not in self.receipts:
+                raise TransactionNotFound(f"{tx_hash} not found")
+            return self.receipts[tx_hash]
+
+    # -----------------------------
+    # The chain
+    # -----------------------------
+    def mine(self) -> None:
+        with self._lock:
+            self._mine()
+
+    def _mine(self) -> None:
+        while True:
+            at_head = [(price, h, to) for h, (n, to, price) in self.pool.items() if n == self.nonce]
+            if not at_head:
+                return
+            _, tx_hash, to = max(at_head)
+            reverted = self.nonce in self.revert
+            created = None
+            if to is None and not reverted:
+                created = get_create_address(self.sender, self.nonce)
+                self.code[created] = b"\x60\x00"
+            self.receipts[tx_hash] = {
+                "transactionHash": Web3.to_bytes(hexstr=tx_hash),
+                "status": 0 if reverted else 1,
+                "contractAddress": created,
+                "gasUsed": 50_000,
+                "blockNumber": self.block,
+            }
+            self.pool = {h: v for h, v in self.pool.items() if v[0] != self.nonce}
+            self.nonce += 1
+            self.block += 1
+
+    def steal(self) -> None:
+        """Someone else's transaction takes the next nonce"""
+        with self._lock:
+            self.pool = {h: v for h, v in self.pool.items() if v[0] != self.nonce}
+            self.nonce += 1
+
+class FakeWeb3:
+    def __init__(self, eth: FakeEth) -> None:
+        self.eth = eth
+
+    def is_connected(self) -> bool:
+        return True
+
+    from_wei = staticmethod(Web3.from_wei)
+
+def call_tx(to: str = "0x000000000000000000000000000000000000bEEF") -> Dict[str, Any]:
+    """A plain call, ready for ContractDeployer._send_transaction"""
+    return {"to": to, "data": "0x", "value": 0, "gas": 21_000, "gasPrice": 100, "chainId": 998}
+
+def create_tx() -> Dict[str, Any]:
+    return {"data": "0x6000", "value": 0, "gas": 100_000, "gasPrice": 100, "chainId": 998}
+
+def stub_steps(plan: Any) -> Set[str]:
+    """
+    Swap each step of a DeployPlan for one plain transaction: deployments
+    send a CREATE, calls a call, and a call reads back as in effect once
+    its id is in the returned set.
+    """
+    from deploy import DeploymentResult
+
+    in_effect: Set[str] = set()
+    for step in plan.steps.values():
+        if step.kind == "deploy":
+            def run(d: Any, step: Any = step) -> Any:
+                result = DeploymentResult(step.spec["contract"], "", "")
+                d._send_transaction(create_tx(), step.id, result)
+                return result
+        else:
+            def run(d: Any, step: Any = step) -> Any:
+                d._send_transaction(call_tx(), step.id)
+                in_effect.add(step.id)
+                return dict(step.spec)
+            step.check = lambda d, step=step: step.id in in_effect
+        step.run = run
+    return in_effect
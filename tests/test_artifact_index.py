@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+import deploy
+
+ABI = [{"type": "function", "name": "owner", "inputs": [], "outputs": [{"name": "", "type": "address"}],
+        "stateMutability": "view"}]
+
+@pytest.fixture
+def out(tmp_path, monkeypatch):
+    """An empty forge out/ directory, with no index loaded yet"""
+    monkeypatch.setattr(deploy, "OUT_DIR", tmp_path)
+    monkeypatch.setattr(deploy, "ARTIFACT_INDEX", tmp_path / ".artifact-index.json")
+    monkeypatch.setattr(deploy, "_artifact_index", None)
+    return tmp_path
+
+def _build(out, bytecode: str = "0x6000", mtime_ns: int = 10**18):
+    path = out / "Thing.sol" / "Thing.json"
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(json.dumps({"abi": ABI, "bytecode": {"object": bytecode}, "metadata": {"big": "x" * 1000}}))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+def _restart(monkeypatch, parse=None):
+    """A new process: the index comes from disk; `parse` stands in for parsing an artifact"""
+    monkeypatch.setattr(deploy, "_artifact_index", None)
+    if parse is not None:
+        monkeypatch.setattr(deploy, "_compact_artifact", parse)
+
+def _index(out) -> dict:
+    return json.loads((out / ".artifact-index.json").read_text())
+
+def _unparsed(artifact):
+    raise AssertionError("artifact parsed again")
+
+def test_miss_parses_once_and_keeps_only_what_deployments_need(out):
+    _build(out)
+    artifact = deploy.load_contract_artifact("Thing")
+    assert artifact == {
+        "abi": ABI,
+        "bytecode": "0x6000",
+        "selectors": {"owner()": "8da5cb5b"},
+        "link_references": {},
+    }
+    index = _index(out)
+    assert list(index["paths"]) == ["Thing.sol/Thing.json"]
+    assert list(index["artifacts"].values()) == [artifact]
+
+def test_hit_is_served_from_the_index(out, monkeypatch):
+    _build(out)
+    artifact = deploy.load_contract_artifact("Thing")
+    _restart(monkeypatch, parse=_unparsed)
+    assert deploy.load_contract_artifact("Thing") == artifact
+
+def test_touched_but_unchanged_artifact_is_rehashed_not_parsed(out, monkeypatch):
+    _build(out)
+    artifact = deploy.load_contract_artifact("Thing")
+    _build(out, mtime_ns=2 * 10**18)
+    _restart(monkeypatch, parse=_unparsed)
+    assert deploy.load_contract_artifact("Thing") == artifact
+    assert _index(out)["paths"]["Thing.sol/Thing.json"]["mtime_ns"] == 2 * 10**18
+
+def test_rebuilt_artifact_is_parsed_again_and_the_old_entry_pruned(out, monkeypatch):
+    _build(out)
+    deploy.load_contract_artifact("Thing")
+    _build(out, bytecode="0x6001", mtime_ns=2 * 10**18)
+    _restart(monkeypatch)
+    assert deploy.load_contract_artifact("Thing")["bytecode"] == "0x6001"
+    assert [a["bytecode"] for a in _index(out)["artifacts"].values()] == ["0x6001"]
+
+def test_index_from_another_version_is_ignored(out, monkeypatch):
+    _build(out)
+    deploy.load_contract_artifact("Thing")
+    index = _index(out)
+    for artifact in index["artifacts"].values():
+        artifact["bytecode"] = "0xstale"
+    index["version"] = deploy.ARTIFACT_INDEX_VERSION + 1
+    (out / ".artifact-index.json").write_text(json.dumps(index))
+    _restart(monkeypatch)
+    assert deploy.load_contract_artifact("Thing")["bytecode"] == "0x6000"
+    assert _index(out)["version"] == deploy.ARTIFACT_INDEX_VERSION
+
+def test_missing_artifact_asks_for_a_build(out):
+    with pytest.raises(FileNotFoundError, match="Run 'forge build'"):
+        deploy.load_contract_artifact("Thing")
@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+import deploy
+from deploy import DeployJournal, DeployPlan
+from fakechain import PRIVATE_KEY, FakeWeb3, stub_steps
+
+POOL = "0x000000000000000000000000000000000000dEaD"
+USDC = "0x000000000000000000000000000000000000bEEF"
+PLAN = {"vaults": {"main": {"usdc": USDC}}, "pools": {"p": {"address": POOL, "vault": "main", "alm": True}}}
+
+def _lines(path) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_replay_skips_a_torn_last_line(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = DeployJournal(path)
+    journal.append("run", chainId=998)
+    journal.append("planned", "vault:main", spec={"contract": "SovereignVault"})
+    journal.append("sent", "vault:main", nonce=0, tx_hash="0xaa", address="0xA")
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"ts": 1, "status": "mined", "step": "vau')
+
+    runs, steps = DeployJournal._replay(path)
+    assert [run["chainId"] for run in runs] == [998]
+    assert steps["vault:main"]["status"] == "sent"
+    assert steps["vault:main"]["hashes"] == ["0xaa"]
+
+def test_void_forgets_the_send_and_its_address(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = DeployJournal(path)
+    journal.append("planned", "vault:main", spec={})
+    journal.append("sent", "vault:main", nonce=4, tx_hash="0xaa", address="0xA")
+    journal.append("sent", "vault:main", nonce=4, tx_hash="0xbb", address="0xA")  # resent, then refused
+    journal.append("void", "vault:main", nonce=4)
+    journal.close()
+
+    state = DeployJournal._replay(path)[1]["vault:main"]
+    assert state["status"] == "void"
+    assert state["hashes"] == ["0xaa"]
+    assert not {"nonce", "tx", "tx_hash", "address"} & set(state)
+
+def test_planning_a_step_again_starts_its_state_over(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = DeployJournal(path)
+    journal.append("planned", "vault:main", spec={"usdc": "old"})
+    journal.append("sent", "vault:main", nonce=0, tx_hash="0xaa", address="0xA")
+    journal.append("failed", "vault:main", error="reverted")
+    journal.append("planned", "vault:main", spec={"usdc": "new"})
+    journal.close()
+
+    state = DeployJournal._replay(path)[1]["vault:main"]
+    assert state["spec"] == {"usdc": "new"}
+    assert state["status"] == "planned"
+    assert "hashes" not in state and "address" not in state
+
+def test_refused_broadcast_is_journaled_void(deployer, chain, tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    plan = DeployPlan(PLAN)
+    stub_steps(plan)
+    chain.reject_next = 1  # the vault's deployment
+    journal = DeployJournal(path)
+    plan.execute(deployer, journal)
+    journal.close()
+
+    assert [e["status"] for e in _lines(path) if e.get("step") == "vault:main"] == ["planned", "sent", "void", "failed"]
+    steps = DeployJournal._replay(path)[1]
+    assert "address" not in steps["vault:main"]
+    # the nonce went to the ALM, and with it the vault's CREATE address
+    assert steps["alm:p"]["nonce"] == 0
+    assert plan.steps["alm:p"].status == "done"
+
+def test_resume_sees_through_what_a_crashed_run_sent(deployer, chain, tmp_path, monkeypatch):
+    path = str(tmp_path / "journal.jsonl")
+    plan = DeployPlan(PLAN)
+    stub_steps(plan)
+    chain.mining = False
+
+    def crash(batch):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(deployer, "settle", crash)
+    journal = DeployJournal(path)
+    with pytest.raises(KeyboardInterrupt):
+        plan.execute(deployer, journal)
+    journal.close()
+    assert chain.get_transaction_count(deployer.deployer_address, "pending") == 2
+
+    chain.mining = True
+    again = deploy.ContractDeployer("testnet", PRIVATE_KEY, w3=FakeWeb3(chain))
+    plan = DeployPlan(PLAN)
+    stub_steps(plan)
+    journal = DeployJournal(path)
+    plan.execute(again, journal)
+    journal.close()
+
+    # both deployments were adopted, not sent again; only the wiring is new
+    assert chain.nonce == 4
+    assert all(step.status == "done" for step in plan.steps.values())
+    mined = [e["step"] for e in _lines(path) if e["status"] == "mined"]
+    assert mined[:2] == ["vault:main", "alm:p"]
+    assert plan.steps["vault:main"].result.address == DeployJournal._replay(path)[1]["vault:main"]["address"]
+
+def test_resume_refuses_another_deployers_journal(deployer, tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = DeployJournal(path)
+    journal.append("run", chainId=998, deployer="0x000000000000000000000000000000000000dEaD")
+    journal.close()
+    journal = DeployJournal(path)
+    with pytest.raises(ValueError, match="pass another --journal"):
+        DeployPlan(PLAN)._resume(deployer, journal)
+    journal.close()
+
+def test_resume_drops_steps_whose_spec_changed(deployer, tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = DeployJournal(path)
+    journal.append("planned", "vault:main", spec={"contract": "SovereignVault", "usdc": POOL})
+    journal.append("planned", "alm:p", spec={"contract": "SovereignALM", "pool": POOL})
+    journal.append("verified", "alm:p", spec={"contract": "SovereignALM", "pool": POOL})
+    journal.close()
+    journal = DeployJournal(path)
+    assert list(DeployPlan(PLAN)._resume(deployer, journal)) == ["alm:p"]
+    journal.close()
+
+def test_code_at_the_address_only_counts_if_the_step_created_it(deployer, chain):
+    plan = DeployPlan(PLAN)
+    stub_steps(plan)
+    plan.execute(deployer)
+    step = plan.steps["vault:main"]
+    address, tx_hash = step.result.address, step.result.tx_hash
+
+    # a nonce given back after a failed send: someone else's deployment sits there
+    assert not plan._on_chain(deployer, step, {"address": address, "hashes": ["0x" + "ab" * 32]})
+    assert plan._on_chain(deployer, step, {"address": address, "hashes": ["0x" + "ab" * 32, tx_hash]})
+    assert step.result.tx_hash == tx_hash
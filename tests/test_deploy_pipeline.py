@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+
+import deploy
+from deploy import DeploymentResult, NonceManager
+from fakechain import FakeWeb3, call_tx, create_tx
+
+ME = "0x000000000000000000000000000000000000dEaD"  # the fake chain has one sender whatever the address
+
+def test_nonces_are_seeded_once_from_the_pending_count(chain):
+    chain.nonce = 5
+    chain.pool["0xold"] = (5, None, 100)  # one of ours already waiting
+    nonces = NonceManager(FakeWeb3(chain), ME)
+    assert [nonces.reserve() for _ in range(3)] == [6, 7, 8]
+
+def test_release_gives_back_only_the_newest_nonce(chain):
+    nonces = NonceManager(FakeWeb3(chain), ME)
+    assert [nonces.reserve() for _ in range(3)] == [0, 1, 2]
+    nonces.release(2)
+    assert nonces.reserve() == 2
+
+    # an older one: later nonces are out, so the node's pending count is read again
+    nonces.release(0)
+    chain.pool["0xa"] = (1, None, 100)
+    chain.pool["0xb"] = (2, None, 100)
+    assert nonces.reserve() == 3
+
+def test_reserve_waits_for_the_chain_then_times_out(chain, fast, monkeypatch):
+    nonces = NonceManager(FakeWeb3(chain), ME, max_inflight=2)
+    assert [nonces.reserve(), nonces.reserve()] == [0, 1]
+
+    # the chain catches up while reserve() waits
+    timer = threading.Timer(0.05, lambda: setattr(chain, "nonce", 1))
+    timer.start()
+    assert nonces.reserve() == 2
+    timer.join()
+
+    monkeypatch.setattr(deploy, "TX_TIMEOUT_S", 0.05)
+    with pytest.raises(TimeoutError):
+        nonces.reserve()
+
+def test_pipeline_sends_back_to_back_and_settles_on_exit(deployer, chain):
+    chain.mining = False
+    with deployer.pipeline() as batch:
+        for _ in range(3):
+            deployer._send_transaction(call_tx(), "call")
+        assert [p.receipt for p in batch] == [None] * 3  # nothing awaited yet
+        assert chain.get_transaction_count(ME, "pending") == 3
+        chain.mining = True
+    assert [p.nonce for p in batch] == [0, 1, 2]
+    assert all(p.receipt["status"] == 1 and p.error is None for p in batch)
+
+def test_pipeline_settles_in_windows_of_max_inflight(deployer, chain):
+    deployer.nonces.max_inflight = 3
+    with deployer.pipeline() as batch:
+        for _ in range(10):
+            deployer._send_transaction(call_tx(), "call")
+    assert len(batch) == 10
+    assert chain.nonce == 10
+    assert chain.inflight_max <= 3
+
+def test_pipeline_failures_raise_or_stay_on_the_transaction(deployer, chain):
+    chain.revert = {1}
+    with pytest.raises(Exception, match="reverted"):
+        with deployer.pipeline():
+            deployer._send_transaction(call_tx(), "first")
+            deployer._send_transaction(call_tx(), "second")
+
+    chain.revert = {2}
+    with deployer.pipeline(check=False) as batch:
+        deployer._send_transaction(call_tx(), "third")
+    assert "third: reverted" in batch[0].error
+
+def test_deployment_address_is_known_at_send_and_checked_at_receipt(deployer, chain):
+    result = DeploymentResult("Thing", "", "")
+    with deployer.pipeline() as batch:
+        deployer._send_transaction(create_tx(), "Thing", result)
+        predicted = result.address
+    assert predicted == chain.receipts[batch[0].tx_hash]["contractAddress"]
+    assert result.tx_hash == batch[0].tx_hash
+    assert result.gas_used == 50_000
+
+def test_dropped_head_is_resent_at_a_higher_price(deployer, chain):
+    chain.drop_next = 1
+    with deployer.pipeline() as batch:
+        deployer._send_transaction(call_tx(), "call")
+    pending = batch[0]
+    assert len(pending.hashes) == 2
+    (n0, price0), (n1, price1) = chain.sent
+    assert n0 == n1 == 0
+    assert price1 > price0 * 1.1
+    assert pending.tx_hash == pending.hashes[-1]
+
+def test_only_the_head_of_the_queue_is_resent(deployer, chain):
+    chain.drop_next = 1  # nonce 0 is lost; nonce 1 waits behind it and must not be bumped
+    with deployer.pipeline() as batch:
+        deployer._send_transaction(call_tx(), "first")
+        deployer._send_transaction(call_tx(), "second")
+    assert [len(p.hashes) for p in batch] == [2, 1]
+
+def test_nonce_taken_by_another_transaction_is_reported(deployer, chain):
+    chain.mining = False
+    with deployer.pipeline(check=False) as batch:
+        deployer._send_transaction(call_tx(), "call")
+        chain.steal()
+    assert batch[0].error == "call: nonce 0 was used by another transaction"
+
+def test_no_receipt_times_out(deployer, chain, monkeypatch):
+    monkeypatch.setattr(deploy, "TX_TIMEOUT_S", 0.2)
+    chain.mining = False
+    with deployer.pipeline(check=False) as batch:
+        deployer._send_transaction(call_tx(), "call")
+    assert "no receipt after 0.2s" in batch[0].error
+
+def test_failed_broadcast_gives_the_nonce_back(deployer, chain):
+    voided = []
+    deployer.on_void = voided.append
+    chain.reject_next = 1
+    with deployer.pipeline() as batch:
+        with pytest.raises(ValueError):
+            deployer._send_transaction(call_tx(), "refused")
+        deployer._send_transaction(call_tx(), "next")
+    assert [p.nonce for p in voided] == [0]
+    assert [p.nonce for p in batch] == [0]
@@ -0,0 +1,82 @@
+import pytest
+
+from deploy import DeployPlan
+from fakechain import stub_steps
+
+POOL = "0x000000000000000000000000000000000000dEaD"
+USDC = "0x000000000000000000000000000000000000bEEF"
+
+def _plan(**pool) -> DeployPlan:
+    return DeployPlan({
+        "vaults": {"main": {"usdc": USDC}},
+        "pools": {"p": {"address": POOL, "vault": "main", "alm": True, "fee_module": True, **pool}},
+    })
+
+def _ids(waves) -> list:
+    return [sorted(step.id for step in wave) for wave in waves]
+
+def test_deployments_go_out_in_one_wave_and_wiring_in_the_next():
+    plan = _plan()
+    assert _ids(plan.waves()) == [
+        ["alm:p", "fee_module:p", "vault:main"],
+        ["authorizePool:p", "setALM:p", "setSwapFeeModule:p"],
+    ]
+    assert plan.steps["setALM:p"].deps == ["alm:p"]
+
+def test_addresses_given_in_the_plan_are_not_dependencies():
+    plan = _plan(vault=USDC, alm=USDC)
+    assert _ids(plan.waves()) == [["authorizePool:p", "fee_module:p", "setALM:p", "vault:main"], ["setSwapFeeModule:p"]]
+    assert plan.steps["authorizePool:p"].deps == []
+
+def test_dependency_cycles_are_refused():
+    plan = _plan()
+    plan.steps["vault:main"].deps.append("authorizePool:p")
+    with pytest.raises(ValueError, match="dependency cycle: vault:main -> authorizePool:p -> vault:main"):
+        plan.waves()
+
+def test_bad_plans_fail_before_anything_is_sent():
+    with pytest.raises(ValueError, match="nothing to do"):
+        DeployPlan({"vaults": {"old": {"address": USDC}}})
+    with pytest.raises(ValueError, match="not an address"):
+        _plan(vault="0x1234")
+    with pytest.raises(ValueError, match=r"unknown parameters \['fee'\]"):
+        _plan(fee_module={"fee": 1})
+
+def test_a_failed_step_only_skips_what_depends_on_it(deployer, chain):
+    plan = _plan()
+    stub_steps(plan)
+
+    def refuse(d):
+        raise RuntimeError("out of gas money")
+    plan.steps["vault:main"].run = refuse
+    plan.execute(deployer)
+
+    status = {step.id: step.status for step in plan.steps.values()}
+    assert status == {
+        "vault:main": "failed",
+        "alm:p": "done",
+        "fee_module:p": "done",
+        "authorizePool:p": "skipped",
+        "setALM:p": "done",
+        "setSwapFeeModule:p": "done",
+    }
+    assert plan.steps["authorizePool:p"].error == "depends on vault:main"
+    assert chain.nonce == 4
+
+    record = plan.record(deployer)
+    assert sorted(record["failed"]) == ["authorizePool:p", "vault:main"]
+    assert record["pools"]["p"]["alm"] == plan.steps["alm:p"].result.address
+    assert record["pools"]["p"]["vault"] is None
+
+def test_a_mined_step_must_also_read_back_as_in_effect(deployer, chain):
+    plan = _plan()
+    stub_steps(plan)
+    plan.steps["setALM:p"].check = lambda d: False
+    chain.revert = {2}  # vault, ALM, then the fee module
+    plan.execute(deployer)
+
+    assert plan.steps["setALM:p"].status == "failed"
+    assert plan.steps["setALM:p"].error == "mined, but not in effect on-chain"
+    assert plan.steps["fee_module:p"].status == "failed"
+    assert "reverted" in plan.steps["fee_module:p"].error
+    assert plan.steps["setSwapFeeModule:p"].status == "skipped"